@@ -1,6 +1,8 @@
 # src/analytics.py
-import argparse, pandas as pd
-from typing import List
+import argparse, os, re, threading
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
 
 CSV_PATH = "data/restaurants.csv"
 
@@ -18,17 +20,79 @@ def _price_to_num(p):
                 return float(len(s))
     return None
 
-def _matches_category(row_cats: str, want: List[str]) -> bool:
-    rc = _norm(row_cats).lower()
-    return any(w.lower() in rc for w in want)
+def parse_prices(prices: pd.Series) -> pd.Series:
+    """Vectorized _price_to_num: '$'..'$$$$' -> 1-4, numbers pass through, anything else NaN."""
+    s = prices.astype("string").str.strip()
+    num = pd.to_numeric(s, errors="coerce")
+    dollars = s.str.fullmatch(r"\$+").fillna(False).astype(bool)
+    return num.where(~dollars, s.str.len()).astype(float)
+
+def _contains_any(values: pd.Series, terms: Sequence[str]) -> np.ndarray:
+    """Row mask: value contains any of `terms` (case-insensitive substring), tested once per distinct value."""
+    codes, uniques = pd.factorize(values.fillna("").astype(str))
+    if not terms:
+        return np.zeros(len(values), dtype=bool)
+    rx = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    table = np.asarray([bool(rx.search(u)) for u in uniques] + [False], dtype=bool)
+    return table[codes]
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """city / categories as strings plus the parsed `price_num`, only for rows that have a price."""
+    out = pd.DataFrame({
+        "city": df["city"].fillna("").astype(str) if "city" in df.columns else "",
+        "categories": df["categories"].fillna("").astype(str) if "categories" in df.columns else "",
+        "price_num": parse_prices(df["price"]) if "price" in df.columns else np.nan,
+    }, index=df.index)
+    return out[out["price_num"].notna()].reset_index(drop=True)
+
+def compare_matrix(df: pd.DataFrame, groups: Sequence[Sequence[str]], cities: Sequence[str],
+                   percentiles: Sequence[float] = (25, 50, 75)) -> Dict[str, Any]:
+    """
+    Average price, item count and price percentiles for every (term group, city) pair.
+    Groups match categories by any-term substring and cities by substring, both case-insensitive,
+    like avg_price_for_category. Matrices are indexed [group][city]; empty cells are NaN.
+    """
+    if "price_num" not in df.columns:
+        df = prepare_frame(df)
+    price = df["price_num"].to_numpy(dtype=float)
+    G = np.stack([_contains_any(df["categories"], g) for g in groups], axis=1) if groups else np.zeros((len(df), 0), bool)
+    C = np.stack([_contains_any(df["city"], [c]) for c in cities], axis=1) if cities else np.zeros((len(df), 0), bool)
+    count = G.T.astype(np.int64) @ C.astype(np.int64)
+    total = (G * price[:, None]).T @ C
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    pct = np.full((len(percentiles), len(groups), len(cities)), np.nan)
+    for i in range(len(groups)):
+        for j in range(len(cities)):
+            if count[i, j]:
+                pct[:, i, j] = np.percentile(price[G[:, i] & C[:, j]], percentiles)
+    return {
+        "groups": [list(g) for g in groups],
+        "cities": list(cities),
+        "avg_price": avg,
+        "count": count,
+        "percentiles": {f"p{p:g}": pct[k] for k, p in enumerate(percentiles)},
+    }
 
 def avg_price_for_category(df: pd.DataFrame, city: str, category_terms: List[str]) -> float:
-    mask_city = df["city"].fillna("").str.contains(city, case=False, na=False)
-    mask_cat = df["categories"].fillna("").apply(lambda x: _matches_category(x, category_terms))
-    sub = df[mask_city & mask_cat]
-    if sub.empty: return float("nan")
-    prices = sub["price"].apply(_price_to_num).dropna()
-    return float(prices.mean()) if not prices.empty else float("nan")
+    return float(compare_matrix(df, [category_terms], [city], percentiles=())["avg_price"][0, 0])
+
+_lock = threading.Lock()
+_frame: Optional[pd.DataFrame] = None
+_frame_mtime = None
+
+def load_frame(path: str = CSV_PATH) -> pd.DataFrame:
+    """prepare_frame of the CSV, kept resident and re-read only when the file changes."""
+    global _frame, _frame_mtime
+    mtime = os.stat(path).st_mtime_ns
+    if _frame is not None and mtime == _frame_mtime:
+        return _frame
+    with _lock:
+        if _frame is None or mtime != _frame_mtime:
+            want = {"city", "categories", "price"}
+            _frame = prepare_frame(pd.read_csv(path, usecols=lambda c: c in want))
+            _frame_mtime = mtime
+    return _frame
 
 def main():
     ap = argparse.ArgumentParser()
@@ -0,0 +1,364 @@
+# src/ann.py
+import argparse, json, os, tempfile, time
+from typing import Any, Dict, Optional
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat", "ivf", "ivfpq", "hnsw")
+STORAGE_TYPES = ("float32", "fp16", "sq8")
+DEFAULT_PARAMS = {
+    "type": "flat",
+    "nlist": 1024,     # IVF: number of clusters
+    "nprobe": 16,      # IVF: clusters scanned per query
+    "pq_m": 48,        # IVF-PQ: sub-quantizers (must divide the dimension)
+    "hnsw_m": 32,      # HNSW: graph degree
+    "ef_search": 64,   # HNSW: candidate list size at query time
+    "storage": "float32",  # per-dimension codes: float32 (4 B), fp16 (2 B) or sq8 (1 B); ivfpq ignores it
+    "pca": 0,          # reduce vectors to this many dimensions before storing (0 = off)
+}
+_SQ = {"fp16": "SQfp16", "sq8": "SQ8"}
+
+def add_index_args(ap: argparse.ArgumentParser):
+    """Index-type flags shared by ingest_embeddings and ext_ingest."""
+    ap.add_argument("--index-type", choices=INDEX_TYPES, default=DEFAULT_PARAMS["type"],
+                    help="flat = exact scan; ivf / ivfpq / hnsw = approximate")
+    ap.add_argument("--nlist", type=int, default=DEFAULT_PARAMS["nlist"])
+    ap.add_argument("--nprobe", type=int, default=DEFAULT_PARAMS["nprobe"])
+    ap.add_argument("--pq-m", type=int, default=DEFAULT_PARAMS["pq_m"])
+    ap.add_argument("--hnsw-m", type=int, default=DEFAULT_PARAMS["hnsw_m"])
+    ap.add_argument("--ef-search", type=int, default=DEFAULT_PARAMS["ef_search"])
+    ap.add_argument("--storage", choices=STORAGE_TYPES, default=DEFAULT_PARAMS["storage"],
+                    help="Vector codes: float32, fp16 (half the memory) or sq8 (a quarter, 8-bit scalar quantizer)")
+    ap.add_argument("--pca", type=int, default=DEFAULT_PARAMS["pca"],
+                    help="PCA-reduce vectors to this many dimensions before storage (0 = off)")
+    ap.add_argument("--report-queries", type=int, default=200,
+                    help="Held-out queries for the recall/latency report (0 to skip)")
+
+def params_from_args(args) -> Dict[str, Any]:
+    return {
+        "type": args.index_type,
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "pq_m": args.pq_m,
+        "hnsw_m": args.hnsw_m,
+        "ef_search": args.ef_search,
+        "storage": args.storage,
+        "pca": args.pca,
+    }
+
+def is_exact(params: Dict[str, Any]) -> bool:
+    """Flat float32 without PCA scores every vector exactly; anything else is worth a recall report."""
+    return params["type"] == "flat" and params.get("storage", "float32") == "float32" and not params.get("pca")
+
+def _factory_string(params: Dict[str, Any], n: int) -> str:
+    kind = params["type"]
+    storage = params.get("storage", "float32")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r} (expected one of {STORAGE_TYPES})")
+    # PCA output isn't unit-length any more; re-normalize so inner product stays cosine
+    prefix = f"PCA{params['pca']},L2norm," if params.get("pca") else ""
+    codes = _SQ.get(storage, "Flat")
+    if kind == "flat":
+        return prefix + codes
+    if kind == "hnsw":
+        return prefix + f"HNSW{params['hnsw_m']}" + (f"_{codes}" if storage in _SQ else "")
+    # faiss wants ~39+ training points per cluster; shrink nlist on small corpora
+    nlist = max(1, min(params["nlist"], n // 39))
+    params["nlist"] = nlist
+    if kind == "ivf":
+        return prefix + f"IVF{nlist},{codes}"
+    if kind == "ivfpq":
+        return prefix + f"IVF{nlist},PQ{params['pq_m']}"
+    raise ValueError(f"Unknown index type {kind!r} (expected one of {INDEX_TYPES})")
+
+def build_index(vecs: np.ndarray, params: Optional[Dict[str, Any]] = None, train_max: int = 200_000) -> faiss.Index:
+    """
+    Build (train + add) an inner-product index of the requested type over normalized vectors.
+    `params` is completed in place with defaults and the effective nlist, ready for save_params.
+    """
+    if params is None:
+        params = {}
+    params.update(dict(DEFAULT_PARAMS, **params))
+    index = faiss.index_factory(vecs.shape[1], _factory_string(params, len(vecs)), faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = vecs if len(vecs) <= train_max else vecs[rng.choice(len(vecs), train_max, replace=False)]
+        index.train(sample)
+    index.add(vecs)
+    apply_search_params(index, params)
+    return index
+
+class StreamingIndexBuilder:
+    """
+    Build an index from vectors that arrive in batches. An exact flat index takes them as they
+    come. Anything that trains (IVF, SQ ranges, PCA) or gets a recall report spills the batches
+    to a temporary file instead. finish() then draws the training sample and the held-out report
+    queries uniformly from every row, not just the first chunks, which in a CSV grouped by
+    restaurant or city would be a biased sample. It trains the index, then adds the spilled rows
+    in order. Memory holds one batch, the sample and the index itself.
+    """
+
+    def __init__(self, dim: int, params: Dict[str, Any], train_max: int = 200_000,
+                 report_queries: int = 0, k: int = 10, spill_dir: Optional[str] = None,
+                 batch: int = 65536):
+        params.update(dict(DEFAULT_PARAMS, **params))
+        self.params = params
+        self.dim = dim
+        self.k = k
+        self.batch = batch
+        self.ntotal = 0
+        self.index: Optional[faiss.Index] = None
+        self._train_target = 0
+        if params["type"] in ("ivf", "ivfpq"):
+            # k-means wants ~39 points per centroid (256 centroids per PQ sub-quantizer)
+            need = params["nlist"] * 39
+            if params["type"] == "ivfpq":
+                need = max(need, 256 * 39)
+            self._train_target = need
+        if params["storage"] in _SQ or params["pca"]:
+            # SQ value ranges and PCA axes are learned from the same sample
+            self._train_target = max(self._train_target, 256 * 39)
+        self._train_target = min(train_max, self._train_target)
+        self._n_queries = report_queries if not is_exact(params) else 0
+        self._spill = None
+        if is_exact(params):
+            self.index = faiss.index_factory(dim, _factory_string(params, 0), faiss.METRIC_INNER_PRODUCT)
+        else:
+            self._spill = tempfile.NamedTemporaryFile(prefix="index-build-", suffix=".f32", dir=spill_dir, delete=False)
+
+    def add(self, vecs: np.ndarray):
+        vecs = np.ascontiguousarray(vecs, dtype="float32")
+        if self._spill is None:
+            self.index.add(vecs)
+        else:
+            self._spill.write(vecs.tobytes())
+        self.ntotal += len(vecs)
+
+    def abort(self):
+        """Drop the spill file of a build that won't be finished."""
+        if self._spill is not None:
+            self._spill.close()
+            if os.path.exists(self._spill.name):
+                os.unlink(self._spill.name)
+
+    def _exact_top(self, data: np.ndarray, queries: np.ndarray):
+        """Exact top-(k+1) ids of every query over `data`, scanned a batch at a time."""
+        kk = self.k + 1
+        best_D = np.full((len(queries), 0), -np.inf, dtype="float32")
+        best_I = np.empty((len(queries), 0), dtype="int64")
+        for start in range(0, len(data), self.batch):
+            scores = queries @ np.asarray(data[start:start + self.batch]).T
+            ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            D, I = np.hstack([best_D, scores]), np.hstack([best_I, ids])
+            top = np.argsort(-D, axis=1, kind="stable")[:, :kk]
+            best_D, best_I = np.take_along_axis(D, top, axis=1), np.take_along_axis(I, top, axis=1)
+        return best_I
+
+    def finish(self):
+        """(index, report): the finished index with search params applied, and the recall/latency report."""
+        report = {}
+        if self._spill is None:
+            apply_search_params(self.index, self.params)
+            return self.index, report
+        path = self._spill.name
+        self._spill.close()
+        try:
+            data = (np.memmap(path, dtype="float32", mode="r", shape=(self.ntotal, self.dim))
+                    if self.ntotal else np.empty((0, self.dim), dtype="float32"))
+            rng = np.random.default_rng(0)
+            spec = _factory_string(self.params, max(self.ntotal, 1))
+            self.index = faiss.index_factory(self.dim, spec, faiss.METRIC_INNER_PRODUCT)
+            if not self.index.is_trained:
+                n_train = min(self.ntotal, self._train_target) if self._train_target else self.ntotal
+                sample = np.sort(rng.choice(self.ntotal, n_train, replace=False))
+                self.index.train(np.ascontiguousarray(data[sample]))
+            for start in range(0, self.ntotal, self.batch):
+                self.index.add(np.ascontiguousarray(data[start:start + self.batch]))
+            apply_search_params(self.index, self.params)
+            if self._n_queries and self.ntotal > 1:
+                qids = np.sort(rng.choice(self.ntotal, min(self._n_queries, self.ntotal), replace=False))
+                queries = np.ascontiguousarray(data[qids])
+                report = _report(self.index, queries, qids, self._exact_top(data, queries), self.k)
+            del data
+        finally:
+            os.unlink(path)
+        return self.index, report
+
+def apply_search_params(index: faiss.Index, params: Dict[str, Any]):
+    """Set query-time knobs (nprobe / efSearch) and enable id -> vector lookups on IVF."""
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.nprobe = int(params.get("nprobe", DEFAULT_PARAMS["nprobe"]))
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            # reconstruct() for exact re-scoring; a hashtable also allows remove_ids and sparse ids
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        hnsw.hnsw.efSearch = int(params.get("ef_search", DEFAULT_PARAMS["ef_search"]))
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW graphs can't drop vectors; flat (via an id map) and IVF can."""
+    return _hnsw(index) is None
+
+def with_ids(index: faiss.Index) -> faiss.Index:
+    """
+    An index that accepts add_with_ids / remove_ids with the same contents (ids 0..n-1).
+    IVF already does; anything else is copied into an IndexIDMap2 of the same kind.
+    """
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or _ivf(index) is not None:
+        return index
+    vecs = index.reconstruct_n(0, index.ntotal)
+    # a serialize round trip copies what clone_index can't (e.g. the L2norm step after PCA)
+    inner = faiss.deserialize_index(faiss.serialize_index(index))
+    inner.reset()
+    mapped = faiss.IndexIDMap2(inner)
+    mapped.add_with_ids(vecs, np.arange(len(vecs), dtype="int64"))
+    return mapped
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """The index that stores the vectors, under any PCA pre-transform and id-map wrappers."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexPreTransform, faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def _pre_transform(index: faiss.Index):
+    """The IndexPreTransform (PCA, L2norm) among `index`'s wrappers, if any."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexPreTransform, faiss.IndexIDMap, faiss.IndexIDMap2)):
+        if isinstance(index, faiss.IndexPreTransform):
+            return index
+        index = faiss.downcast_index(index.index)
+    return None
+
+def score_ids(index: faiss.Index, qv: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """
+    (n, len(ids)) inner products of the queries with the stored vectors `ids`, as index.search
+    scores them. Behind a PCA pre-transform that is in the reduced space: reconstruct() maps the
+    stored vectors back to full dimension, so the linear steps are applied to them again, and
+    the whole chain to the queries. Normalization is skipped for the stored side, since their
+    reconstruction is already the (possibly quantized) vector the index scores against.
+    """
+    vecs = index.reconstruct_batch(ids)
+    pre = _pre_transform(index)
+    if pre is not None:
+        qv = np.ascontiguousarray(qv, dtype="float32")
+        for i in range(pre.chain.size()):
+            vt = faiss.downcast_VectorTransform(pre.chain.at(i))
+            qv = vt.apply(qv)
+            if not isinstance(vt, faiss.NormalizationTransform):
+                vecs = vt.apply(np.ascontiguousarray(vecs))
+    return qv @ vecs.T
+
+def _ivf(index: faiss.Index):
+    return faiss.try_extract_index_ivf(_base_index(index))
+
+def _hnsw(index: faiss.Index):
+    index = _base_index(index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
+
+def search_parameters(index: faiss.Index, sel=None):
+    """SearchParameters of the right subclass for `index`, carrying its nprobe / efSearch and a selector."""
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=sel, nprobe=ivf.nprobe)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=sel)
+
+def read_index(path: str, mmap: bool = True) -> faiss.Index:
+    """
+    Load an index for serving. With mmap, vector codes stay in the file's page-cache pages
+    (read-only, shared by every process that maps the file) instead of being copied into
+    private memory; the index must not be modified. Falls back to a normal read when this
+    faiss build can't map the index.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing {path} (build your index first)")
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and flag is not None:
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"mmap load of {path} failed ({str(e).splitlines()[0]}); reading it into memory.")
+    return faiss.read_index(path)
+
+def params_path(index_path: str) -> str:
+    return index_path + ".json"
+
+def save_params(index_path: str, params: Dict[str, Any], report: Optional[Dict[str, Any]] = None):
+    """Store the build parameters (and the recall/latency report) next to the index file."""
+    out = dict(params)
+    if report:
+        out["report"] = report
+    tmp = params_path(index_path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(out, f, indent=2)
+    os.replace(tmp, params_path(index_path))
+
+def load_params(index_path: str) -> Dict[str, Any]:
+    """Parameters saved by save_params, or the flat defaults for indexes built before they existed."""
+    try:
+        with open(params_path(index_path)) as f:
+            return dict(DEFAULT_PARAMS, **json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULT_PARAMS)
+
+def _latencies_ms(index: faiss.Index, queries: np.ndarray, k: int) -> np.ndarray:
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q[None, :], k)
+        out.append((time.perf_counter() - t0) * 1000)
+    return np.asarray(out)
+
+def _report(index: faiss.Index, queries: np.ndarray, qids: np.ndarray, truth_I: np.ndarray,
+            k: int, exact: Optional[faiss.Index] = None) -> Dict[str, Any]:
+    kk = min(k + 1, index.ntotal)
+    _, I_ann = index.search(queries, kk)
+    hits = []
+    for qid, truth, got in zip(qids, truth_I, I_ann):
+        truth = [i for i in truth if i != qid and i != -1][:k]
+        got = [i for i in got if i != qid and i != -1][:k]
+        if truth:
+            hits.append(len(set(truth) & set(got)) / len(truth))
+    lat_ann = _latencies_ms(index, queries, k)
+    report = {
+        "k": k,
+        "queries": int(len(qids)),
+        "recall_at_k": round(float(np.mean(hits)), 4) if hits else None,
+        "p50_ms": round(float(np.percentile(lat_ann, 50)), 3),
+        "p99_ms": round(float(np.percentile(lat_ann, 99)), 3),
+    }
+    if exact is not None:
+        lat_exact = _latencies_ms(exact, queries, k)
+        report["exact_p50_ms"] = round(float(np.percentile(lat_exact, 50)), 3)
+        report["exact_p99_ms"] = round(float(np.percentile(lat_exact, 99)), 3)
+    return report
+
+def recall_report(index: faiss.Index, vecs: np.ndarray, k: int = 10, n_queries: int = 200) -> Dict[str, Any]:
+    """
+    recall@k of `index` against exact search, plus p50/p99 single-query latency of both.
+    Queries are a random sample of the corpus; each query's own row is held out of both
+    result lists so self-matches don't inflate recall.
+    """
+    n = len(vecs)
+    if n_queries <= 0 or n < 2:
+        return {}
+    rng = np.random.default_rng(0)
+    qids = rng.choice(n, min(n_queries, n), replace=False)
+    queries = vecs[qids]
+    exact = faiss.IndexFlatIP(vecs.shape[1])
+    exact.add(vecs)
+    _, I_exact = exact.search(queries, min(k + 1, n))
+    return _report(index, queries, qids, I_exact, k, exact)
+
+def print_report(report: Dict[str, Any]):
+    if not report:
+        return
+    print(f"recall@{report['k']} vs exact: {report['recall_at_k']} over {report['queries']} held-out queries")
+    line = f"latency p50/p99: {report['p50_ms']}/{report['p99_ms']} ms"
+    if "exact_p50_ms" in report:
+        line += f" (exact {report['exact_p50_ms']}/{report['exact_p99_ms']} ms)"
+    print(line)
@@ -1,8 +1,19 @@
 # src/api.py
+from contextlib import asynccontextmanager
 from typing import List, Optional
 from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 
-app = FastAPI(title="Restaurant Bot API", version="0.1.0")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # preload encoder, indexes, metadata and analytics data on a background thread so the
+    # first requests don't pay for them; /ready says when that's done (see warmup.py)
+    from .warmup import start
+    start()
+    yield
+
+app = FastAPI(title="Restaurant Bot API", version="0.1.0", lifespan=_lifespan)
 def _to_jsonable(obj):
     """Recursively convert non-serializable objects (NumPy, NaN, sets, datetimes) to plain JSON-safe Python."""
     import math
@@ -51,14 +62,54 @@ def _to_jsonable(obj):
 
 
 @app.get("/health")
-def health():
+async def health():
+    # async and work-free: stays responsive while the worker pools are saturated
     return {"ok": True}
 
+@app.get("/ready")
+async def ready():
+    """Readiness for load balancers: 503 until every required component has been preloaded."""
+    from .warmup import readiness
+    body = readiness()
+    return body if body["ready"] else JSONResponse(status_code=503, content=_to_jsonable(body))
+
 def _err_payload(e: Exception):
     return {"error": f"{type(e).__name__}: {e}"}
 
+async def _offload(pool: str, fn, *args):
+    """Run blocking work on the endpoint class's bounded pool; fast 503 + Retry-After when it's full."""
+    from .workpool import get_pool, Overloaded
+    try:
+        return await get_pool(pool).run(fn, *args)
+    except Overloaded as e:
+        return JSONResponse(status_code=503, content=_err_payload(e),
+                            headers={"Retry-After": str(e.retry_after)})
+
+@app.get("/stats")
+def stats():
+    """
+    Operator view of process-wide resources (loaded encoders, query-embedding cache, worker pools,
+    resident vs shared memory of this worker) and retrieval telemetry (rounds, candidates scanned,
+    filter / dedupe rejection).
+    """
+    try:
+        from .encoders import encoder_stats
+        from .query_cache import get_cache
+        from .workpool import pool_stats
+        from .retriever import search_stats
+        from .vector_store import memory_stats
+        return {
+            "encoders": _to_jsonable(encoder_stats()),
+            "query_cache": _to_jsonable(get_cache().stats()),
+            "pools": _to_jsonable(pool_stats()),
+            "search": _to_jsonable(search_stats()),
+            "memory": _to_jsonable(memory_stats()),
+        }
+    except Exception as e:
+        return _err_payload(e)
+
 @app.get("/search")
-def search(
+async def search(
     q: str = Query(...),
     city: Optional[str] = None,
     categories: Optional[List[str]] = Query(None),
@@ -68,6 +119,9 @@ def search(
     Internal semantic search (+ simple filters).
     Lazy-imports to avoid crashing the whole app if a module has issues.
     """
+    return await _offload("search", _search, q, city, categories, k)
+
+def _search(q, city, categories, k):
     try:
         from .retriever import find_restaurants, DEFAULT_CITY
         filters = {}
@@ -87,8 +141,50 @@ def search(
     except Exception as e:
         return _err_payload(e)
 
+class BatchQuery(BaseModel):
+    q: str
+    city: Optional[str] = None
+    categories: Optional[List[str]] = None
+    k: int = 5
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+
+@app.post("/search/batch")
+async def search_batch(body: BatchSearchRequest):
+    """
+    Many /search queries in one call: one encode for the batch and one FAISS search per
+    distinct filter set. Results are returned in request order.
+    """
+    return await _offload("search", _search_batch, body)
+
+def _search_batch(body: BatchSearchRequest):
+    try:
+        from .retriever import find_restaurants_many
+        results = []
+        filters = []
+        for bq in body.queries:
+            f = {}
+            if bq.city:
+                f["city"] = bq.city
+            if bq.categories:
+                f["categories_any"] = bq.categories
+            filters.append(f)
+        res = find_restaurants_many(
+            queries=[bq.q for bq in body.queries],
+            k=[bq.k for bq in body.queries],
+            filters=filters,
+            limit_per_restaurant=1,
+            auto_city=True,
+        )
+        for bq, rows in zip(body.queries, res):
+            results.append({"q": bq.q, "count": len(rows), "results": _to_jsonable(rows[:bq.k])})
+        return {"count": len(results), "results": results}
+    except Exception as e:
+        return _err_payload(e)
+
 @app.get("/rag")
-def rag(
+async def rag(
     q: str = Query(...),
     city: Optional[str] = None,
     k_internal: int = 5,
@@ -98,6 +194,9 @@ def rag(
     Return the retrieved contexts + citations (LLM call is handled in CLI;
     API shows the evidence clearly for demo).
     """
+    return await _offload("rag", _rag, q, city, k_internal, k_external)
+
+def _rag(q, city, k_internal, k_external):
     try:
         from .dual_retriever import dual_retrieve
         bundle = dual_retrieve(query=q, city=city, k_internal=k_internal, k_external=k_external)
@@ -130,32 +229,50 @@ def rag(
         return _err_payload(e)
 
 @app.post("/compare")
-def compare(
+async def compare(
     city: str = "San Francisco",
     a: List[str] = Query(..., description="Category terms for group A"),
     b: List[str] = Query(..., description="Category terms for group B"),
 ):
     """
-    Average price comparison using your internal CSV.
+    Price comparison (mean, median, distribution) from the precomputed price cube.
     """
+    return await _offload("analytics", _compare, city, a, b)
+
+def _compare(city, a, b):
     try:
-        import os, pandas as pd
-        from .analytics import avg_price_for_category, CSV_PATH
-        if not os.path.exists(CSV_PATH):
-            return {"error": f"Missing {CSV_PATH}"}
-        df = pd.read_csv(CSV_PATH).fillna("")
-        avg_a = avg_price_for_category(df, city, a)
-        avg_b = avg_price_for_category(df, city, b)
+        from .price_cube import get_price_cube
+        cube = get_price_cube()
         return {
             "city": city,
-            "a": {"terms": a, "avg_price": None if str(avg_a) == "nan" else avg_a},
-            "b": {"terms": b, "avg_price": None if str(avg_b) == "nan" else avg_b},
+            "a": {"terms": a, **cube.stats(city, a)},
+            "b": {"terms": b, **cube.stats(city, b)},
         }
     except Exception as e:
         return _err_payload(e)
 
+class CompareMatrixRequest(BaseModel):
+    cities: List[str]
+    groups: List[List[str]]
+    percentiles: List[float] = [25, 50, 75]
+
+@app.post("/compare/matrix")
+async def compare_matrix(body: CompareMatrixRequest):
+    """
+    Average price, count and percentiles for N category term groups x M cities in one pass.
+    Matrices are indexed [group][city]; empty cells are null.
+    """
+    return await _offload("analytics", _compare_matrix, body)
+
+def _compare_matrix(body: CompareMatrixRequest):
+    try:
+        from .analytics import compare_matrix, load_frame
+        return _to_jsonable(compare_matrix(load_frame(), body.groups, body.cities, body.percentiles))
+    except Exception as e:
+        return _err_payload(e)
+
 @app.get("/trend")
-def trend(
+async def trend(
     terms: List[str] = Query(...),
     months: int = 12,
     must_include: str = "",
@@ -164,15 +281,17 @@ def trend(
     """
     Monthly trend from external feeds (recency-aware).
     """
+    return await _offload("analytics", _trend, terms, months, must_include, mode)
+
+def _trend(terms, months, must_include, mode):
     try:
-        import os, pickle
-        from .trend_external import monthly_trend, EXT_META_PATH
+        import os
+        from .trend_external import monthly_trend, get_trend_index, EXT_META_PATH
         if not os.path.exists(EXT_META_PATH):
             return {"error": f"Missing {EXT_META_PATH}. Run ext_ingest first."}
-        with open(EXT_META_PATH, "rb") as f:
-            meta = pickle.load(f)
         must = must_include.strip() or None
-        rows = monthly_trend(meta, terms, must_include=must, months=months, mode=mode)
+        # resident token/date index; reloaded only when ext_ingest rewrites the metadata
+        rows = monthly_trend(get_trend_index(), terms, must_include=must, months=months, mode=mode)
         return {"terms": terms, "months": months, "must_include": must, "mode": mode,
                 "buckets": [{"month": ym, "count": c, "samples": s} for ym, c, s in rows]}
     except Exception as e:
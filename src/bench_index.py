@@ -0,0 +1,104 @@
+# src/bench_index.py
+import argparse, json, pickle, time
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import faiss
+from . import ann
+
+# Compare vector storage options on our own embeddings: each config is built over the same
+# vectors and measured for index size, single-query latency and top-k overlap with exact
+# float32 search (held-out queries, as in ann.recall_report).
+DEFAULT_CONFIGS = ["float32", "fp16", "sq8", "pca128", "pca128+sq8"]
+
+
+def parse_config(spec: str) -> Tuple[str, int]:
+    """'sq8' -> ("sq8", 0); 'pca128+fp16' -> ("fp16", 128); 'pca128' -> ("float32", 128)."""
+    storage, pca = "float32", 0
+    for part in spec.lower().split("+"):
+        if part.startswith("pca"):
+            pca = int(part[3:])
+        elif part in ann.STORAGE_TYPES:
+            storage = part
+        else:
+            raise ValueError(f"Bad config part {part!r} in {spec!r} (storage {ann.STORAGE_TYPES} or pca<dim>)")
+    return storage, pca
+
+def internal_vectors(limit: int = 0, use_cache: bool = True) -> np.ndarray:
+    """Menu item embeddings for the CSV rows, as ingest_embeddings builds them."""
+    from .ingest_embeddings import CSV_PATH, EMBED_MODEL, build_text_and_meta, embed_texts, iter_chunks
+    from .embed_cache import get_cache
+    cache = get_cache(EMBED_MODEL) if use_cache else None
+    out, rows = [], 0
+    for df in iter_chunks(CSV_PATH):
+        if limit:
+            df = df.iloc[: limit - rows]
+        texts, _ = build_text_and_meta(df, start_row=rows)
+        out.append(embed_texts(texts, cache=cache))
+        rows += len(df)
+        if limit and rows >= limit:
+            break
+    return np.concatenate(out) if out else np.empty((0, 0), dtype="float32")
+
+def external_vectors(limit: int = 0, use_cache: bool = True) -> np.ndarray:
+    """Chunk embeddings for the current external metadata, as ext_ingest builds them."""
+    from .ext_ingest import EXT_META_PATH, embed_texts
+    with open(EXT_META_PATH, "rb") as f:
+        docs = pickle.load(f)
+    if limit:
+        docs = docs[:limit]
+    return embed_texts([d["text"] for d in docs], use_cache=use_cache)
+
+def bench(vecs: np.ndarray, base: Dict[str, Any], configs: List[str], k: int = 10,
+          n_queries: int = 200) -> List[Dict[str, Any]]:
+    rows = []
+    for spec in configs:
+        storage, pca = parse_config(spec)
+        params = dict(base, storage=storage, pca=pca)
+        t0 = time.perf_counter()
+        index = ann.build_index(vecs, params)
+        build_s = time.perf_counter() - t0
+        nbytes = int(faiss.serialize_index(index).nbytes)
+        report = ann.recall_report(index, vecs, k=k, n_queries=n_queries)
+        rows.append({"config": spec, "type": params["type"], "build_s": round(build_s, 2),
+                     "index_bytes": nbytes, "bytes_per_vector": round(nbytes / max(len(vecs), 1), 1),
+                     **report})
+    return rows
+
+def print_table(rows: List[Dict[str, Any]]):
+    if not rows:
+        return
+    base = rows[0]["index_bytes"] or 1
+    print(f"{'config':<16}{'MB':>9}{'B/vec':>9}{'vs 1st':>8}{'overlap@k':>11}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}")
+    for r in rows:
+        print(f"{r['config']:<16}{r['index_bytes'] / 2**20:>9.2f}{r['bytes_per_vector']:>9.1f}"
+              f"{r['index_bytes'] / base:>8.2f}{str(r.get('recall_at_k')):>11}"
+              f"{r.get('p50_ms', 0):>9.3f}{r.get('p99_ms', 0):>9.3f}{r['build_s']:>9.2f}")
+    if "exact_p50_ms" in rows[0]:
+        print(f"exact float32 scan: p50/p99 {rows[0]['exact_p50_ms']}/{rows[0]['exact_p99_ms']} ms")
+
+def main():
+    ap = argparse.ArgumentParser(description="Index size / latency / top-k overlap for storage options")
+    ap.add_argument("--source", choices=["internal", "external"], default="internal",
+                    help="internal = menu items from the CSV; external = chunks in the external metadata")
+    ap.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                    help="Storage configs, e.g. float32 fp16 sq8 pca128 pca128+sq8")
+    ap.add_argument("--limit", type=int, default=0, help="Only the first N rows (0 = all)")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--no-embed-cache", action="store_true")
+    ap.add_argument("--out", type=str, default=None, help="Also write the results as JSON here")
+    ann.add_index_args(ap)
+    args = ap.parse_args()
+    base = ann.params_from_args(args)
+
+    load = internal_vectors if args.source == "internal" else external_vectors
+    vecs = load(args.limit, use_cache=not args.no_embed_cache)
+    print(f"{len(vecs)} vectors x {vecs.shape[1]} dims ({args.source}), {base['type']} index, "
+          f"{args.report_queries} held-out queries, k={args.k}")
+    rows = bench(vecs, base, args.configs, k=args.k, n_queries=args.report_queries)
+    print_table(rows)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 # src/cli.py
-import argparse, pickle, os
-from typing import List
-from .retriever import find_restaurants, DEFAULT_CITY
-from .rag_answer import answer_query as rag_answer
-from .analytics import avg_price_for_category, CSV_PATH
-from .trend_external import monthly_trend, EXT_META_PATH
+import argparse, json, os, socket, sys
+from typing import List, Optional
+
+# Subcommands import what they need when they run, so `compare` never loads torch / faiss.
+# `serve-local` keeps the model and indexes warm behind a Unix socket; while it is running
+# (in the same directory), every other subcommand is forwarded to it unless --local is given.
+SOCKET_PATH = os.getenv("RESTAURANT_BOT_SOCKET", ".restaurant-bot.sock")
 
 def _print_rows(rows, limit=10):
     for i, r in enumerate(rows[:limit], 1):
@@ -16,6 +17,7 @@ def _print_rows(rows, limit=10):
         print(f"#{i} {name} — {city}, {state} | {cats} | score={score:.3f}")
 
 def cmd_search(args):
+    from .retriever import find_restaurants, DEFAULT_CITY
     filters = {}
     if args.city:
         filters["city"] = args.city
@@ -35,28 +37,46 @@ def cmd_search(args):
     _print_rows(res, limit=args.k)
 
 def cmd_rag(args):
+    from .rag_answer import answer_query as rag_answer
     # answer prints itself (real LLM or mock fallback)
     rag_answer(args.q, city=args.city)
 
 def cmd_compare(args):
-    import pandas as pd
-    if not os.path.exists(CSV_PATH):
+    from .analytics import CSV_PATH
+    from .price_cube import PRICE_CUBE_PATH, get_price_cube
+    if not os.path.exists(CSV_PATH) and not os.path.exists(PRICE_CUBE_PATH):
         raise FileNotFoundError(f"Missing CSV at {CSV_PATH}")
-    df = pd.read_csv(CSV_PATH).fillna("")
-    a = avg_price_for_category(df, args.city, args.a)
-    b = avg_price_for_category(df, args.city, args.b)
-    def fmt(label, v): return f"{label}: {v:.2f}" if v == v else f"{label}: N/A"
+    cube = get_price_cube()
+    a = cube.stats(args.city, args.a)
+    b = cube.stats(args.city, args.b)
+    def fmt(label, st):
+        if not st["count"]:
+            return f"{label}: N/A"
+        return f"{label}: {st['avg_price']:.2f} (median {st['median_price']:.2f}, n={st['count']})"
     print(f"City: {args.city}")
     print(fmt(f"A ({' '.join(args.a)})", a))
     print(fmt(f"B ({' '.join(args.b)})", b))
 
+def cmd_compare_matrix(args):
+    from .analytics import CSV_PATH, compare_matrix, load_frame
+    if not os.path.exists(CSV_PATH):
+        raise FileNotFoundError(f"Missing CSV at {CSV_PATH}")
+    res = compare_matrix(load_frame(), args.group, args.cities)
+    width = max(len(c) for c in args.cities) + 2
+    print("group".ljust(30) + "".join(c.rjust(width) for c in args.cities))
+    for i, g in enumerate(args.group):
+        cells = []
+        for j in range(len(args.cities)):
+            avg, n = res["avg_price"][i, j], res["count"][i, j]
+            cells.append((f"{avg:.2f} (n={n})" if n else "N/A").rjust(width))
+        print(" ".join(g)[:29].ljust(30) + "".join(cells))
+
 def cmd_trend(args):
+    from .trend_external import monthly_trend, get_trend_index, EXT_META_PATH
     if not os.path.exists(EXT_META_PATH):
         raise FileNotFoundError(f"Missing {EXT_META_PATH}. Run ext_ingest first.")
-    with open(EXT_META_PATH, "rb") as f:
-        meta = pickle.load(f)
     must = args.must_include.strip() or None
-    trend = monthly_trend(meta, args.terms, must_include=must, months=args.months, mode=args.mode)
+    trend = monthly_trend(get_trend_index(), args.terms, must_include=must, months=args.months, mode=args.mode)
     if not trend:
         print("No matches with the current feeds/filters.")
         return
@@ -66,12 +86,124 @@ def cmd_trend(args):
         for s in samples:
             print(f"   - {s['title']}  ({s['url']})")
 
-def main():
-    ap = argparse.ArgumentParser(prog="restaurant-bot")
+def _run_request(req) -> dict:
+    """Run one forwarded command line in the daemon, capturing what it prints."""
+    import contextlib, io, traceback
+    if req.get("cwd") != os.getcwd():
+        # relative data paths would resolve elsewhere; the client runs it itself
+        return {"code": None, "stdout": "", "stderr": ""}
+    out, err = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            args = build_parser().parse_args(req["argv"])
+            if args.cmd == "serve-local":
+                raise SystemExit("serve-local is already running")
+            args.func(args)
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    return {"code": code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+def _daemon_alive(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+        return True
+    except OSError:
+        return False
+
+def cmd_serve_local(args):
+    import signal, socketserver, time
+    from .warmup import readiness, run as warm_up
+    path = args.socket
+    if os.path.exists(path):
+        if _daemon_alive(path):
+            raise SystemExit(f"serve-local is already running on {path}")
+        os.unlink(path)  # left behind by a daemon that didn't shut down cleanly
+    t0 = time.perf_counter()
+    warm_up()
+    state = readiness()
+    failed = [n for n, c in state["components"].items() if c["state"] == "failed"]
+    print(f"Warm in {time.perf_counter() - t0:.1f}s" + (f" (failed: {', '.join(failed)})" if failed else ""))
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line.strip():
+                return  # a liveness probe (see _daemon_alive)
+            try:
+                reply = _run_request(json.loads(line))
+            except ValueError as e:
+                reply = {"code": 2, "stdout": "", "stderr": f"bad request: {e}\n"}
+            try:
+                self.wfile.write(json.dumps(reply).encode("utf-8"))
+            except BrokenPipeError:
+                pass  # client gave up (e.g. Ctrl-C); nothing to deliver
+
+    # one request at a time: commands print to a redirected process-wide stdout.
+    # The umask makes the socket 0600 from the moment it's bound, not after a chmod.
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(path, Handler)
+    finally:
+        os.umask(old_umask)
+
+    def _stop(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _stop)  # `kill` cleans up the socket like Ctrl-C does
+    print(f"Serving on {path} (Ctrl-C to stop); restart after re-ingesting to pick up new indexes.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def _forward(argv: List[str], path: str = SOCKET_PATH) -> Optional[int]:
+    """Run argv in the serve-local daemon; None when none is running here (or it declined)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+    except OSError:
+        return None  # stale socket file
+    with s:
+        s.sendall(json.dumps({"argv": argv, "cwd": os.getcwd()}).encode("utf-8") + b"\n")
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    try:
+        reply = json.loads(b"".join(chunks))
+    except ValueError:
+        return None  # daemon went away mid-request
+    if reply["code"] is None:
+        return None
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["code"]
+
+def build_parser() -> argparse.ArgumentParser:
+    # --local works before or after the subcommand; SUPPRESS keeps a subcommand's unset
+    # default from overwriting `restaurant-bot --local <cmd>`
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--local", action="store_true", default=argparse.SUPPRESS,
+                        help="Run in this process even when serve-local is running")
+    ap = argparse.ArgumentParser(prog="restaurant-bot", parents=[common])
     sub = ap.add_subparsers(dest="cmd", required=True)
 
     # search
-    ap_search = sub.add_parser("search", help="Internal semantic search (+ filters)")
+    ap_search = sub.add_parser("search", help="Internal semantic search (+ filters)", parents=[common])
     ap_search.add_argument("--q", required=True, help="Query text")
     ap_search.add_argument("--city", default=None, help="City (defaults to San Francisco if omitted or 'near me')")
     ap_search.add_argument("--categories", nargs="+", default=None, help="Category terms to filter (any match)")
@@ -79,27 +211,48 @@ def main():
     ap_search.set_defaults(func=cmd_search)
 
     # rag
-    ap_rag = sub.add_parser("rag", help="RAG answer (internal + external with citations)")
+    ap_rag = sub.add_parser("rag", help="RAG answer (internal + external with citations)", parents=[common])
     ap_rag.add_argument("--q", required=True)
     ap_rag.add_argument("--city", default=None)
     ap_rag.set_defaults(func=cmd_rag)
 
     # compare
-    ap_cmp = sub.add_parser("compare", help="Average price comparison by categories")
+    ap_cmp = sub.add_parser("compare", help="Average price comparison by categories", parents=[common])
     ap_cmp.add_argument("--city", default="San Francisco")
     ap_cmp.add_argument("--a", nargs="+", required=True, help="Category terms for group A")
     ap_cmp.add_argument("--b", nargs="+", required=True, help="Category terms for group B")
     ap_cmp.set_defaults(func=cmd_compare)
 
+    # compare matrix: N term groups x M cities
+    ap_mat = sub.add_parser("compare-matrix", help="Average price for several category groups across several cities", parents=[common])
+    ap_mat.add_argument("--cities", nargs="+", default=["San Francisco"])
+    ap_mat.add_argument("--group", nargs="+", action="append", required=True,
+                        help="Category terms for one group; repeat --group for each group")
+    ap_mat.set_defaults(func=cmd_compare_matrix)
+
     # trend (external)
-    ap_trend = sub.add_parser("trend", help="Monthly trend from external RSS/Wiki")
+    ap_trend = sub.add_parser("trend", help="Monthly trend from external RSS/Wiki", parents=[common])
     ap_trend.add_argument("--months", type=int, default=12)
     ap_trend.add_argument("--terms", nargs="+", required=True)
     ap_trend.add_argument("--must_include", default="", help="Optional location keyword")
     ap_trend.add_argument("--mode", choices=["all","any"], default="all")
     ap_trend.set_defaults(func=cmd_trend)
 
-    args = ap.parse_args()
+    # warm daemon
+    ap_serve = sub.add_parser("serve-local", help="Keep model + indexes loaded and serve CLI calls over a Unix socket")
+    ap_serve.add_argument("--socket", default=SOCKET_PATH, help="Socket path (RESTAURANT_BOT_SOCKET)")
+    ap_serve.set_defaults(func=cmd_serve_local)
+    return ap
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+    if not getattr(args, "local", False) and args.cmd != "serve-local":
+        code = _forward(argv)
+        if code is not None:
+            if code:
+                sys.exit(code)
+            return
     args.func(args)
 
 if __name__ == "__main__":
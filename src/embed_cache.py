@@ -0,0 +1,179 @@
+# src/embed_cache.py
+import contextlib, fcntl, hashlib, json, os, re, threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+
+# Ingest-side embedding cache, one directory per model:
+#   keys.bin        append-only records (16-byte text digest, shard, row)
+#   shard-NNNNN.f32 raw float32 vectors, SHARD_ROWS per shard, read through np.memmap
+#   meta.json       {"model", "dim"}
+#   lock            empty; flocked by writers
+# Vectors are written before their key records, so a crash mid-append leaves at most some
+# unreferenced rows, never a key pointing at missing data. A torn trailing vector or key
+# record is cut off (files truncated to whole records) before anything is appended after it.
+# Ingests sharing the directory (ingest_embeddings and ext_ingest use the same one) take an
+# exclusive flock on `lock` to truncate or append, and re-read the tail shard under it.
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "embed_cache")
+SHARD_ROWS = 65536
+_KEY = np.dtype([("digest", "u1", (16,)), ("shard", "<i4"), ("row", "<i4")])
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a text, so re-wrapped copies share one cache entry."""
+    return " ".join(str(text).split())
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()[:16]
+
+
+def _truncate_to_records(path: str, size: int) -> int:
+    """Cut `path` down to whole `size`-byte records; returns how many there are."""
+    n, torn = divmod(os.path.getsize(path), size)
+    if torn:
+        os.truncate(path, n * size)
+    return n
+
+
+class EmbeddingCache:
+    """Content-addressed (model, text hash) -> embedding store on disk."""
+
+    def __init__(self, model: str, root: str = EMBED_CACHE_DIR):
+        self.model = model
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "_", model))
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._keys_path = os.path.join(self.dir, "keys.bin")
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        self._maps: Dict[int, np.memmap] = {}
+        self._tail = 0  # shard new vectors go to
+        self._load()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive lock on the cache directory, across processes."""
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_dim(self) -> bool:
+        meta_path = os.path.join(self.dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            self.dim = int(json.load(f)["dim"])
+        return True
+
+    def _load(self):
+        if not self._read_dim() or not os.path.exists(self._keys_path):
+            return
+        with self._locked():
+            # a torn record is only cut off while no other writer is mid-append
+            n = _truncate_to_records(self._keys_path, _KEY.itemsize)
+            recs = np.fromfile(self._keys_path, dtype=_KEY, count=n)
+            self._index = {d.tobytes(): (int(s), int(r))
+                           for d, s, r in zip(recs["digest"], recs["shard"], recs["row"])}
+            if n:
+                self._tail = int(recs["shard"].max())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self.dir, f"shard-{shard:05d}.f32")
+
+    def _shard_rows(self, shard: int) -> int:
+        """Whole vectors in a shard (a torn trailing one doesn't count)."""
+        path = self._shard_path(shard)
+        return os.path.getsize(path) // (self.dim * 4) if os.path.exists(path) else 0
+
+    def _vector(self, shard: int, row: int) -> np.ndarray:
+        m = self._maps.get(shard)
+        if m is None or row >= len(m):
+            # (re)map: the tail shard grows as we append
+            rows = self._shard_rows(shard)
+            m = self._maps[shard] = np.memmap(self._shard_path(shard), dtype="<f4", mode="r", shape=(rows, self.dim))
+        return m[row]
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Any]:
+        """Cached vector (read-only view) or None for each key."""
+        out = []
+        for key in keys:
+            loc = self._index.get(key)
+            out.append(None if loc is None else self._vector(*loc))
+        return out
+
+    def put_many(self, keys: Sequence[bytes], vecs: np.ndarray):
+        vecs = np.ascontiguousarray(vecs, dtype="<f4")
+        if not len(keys):
+            return
+        with self._locked():
+            if self.dim is None and not self._read_dim():
+                self.dim = int(vecs.shape[1])
+                # readers open meta.json without the lock: never let them see it half-written
+                meta_path = os.path.join(self.dir, "meta.json")
+                with open(meta_path + ".tmp", "w") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+                os.replace(meta_path + ".tmp", meta_path)
+            # another ingest may have moved on to later shards since we last appended
+            while os.path.exists(self._shard_path(self._tail + 1)):
+                self._tail += 1
+            recs = np.zeros(len(keys), dtype=_KEY)
+            done = 0
+            while done < len(keys):
+                row = self._shard_rows(self._tail)
+                if row >= SHARD_ROWS:
+                    self._tail, row = self._tail + 1, 0
+                take = min(SHARD_ROWS - row, len(keys) - done)
+                if os.path.exists(self._shard_path(self._tail)):
+                    # drop a torn vector left by a crashed writer so new rows land at `row`
+                    _truncate_to_records(self._shard_path(self._tail), self.dim * 4)
+                with open(self._shard_path(self._tail), "ab") as f:
+                    vecs[done:done + take].tofile(f)
+                for j in range(take):
+                    recs[done + j] = (np.frombuffer(keys[done + j], dtype="u1"), self._tail, row + j)
+                    self._index[keys[done + j]] = (self._tail, row + j)
+                done += take
+            with open(self._keys_path, "ab") as f:
+                recs.tofile(f)
+
+    def encode(self, texts: Sequence[str], encode_many: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for `texts` in order; encode_many only sees texts not cached yet
+        (each distinct one once). Vectors are stored as the encoder returned them.
+        """
+        keys = [text_key(t) for t in texts]
+        found = self.get_many(keys)
+        todo: Dict[bytes, int] = {}
+        for i, (key, v) in enumerate(zip(keys, found)):
+            if v is None and key not in todo:
+                todo[key] = i
+        self.hits += len(texts) - len(todo)
+        self.misses += len(todo)
+        if todo:
+            fresh = np.asarray(encode_many([texts[i] for i in todo.values()]), dtype="float32")
+            self.put_many(list(todo), fresh)
+            by_key = dict(zip(todo, fresh))
+            found = [by_key[k] if v is None else v for k, v in zip(keys, found)]
+        if not found:
+            return np.empty((0, self.dim or 0), dtype="float32")
+        return np.stack(found).astype("float32")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model, "entries": len(self._index), "hits": self.hits,
+                "misses": self.misses, "path": self.dir}
+
+
+_caches: Dict[Tuple[str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache(model: str, root: str = EMBED_CACHE_DIR) -> EmbeddingCache:
+    with _caches_lock:
+        cache = _caches.get((root, model))
+        if cache is None:
+            cache = _caches[(root, model)] = EmbeddingCache(model, root)
+        return cache
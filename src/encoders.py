@@ -0,0 +1,125 @@
+# src/encoders.py
+import multiprocessing as mp
+import os, threading, time
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
+_lock = threading.Lock()
+_encoders: Dict[str, "SentenceTransformer"] = {}
+_stats: Dict[str, Dict[str, Any]] = {}
+
+def _resident_bytes(model) -> int:
+    """Bytes held by the model's parameters and buffers (what stays resident after load)."""
+    try:
+        n = sum(p.numel() * p.element_size() for p in model.parameters())
+        n += sum(b.numel() * b.element_size() for b in model.buffers())
+        return int(n)
+    except Exception:
+        return 0
+
+def get_encoder(name: str = EMBED_MODEL) -> "SentenceTransformer":
+    """Return the process-wide encoder for `name`, loading it once (thread-safe)."""
+    model = _encoders.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        # another request may have finished the load while we waited
+        model = _encoders.get(name)
+        if model is None:
+            # imported here so modules that only touch indexes / metadata don't pull in torch
+            from sentence_transformers import SentenceTransformer
+            t0 = time.perf_counter()
+            model = SentenceTransformer(name)
+            secs = time.perf_counter() - t0
+            size_mb = _resident_bytes(model) / (1024 * 1024)
+            _stats[name] = {
+                "load_seconds": round(secs, 3),
+                "resident_mb": round(size_mb, 1),
+                "loaded_at": time.time(),
+            }
+            _encoders[name] = model
+            print(f"Loaded encoder {name} in {secs:.2f}s ({size_mb:.1f} MB resident)")
+    return model
+
+def encoder_stats() -> Dict[str, Dict[str, Any]]:
+    """Load time and resident size for every encoder loaded in this process."""
+    return {name: dict(s) for name, s in _stats.items()}
+
+
+# ---- multi-process encoding (ingest scripts) ----
+_worker_model: Optional["SentenceTransformer"] = None
+
+def _pool_init(name: str, threads: int):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)  # N workers share the cores instead of each grabbing all
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(name)
+
+def _pool_encode(job):
+    texts, batch_size = job
+    t0 = time.perf_counter()
+    vecs = _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    return os.getpid(), time.perf_counter() - t0, np.asarray(vecs, dtype="float32")
+
+class EncodePool:
+    """
+    Shards encode() calls across `workers` processes, each holding its own copy of the model.
+    Shards come back in input order, so vector ids still line up with metadata rows.
+    Drop-in for model.encode in the ingest scripts.
+    """
+
+    def __init__(self, name: str = EMBED_MODEL, workers: int = 2, batch_size: int = 128):
+        self.name = name
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # spawn, not fork: a forked copy of an initialised torch runtime can hang
+        self._pool = mp.get_context("spawn").Pool(self.workers, initializer=_pool_init,
+                                                  initargs=(name, threads))
+        self._rows: Dict[int, int] = {}
+        self._seconds: Dict[int, float] = {}
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, show_progress_bar: bool = False) -> np.ndarray:
+        texts = list(texts)
+        batch_size = batch_size or self.batch_size
+        # a few shards per worker so a slow shard doesn't leave the others idle
+        size = max(batch_size, -(-len(texts) // (self.workers * 4)))
+        jobs = [(texts[i:i + size], batch_size) for i in range(0, len(texts), size)]
+        out = []
+        for pid, secs, vecs in self._pool.imap(_pool_encode, jobs):
+            self._rows[pid] = self._rows.get(pid, 0) + len(vecs)
+            self._seconds[pid] = self._seconds.get(pid, 0.0) + secs
+            out.append(vecs)
+        return np.concatenate(out) if out else np.empty((0, 0), dtype="float32")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Rows encoded, busy seconds and rows/sec for each worker process."""
+        return [{"pid": pid, "rows": n, "seconds": round(self._seconds[pid], 3),
+                 "rows_per_sec": round(n / self._seconds[pid], 1) if self._seconds[pid] else None}
+                for pid, n in sorted(self._rows.items())]
+
+    def print_stats(self):
+        for i, s in enumerate(self.stats(), start=1):
+            print(f"  worker {i} (pid {s['pid']}): {s['rows']} rows in {s['seconds']}s "
+                  f"({s['rows_per_sec']} rows/s)")
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self._pool.terminate()
+        self.close()
@@ -0,0 +1,146 @@
+# src/ext_fetch.py
+import hashlib, json, os, re, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+import requests
+
+# Fetch layer for ext_ingest: a bounded thread pool, a per-request timeout, and an on-disk
+# HTTP cache that revalidates with ETag / Last-Modified, so an unchanged feed costs one 304.
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "http_cache")
+FETCH_TIMEOUT = 10.0   # seconds, per source (connect and read)
+FETCH_WORKERS = 8
+USER_AGENT = "restaurant-bot/0.1 (+ext_ingest)"
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+
+
+def with_params(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+def fixture_name(url: str) -> str:
+    """
+    File a fixture for `url` is read from: the URL minus its scheme with runs of other
+    characters turned into '_', e.g. https://sf.eater.com/rss/index.xml -> sf.eater.com_rss_index.xml
+    """
+    slug = re.sub(r"[^A-Za-z0-9.-]+", "_", re.sub(r"^[a-z]+://", "", url)).strip("_")
+    if len(slug) > 120:
+        slug = slug[:100] + "_" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return slug
+
+
+class Fetcher:
+    """
+    GET with a conditional-request cache. With `fixtures`, URLs are served from files in that
+    directory (see fixture_name) and the network is never touched.
+    Each result is a dict: url, status ("fetched" | "not_modified" | "fixture" | "error"),
+    body (bytes or None), seconds, error.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = HTTP_CACHE_DIR, timeout: float = FETCH_TIMEOUT,
+                 fixtures: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.fixtures = fixtures
+        if cache_dir and not fixtures:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_paths(self, url: str):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json"), os.path.join(self.cache_dir, key + ".body")
+
+    def _from_fixture(self, url: str) -> Dict[str, Any]:
+        path = os.path.join(self.fixtures, fixture_name(url))
+        if not os.path.exists(path):
+            return {"url": url, "status": "error", "body": None, "seconds": 0.0,
+                    "error": f"no fixture {path}"}
+        with open(path, "rb") as f:
+            return {"url": url, "status": "fixture", "body": f.read(), "seconds": 0.0, "error": None}
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = with_params(url, params)
+        if self.fixtures:
+            return self._from_fixture(url)
+        t0 = time.perf_counter()
+        headers = {"User-Agent": USER_AGENT}
+        cached = None
+        if self.cache_dir:
+            meta_path, body_path = self._cache_paths(url)
+            if os.path.exists(meta_path) and os.path.exists(body_path):
+                with open(meta_path) as f:
+                    cached = json.load(f)
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            r = requests.get(url, headers=headers, timeout=self.timeout)
+            if r.status_code == 304 and cached is not None:
+                with open(body_path, "rb") as f:
+                    body = f.read()
+                return {"url": url, "status": "not_modified", "body": body,
+                        "seconds": time.perf_counter() - t0, "error": None}
+            r.raise_for_status()
+        except Exception as e:
+            return {"url": url, "status": "error", "body": None,
+                    "seconds": time.perf_counter() - t0, "error": f"{type(e).__name__}: {e}"}
+        if self.cache_dir and (r.headers.get("ETag") or r.headers.get("Last-Modified")):
+            # body first, then the validators that point at it
+            with open(body_path + ".tmp", "wb") as f:
+                f.write(r.content)
+            os.replace(body_path + ".tmp", body_path)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump({"url": url, "etag": r.headers.get("ETag"),
+                           "last_modified": r.headers.get("Last-Modified"), "fetched_at": time.time()}, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        return {"url": url, "status": "fetched", "body": r.content,
+                "seconds": time.perf_counter() - t0, "error": None}
+
+
+def fetch_all(fetcher: Fetcher, urls: List[str], workers: int = FETCH_WORKERS) -> List[Dict[str, Any]]:
+    """Fetch `urls` concurrently (at most `workers` at a time); results in input order."""
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls))), thread_name_prefix="fetch") as pool:
+        results = list(pool.map(fetcher.get, urls))
+    for res in results:
+        note = res["error"] if res["status"] == "error" else f"{len(res['body'])} bytes"
+        print(f"  [{res['status']}] {res['url']} ({res['seconds']:.2f}s, {note})")
+    return results
+
+
+def _wiki_json(fetcher: Fetcher, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    res = fetcher.get(WIKI_API, dict(params, format="json", formatversion=2))
+    if res["status"] == "error":
+        print(f"  [error] {res['url']} ({res['error']})")
+        return None
+    return json.loads(res["body"])
+
+def wikipedia_page(fetcher: Fetcher, title: str) -> Optional[tuple]:
+    """
+    (title, url, plain-text content) of a page via the MediaWiki API, following redirects;
+    when the title doesn't exist, the top search hit is used instead.
+    """
+    query = {"action": "query", "prop": "extracts|info", "explaintext": 1, "inprop": "url", "redirects": 1}
+    data = _wiki_json(fetcher, dict(query, titles=title))
+    pages = (data or {}).get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing") or not pages[0].get("extract"):
+        hits = _wiki_json(fetcher, {"action": "query", "list": "search", "srsearch": title, "srlimit": 1})
+        hits = (hits or {}).get("query", {}).get("search", [])
+        if not hits:
+            return None
+        data = _wiki_json(fetcher, dict(query, titles=hits[0]["title"]))
+        pages = (data or {}).get("query", {}).get("pages", [])
+        if not pages or pages[0].get("missing"):
+            return None
+    page = pages[0]
+    return page["title"], page.get("fullurl", ""), page.get("extract", "")
+
+def fetch_wikipedia(fetcher: Fetcher, titles: List[str], workers: int = FETCH_WORKERS) -> List[tuple]:
+    """wikipedia_page for each title, concurrently; pages that can't be found are skipped."""
+    if not titles:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(titles))), thread_name_prefix="fetch") as pool:
+        pages = list(pool.map(lambda t: wikipedia_page(fetcher, t), titles))
+    for title, page in zip(titles, pages):
+        print(f"  [wikipedia] {title}: " + (f"{page[0]} ({len(page[2])} chars)" if page else "not found"))
+    return [p for p in pages if p]
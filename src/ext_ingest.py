@@ -1,12 +1,15 @@
 # src/ext_ingest.py
-import argparse, pickle, re
+import argparse, os, pickle, re, time
 from typing import List, Tuple, Dict, Optional
-import wikipedia
 import feedparser
 from dateutil import parser as dateparser
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+from .encoders import EncodePool, get_encoder
+from .embed_cache import get_cache, text_key
+from .trend_external import TrendIndex, published_epoch, TREND_INDEX_PATH
+from . import ann
+from .ext_fetch import Fetcher, fetch_all, fetch_wikipedia, FETCH_TIMEOUT, FETCH_WORKERS, HTTP_CACHE_DIR
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
 EMBED_DIM = 384
@@ -30,100 +33,209 @@ def chunk_text(t: str, chunk_size: int = 900, overlap: int = 120) -> List[str]:
         start = end - overlap
     return chunks
 
-def fetch_wikipedia_pages(titles: List[str]) -> List[Tuple[str, str, str]]:
-    out = []
-    for title in titles:
-        try:
-            page = wikipedia.page(title, auto_suggest=False)
-            out.append((page.title, page.url, page.content))
-        except Exception:
+def fetch_wikipedia_pages(titles: List[str], fetcher: Optional[Fetcher] = None,
+                          workers: int = FETCH_WORKERS) -> List[Tuple[str, str, str]]:
+    return fetch_wikipedia(fetcher or Fetcher(), titles, workers)
+
+def _parse_entry(entry) -> Tuple[str, str, str, str]:
+    title = clean_text(getattr(entry, "title", ""))
+    link = getattr(entry, "link", "")
+
+    # Prefer content if present; fall back to summary/description
+    summary = ""
+    parts = getattr(entry, "content", None)
+    if parts:
+        if isinstance(parts, list):
+            vals = []
+            for p in parts:
+                try:
+                    if isinstance(p, dict):
+                        vals.append(clean_text(p.get("value", "")))
+                    else:
+                        vals.append(clean_text(getattr(p, "value", "")))
+                except Exception:
+                    pass
+            summary = " ".join(v for v in vals if v)
+        else:
+            # Unknown structure; fall back to summary/description
+            summary = clean_text(getattr(entry, "summary", "") or getattr(entry, "description", ""))
+    else:
+        summary = clean_text(getattr(entry, "summary", "") or getattr(entry, "description", ""))
+
+    # Try multiple date fields; fall back to *_parsed tuples
+    published_iso = ""
+    candidates = [
+        getattr(entry, "published", None),
+        getattr(entry, "updated", None),
+        getattr(entry, "created", None),
+        getattr(entry, "pubDate", None),
+        getattr(entry, "dc:date", None),
+    ]
+    for cand in candidates:
+        if cand:
             try:
-                hits = wikipedia.search(title)
-                if hits:
-                    page = wikipedia.page(hits[0])
-                    out.append((page.title, page.url, page.content))
+                d = dateparser.parse(cand)
+                if d:
+                    published_iso = d.isoformat()
+                    break
             except Exception:
                 pass
-    return out
+    if not published_iso:
+        for t in [
+            getattr(entry, "published_parsed", None),
+            getattr(entry, "updated_parsed", None),
+            getattr(entry, "created_parsed", None),
+        ]:
+            if t:
+                try:
+                    published_iso = time.strftime("%Y-%m-%dT%H:%M:%S", t)
+                    break
+                except Exception:
+                    pass
+
+    return title, link, summary, published_iso
 
-def fetch_rss_articles(feeds: List[str], max_items_per_feed: int = 10) -> List[Tuple[str, str, str, str]]:
-    import time
+def fetch_rss_articles(feeds: List[str], max_items_per_feed: int = 10, fetcher: Optional[Fetcher] = None,
+                       workers: int = FETCH_WORKERS) -> List[Tuple[str, str, str, str]]:
+    """Entries of every feed; a feed the server reports as not modified is parsed from the cached body."""
     out = []
-    for url in feeds:
+    for res in fetch_all(fetcher or Fetcher(), feeds, workers):
+        if res["status"] == "error":
+            continue
         try:
-            feed = feedparser.parse(url)
+            feed = feedparser.parse(res["body"])
             for entry in feed.entries[:max_items_per_feed]:
-                title = clean_text(getattr(entry, "title", ""))
-                link = getattr(entry, "link", "")
-
-                # Prefer content if present; fall back to summary/description
-                summary = ""
-                parts = getattr(entry, "content", None)
-                if parts:
-                    if isinstance(parts, list):
-                        vals = []
-                        for p in parts:
-                            try:
-                                if isinstance(p, dict):
-                                    vals.append(clean_text(p.get("value", "")))
-                                else:
-                                    vals.append(clean_text(getattr(p, "value", "")))
-                            except Exception:
-                                pass
-                        summary = " ".join(v for v in vals if v)
-                    else:
-                        # Unknown structure; fall back to summary/description
-                        summary = clean_text(getattr(entry, "summary", "") or getattr(entry, "description", ""))
-                else:
-                    summary = clean_text(getattr(entry, "summary", "") or getattr(entry, "description", ""))
-
-                # Try multiple date fields; fall back to *_parsed tuples
-                published_iso = ""
-                candidates = [
-                    getattr(entry, "published", None),
-                    getattr(entry, "updated", None),
-                    getattr(entry, "created", None),
-                    getattr(entry, "pubDate", None),
-                    getattr(entry, "dc:date", None),
-                ]
-                for cand in candidates:
-                    if cand:
-                        try:
-                            d = dateparser.parse(cand)
-                            if d:
-                                published_iso = d.isoformat()
-                                break
-                        except Exception:
-                            pass
-                if not published_iso:
-                    for t in [
-                        getattr(entry, "published_parsed", None),
-                        getattr(entry, "updated_parsed", None),
-                        getattr(entry, "created_parsed", None),
-                    ]:
-                        if t:
-                            try:
-                                published_iso = time.strftime("%Y-%m-%dT%H:%M:%S", t)
-                                break
-                            except Exception:
-                                pass
-
-                out.append((title, link, summary, published_iso))
+                out.append(_parse_entry(entry))
         except Exception:
             # Skip any feed that fails to parse
             pass
     return out
 
-def embed_texts(texts: List[str]) -> np.ndarray:
-    model = SentenceTransformer(EMBED_MODEL)
-    vecs = model.encode(texts, batch_size=64, show_progress_bar=True).astype("float32")
+def _encode(texts: List[str], workers: int = 1) -> np.ndarray:
+    if not texts:
+        return np.empty((0, EMBED_DIM), dtype="float32")
+    if workers > 1:
+        with EncodePool(EMBED_MODEL, workers, batch_size=64) as pool:
+            vecs = pool.encode(texts)
+            print(f"Encoder throughput ({workers} workers):")
+            pool.print_stats()
+        return vecs
+    return get_encoder(EMBED_MODEL).encode(texts, batch_size=64, show_progress_bar=True)
+
+def embed_texts(texts: List[str], workers: int = 1, use_cache: bool = True) -> np.ndarray:
+    """Normalized embeddings; with use_cache, only chunks the on-disk embedding cache hasn't seen are encoded."""
+    if use_cache:
+        cache = get_cache(EMBED_MODEL)
+        vecs = cache.encode(texts, lambda ts: _encode(ts, workers))
+        print(f"Embedding cache: {cache.hits} reused, {cache.misses} encoded")
+    else:
+        vecs = _encode(texts, workers)
+    vecs = vecs.astype("float32")
     norms = np.linalg.norm(vecs, axis=1, keepdims=True); norms[norms==0] = 1.0
     return vecs / norms
 
-def build_index(vecs: np.ndarray) -> faiss.Index:
-    index = faiss.IndexFlatIP(EMBED_DIM)
-    index.add(vecs)
-    return index
+def build_index(vecs: np.ndarray, params: Optional[Dict] = None) -> faiss.Index:
+    return ann.build_index(vecs, params)
+
+def save_index_and_meta(index: faiss.Index, docs: List[Dict], params: Optional[Dict] = None, report: Optional[Dict] = None):
+    """
+    Write to temp files, then swap them in with os.replace so a running API never reads a
+    half-written file. The trend index (parsed dates + token postings) is written alongside.
+    """
+    tmp_index, tmp_meta = EXT_INDEX_PATH + ".tmp", EXT_META_PATH + ".tmp"
+    faiss.write_index(index, tmp_index)
+    with open(tmp_meta, "wb") as f:
+        pickle.dump(docs, f)
+    # params first: a reader that sees the new index also sees its search settings
+    ann.save_params(EXT_INDEX_PATH, params or dict(ann.DEFAULT_PARAMS), report)
+    # readers check its row count against the metadata and index on the fly if they disagree
+    TrendIndex.from_meta(docs).save(TREND_INDEX_PATH)
+    os.replace(tmp_meta, EXT_META_PATH)
+    os.replace(tmp_index, EXT_INDEX_PATH)
+
+def chunk_key(d: Dict) -> Tuple[str, str]:
+    """Identity of an external chunk across runs: its URL and a hash of its normalized text."""
+    return d.get("url") or "", d.get("chunk_hash") or text_key(d.get("text") or "").hex()
+
+def incremental_update(docs: List[Dict], args, params: Dict) -> None:
+    """
+    Append chunks whose (url, chunk hash) isn't in the existing external index and keep
+    everything already there, so trend windows keep their history. With --retention_days,
+    dated items older than the window are pruned; pruning rebuilds the index from the
+    kept chunks (vectors come back from the embedding cache, so it stays cheap).
+    """
+    if not (os.path.exists(EXT_INDEX_PATH) and os.path.exists(EXT_META_PATH)):
+        print("No existing external index; doing a full build.")
+        return full_build(docs, args, params)
+    params = ann.load_params(EXT_INDEX_PATH)
+    index = faiss.read_index(EXT_INDEX_PATH)
+    with open(EXT_META_PATH, "rb") as f:
+        old = pickle.load(f)
+    if index.ntotal != len(old):
+        print(f"{EXT_INDEX_PATH} has {index.ntotal} vectors but {EXT_META_PATH} has {len(old)} rows; doing a full build.")
+        return full_build(docs, args, params)
+    for d in old:
+        d.setdefault("chunk_hash", chunk_key(d)[1])
+
+    known = {chunk_key(d) for d in old}
+    new = []
+    for d in docs:
+        key = chunk_key(d)
+        if key not in known:
+            known.add(key)
+            new.append(d)
+
+    # a re-fetched Wikipedia page supersedes its older chunks; feed items only ever accumulate
+    current = {chunk_key(d) for d in docs}
+    refetched = {d["url"] for d in docs if d.get("source") == "wikipedia"}
+    keep = [d for d in old if d.get("url") not in refetched or chunk_key(d) in current]
+    if args.retention_days is not None:
+        cutoff = time.time() - args.retention_days * 86400
+        # undated items (Wikipedia pages) are reference material, not part of any window
+        fresh = lambda d: (published_epoch(d.get("published")) or cutoff) >= cutoff
+        keep = [d for d in keep if fresh(d)]
+        new = [d for d in new if fresh(d)]
+    pruned = len(old) - len(keep)
+
+    if not new and not pruned:
+        print(f"✅ Up to date: no new chunks ({len(old)} in the index).")
+        return
+
+    if pruned and not keep and not new:
+        print(f"Every chunk would be dropped; leaving {EXT_INDEX_PATH} as it is.")
+        return
+    if pruned:
+        print(f"Dropping {pruned} expired/superseded chunks; rebuilding from {len(keep) + len(new)} chunks…")
+        all_docs = keep + new
+        params.pop("report", None)  # measured on the old contents
+        vecs = embed_texts([d["text"] for d in all_docs], workers=args.workers, use_cache=not args.no_embed_cache)
+        index = build_index(vecs, params)
+    else:
+        all_docs = old + new
+        print(f"Embedding {len(new)} new chunks…")
+        index.add(embed_texts([d["text"] for d in new], workers=args.workers, use_cache=not args.no_embed_cache))
+        ann.apply_search_params(index, params)
+
+    print("Saving index + metadata…")
+    save_index_and_meta(index, all_docs, params)
+    print(f"✅ Incremental: {len(new)} new, {pruned} pruned, {len(all_docs)} chunks in {EXT_INDEX_PATH}.")
+
+def full_build(docs: List[Dict], args, params: Dict) -> None:
+    if not docs:
+        print("No external texts gathered. Provide --wikipedia and/or --rss.")
+        return
+    texts = [d["text"] for d in docs]
+    print(f"Embedding {len(texts)} chunks…")
+    vecs = embed_texts(texts, workers=args.workers, use_cache=not args.no_embed_cache)
+    print(f"Building FAISS index ({params['type']})…")
+    index = build_index(vecs, params)
+    report = ann.recall_report(index, vecs, k=5, n_queries=args.report_queries) if not ann.is_exact(params) else {}
+    ann.print_report(report)
+
+    print("Saving index + metadata…")
+    save_index_and_meta(index, docs, params, report)
+
+    print(f"✅ Wrote {EXT_INDEX_PATH} and {EXT_META_PATH} with {len(texts)} chunks.")
 
 def main():
     parser = argparse.ArgumentParser()
@@ -131,11 +243,24 @@ def main():
     parser.add_argument("--rss", nargs="*", default=[], help="RSS feed URLs")
     parser.add_argument("--rss_file", type=str, default=None, help="Path to a txt file of RSS feed URLs (one per line, # for comments)")
     parser.add_argument("--max_rss_items", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes (>1 uses a process pool)")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="Concurrent feed/page fetches")
+    parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT, help="Per-source fetch timeout in seconds")
+    parser.add_argument("--fixtures", type=str, default=None,
+                        help="Read every URL from files in this directory instead of the network (see ext_fetch.fixture_name)")
+    parser.add_argument("--no-http-cache", action="store_true", help="Don't revalidate against the on-disk HTTP cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep the existing external index and append only chunks whose (url, text hash) is new")
+    parser.add_argument("--retention_days", type=int, default=None,
+                        help="With --incremental, drop dated items published more than this many days ago")
+    parser.add_argument("--no-embed-cache", action="store_true", help="Encode every chunk, ignoring the on-disk embedding cache")
+    ann.add_index_args(parser)
     args = parser.parse_args()
+    params = ann.params_from_args(args)
 
 
     docs, texts = [], []
-    
+
     # Read feeds from a file if given
     if args.rss_file:
         try:
@@ -149,22 +274,29 @@ def main():
             print(f"⚠️ Could not read rss_file: {e}")
 
 
+    fetcher = Fetcher(None if args.no_http_cache else HTTP_CACHE_DIR, args.timeout, args.fixtures)
+
     if args.wikipedia:
-        wikipedia.set_lang("en")
-        pages = fetch_wikipedia_pages(args.wikipedia)
+        print(f"Fetching {len(args.wikipedia)} Wikipedia pages…")
+        pages = fetch_wikipedia_pages(args.wikipedia, fetcher, args.fetch_workers)
         for title, url, content in pages:
             for ch in chunk_text(content):
                 texts.append(ch)
                 docs.append({"source": "wikipedia", "title": title, "url": url, "published": None, "text": ch})
 
     if args.rss:
-        items = fetch_rss_articles(args.rss, max_items_per_feed=args.max_rss_items)
+        print(f"Fetching {len(args.rss)} RSS feeds…")
+        # an unchanged (304) feed still yields its cached entries: the HTTP cache is written as
+        # soon as a body arrives, so a run that failed before saving the index may never have
+        # indexed them; ones that are already indexed are dropped by the (url, hash) check
+        items = fetch_rss_articles(args.rss, max_items_per_feed=args.max_rss_items,
+                                   fetcher=fetcher, workers=args.fetch_workers)
         for title, link, summary, published in items:
             for ch in chunk_text(summary):
                 texts.append(ch)
                 docs.append({"source": "rss", "title": title, "url": link, "published": published, "text": ch})
 
-    if not texts:
+    if not texts and not args.incremental:
         print("No external texts gathered. Provide --wikipedia and/or --rss.")
         return
 
@@ -175,23 +307,16 @@ def main():
         if key in seen:
             continue
         seen.add(key)
+        d["chunk_hash"] = text_key(t).hex()
         dedup_docs.append(d)
         dedup_texts.append(t)
     docs, texts = dedup_docs, dedup_texts
     print(f"Deduplicated to {len(texts)} chunks.")
 
-
-    print(f"Embedding {len(texts)} chunks…")
-    vecs = embed_texts(texts)
-    print("Building FAISS index…")
-    index = build_index(vecs)
-
-    print("Saving index + metadata…")
-    faiss.write_index(index, EXT_INDEX_PATH)
-    with open(EXT_META_PATH,"wb") as f:
-        pickle.dump(docs, f)
-
-    print(f"✅ Wrote {EXT_INDEX_PATH} and {EXT_META_PATH} with {len(texts)} chunks.")
+    if args.incremental:
+        incremental_update(docs, args, params)
+    else:
+        full_build(docs, args, params)
 
 if __name__ == "__main__":
     main()
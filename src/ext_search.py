@@ -1,26 +1,65 @@
 # src/ext_search.py
-import pickle
+import os, pickle, threading
 import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+from .encoders import get_encoder
+from . import ann
+from .query_cache import cached_embedding
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
 EXT_INDEX_PATH = "faiss_ext_index.bin"
 EXT_META_PATH  = "faiss_ext_metadata.pkl"
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") != "0"   # see vector_store.INDEX_MMAP
 
-def embed_query(q: str):
-    model = SentenceTransformer(EMBED_MODEL)
+_lock = threading.Lock()
+_index = None
+_metas = None
+_version = None
+
+def _file_version():
+    """(mtime_ns, size) of both files; changes whenever ext_ingest swaps in a rebuild."""
+    out = []
+    for path in (EXT_INDEX_PATH, EXT_META_PATH):
+        st = os.stat(path)
+        out.append((st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+def _load_external():
+    """Keep the external index + metadata resident; reload only when the files change on disk."""
+    global _index, _metas, _version
+    version = _file_version()
+    if _index is not None and version == _version:
+        return _index, _metas
+    with _lock:
+        if _index is None or version != _version:
+            index = ann.read_index(EXT_INDEX_PATH, mmap=INDEX_MMAP)
+            ann.apply_search_params(index, ann.load_params(EXT_INDEX_PATH))
+            with open(EXT_META_PATH, "rb") as f:
+                metas = pickle.load(f)
+            if index.ntotal != len(metas):
+                # caught the two files mid-swap; keep serving the old pair until both land
+                if _index is not None:
+                    return _index, _metas
+                raise RuntimeError(f"{EXT_INDEX_PATH} has {index.ntotal} vectors but {EXT_META_PATH} has {len(metas)} rows")
+            # if a writer landed while we were reading, serve this copy but re-check next call
+            _index, _metas = index, metas
+            _version = version if _file_version() == version else None
+    return _index, _metas
+
+def _encode(q: str):
+    model = get_encoder(EMBED_MODEL)
     v = model.encode([q]).astype("float32")
     v /= (np.linalg.norm(v, axis=1, keepdims=True) + 1e-12)
-    return v
+    return v[0]
+
+def embed_query(q: str):
+    # shares cache entries with vector_store, so /rag encodes the query once for both indexes
+    return cached_embedding(EMBED_MODEL, q, _encode)
 
 def search_external(query: str, k: int = 5):
-    index = faiss.read_index(EXT_INDEX_PATH)
-    with open(EXT_META_PATH, "rb") as f:
-        metas = pickle.load(f)
+    index, metas = _load_external()
     qv = embed_query(query)
     D, I = index.search(qv, k)
-    return [{"score": float(s), **metas[idx]} for s, idx in zip(D[0], I[0])]
+    return [{"score": float(s), **metas[idx]} for s, idx in zip(D[0], I[0]) if idx != -1]
 
 if __name__ == "__main__":
     import sys
@@ -1,89 +1,250 @@
 # src/ingest_embeddings.py
+import argparse
+import hashlib
 import os
-import pickle
+import time
+from collections import Counter
 import numpy as np
 import pandas as pd
 import faiss
-from sentence_transformers import SentenceTransformer
+from .encoders import EncodePool, get_encoder
+from .embed_cache import EmbeddingCache, get_cache
+from .meta_store import SCHEMA, MetaStore, MetaWriter, to_str
+from . import ann
+from .lexical import LexicalIndex, LexicalIndexBuilder, LEXICAL_INDEX_PATH
+from .restaurant_index import RestaurantIndex, RestaurantPooler, RESTAURANT_INDEX_PATH
 
 # ---- Config ----
 CSV_PATH = "data/restaurants.csv"
 EMBED_MODEL = "all-MiniLM-L6-v2"   # free, solid semantic model
 EMBED_DIM = 384
 FAISS_INDEX_PATH = "faiss_index.bin"
-METADATA_PATH = "faiss_metadata.pkl"
+METADATA_PATH = "faiss_metadata"   # columnar store (see meta_store.py)
+CHUNK_ROWS = 20_000                # CSV rows read, embedded and written per step
+TEXT_COLUMNS = ["menu_item", "menu_description", "ingredient_name"]
+META_COLUMNS = ["restaurant_name", "categories", "city", "state", "zip_code",
+                "rating", "price", "review_count", "item_id", "confidence"]
 # ---------------
 
-def load_data(path: str) -> pd.DataFrame:
-    """Ensure required text columns exist and have no NaNs."""
-    df = pd.read_csv(path)
-    for col in ["menu_item", "menu_description", "ingredient_name"]:
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    for col in TEXT_COLUMNS:
         if col not in df.columns:
             df[col] = ""
         df[col] = df[col].fillna("")
     return df
 
-def build_text_and_meta(df: pd.DataFrame):
+def load_data(path: str) -> pd.DataFrame:
+    """Ensure required text columns exist and have no NaNs."""
+    return _prepare(pd.read_csv(path))
+
+def iter_chunks(path: str, chunksize: int = CHUNK_ROWS):
+    """load_data, `chunksize` rows at a time."""
+    for df in pd.read_csv(path, chunksize=chunksize):
+        yield _prepare(df)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def build_text_and_meta(df: pd.DataFrame, start_row: int = 0, seen: Counter = None):
     """
     texts: semantic content to embed (menu item + description + ingredients)
-    metas: structured fields we keep for filtering/display
+    cols:  column -> values for the structured fields we keep for filtering/display, plus
+           the text itself, a stable row key (item_id) and a hash of the text for incremental runs
+    For chunked input pass each chunk's first CSV row as `start_row` and share `seen`
+    across chunks so duplicate item_ids keep numbering.
+    """
+    seen = Counter() if seen is None else seen
+    text_s = (df["menu_item"].astype(str) + ": " + df["menu_description"].astype(str)
+              + ". Ingredients: " + df["ingredient_name"].astype(str) + ".")
+    texts = text_s.tolist()
+    cols = {c: (df[c].tolist() if c in df.columns else [None] * len(df)) for c in META_COLUMNS}
+    item_ids = [to_str(v) for v in cols["item_id"]]
+    row_keys = []
+    for i, item_id in enumerate(item_ids, start=start_row):
+        # duplicate / missing item_ids still get a stable key: "<id>#<n-th occurrence>"
+        base = item_id if item_id is not None else f"row:{i}"
+        row_keys.append(base if not seen[base] else f"{base}#{seen[base]}")
+        seen[base] += 1
+    cols["text"] = texts
+    cols["source"] = ["internal"] * len(df)
+    cols["source_id"] = [v if v is not None else i for i, v in enumerate(item_ids, start=start_row)]
+    cols["row_key"] = row_keys
+    cols["text_hash"] = [_text_hash(t) for t in texts]
+    cols["live"] = [1] * len(df)
+    return texts, cols
+
+def embed_texts(texts, show_progress_bar: bool = False, encoder=None, cache: EmbeddingCache = None):
     """
-    texts, metas = [], []
-    for _, r in df.iterrows():
-        text = f"{r['menu_item']}: {r['menu_description']}. Ingredients: {r['ingredient_name']}."
-        texts.append(text)
-        metas.append({
-            "restaurant_name": r.get("restaurant_name"),
-            "categories": r.get("categories"),
-            "city": r.get("city"),
-            "state": r.get("state"),
-            "zip_code": r.get("zip_code"),
-            "rating": r.get("rating"),
-            "price": r.get("price"),
-            "review_count": r.get("review_count"),
-            "item_id": r.get("item_id"),
-            "confidence": r.get("confidence"),
-        })
-    return texts, metas
-
-def embed_texts(texts):
-    """Encode with SentenceTransformers and L2-normalize via NumPy (cosine-ready)."""
-    model = SentenceTransformer(EMBED_MODEL)
-    embs = model.encode(texts, batch_size=128, show_progress_bar=True).astype("float32")
+    Encode with SentenceTransformers and L2-normalize via NumPy (cosine-ready).
+    `encoder` may be an EncodePool to spread the work over several processes; with a
+    `cache`, only texts it hasn't seen before are encoded.
+    """
+    model = encoder or get_encoder(EMBED_MODEL)
+    encode = lambda ts: model.encode(ts, batch_size=128, show_progress_bar=show_progress_bar)
+    embs = (cache.encode(texts, encode) if cache is not None else encode(texts)).astype("float32")
     norms = np.linalg.norm(embs, axis=1, keepdims=True)
     norms[norms == 0] = 1.0
     embs = embs / norms
     return embs
 
-def build_faiss(embs: np.ndarray) -> faiss.Index:
-    """Create an inner-product index (works as cosine since vectors are normalized)."""
-    index = faiss.IndexFlatIP(EMBED_DIM)
-    index.add(embs)
-    return index
+def build_faiss(embs: np.ndarray, params=None) -> faiss.Index:
+    """Create an inner-product index (works as cosine since vectors are normalized); flat unless params say otherwise."""
+    return ann.build_index(embs, params)
+
+def incremental_update(df: pd.DataFrame, encoder=None, cache: EmbeddingCache = None) -> bool:
+    """
+    Re-embed only rows whose text changed or whose item_id is new, drop deleted items from
+    the index, and rewrite metadata in the same pass. Vector ids stay equal to metadata
+    rows: a changed item keeps its row, new items are appended, deleted items remain as
+    tombstone rows (live=0). Returns False when a full build is needed instead.
+    """
+    if not (os.path.exists(FAISS_INDEX_PATH) and os.path.isdir(METADATA_PATH)):
+        print("No existing index/metadata; doing a full build.")
+        return False
+    old = MetaStore.open(METADATA_PATH)
+    if "row_key" not in old.columns:
+        print(f"{METADATA_PATH} predates incremental ingest; doing a full build.")
+        return False
+    params = ann.load_params(FAISS_INDEX_PATH)
+    index = faiss.read_index(FAISS_INDEX_PATH)
+    if not ann.supports_removal(index):
+        print(f"A {params['type']} index can't remove vectors; doing a full build.")
+        return False
+    ann.apply_search_params(index, params)
+    index = ann.with_ids(index)
+
+    texts, new_cols = build_text_and_meta(df)
+    n_old = len(old)
+    live = old.numbers("live")
+    old_hash = old.values("text_hash")
+    old_label = {k: i for i, k in enumerate(old.values("row_key")) if live[i] == 1}
+
+    labels = np.empty(len(texts), dtype="int64")
+    to_embed, changed = [], []
+    next_label = n_old
+    for i, (key, h) in enumerate(zip(new_cols["row_key"], new_cols["text_hash"])):
+        label = old_label.pop(key, None)
+        if label is None:
+            label, next_label = next_label, next_label + 1
+            to_embed.append(i)
+        elif old_hash[label] != h:
+            to_embed.append(i)
+            changed.append(label)
+        labels[i] = label
+    deleted = list(old_label.values())
+
+    remove = np.asarray(deleted + changed, dtype="int64")
+    if len(remove):
+        index.remove_ids(remove)
+    if to_embed:
+        print(f"Embedding {len(to_embed)} new/changed rows…")
+        index.add_with_ids(embed_texts([texts[i] for i in to_embed], encoder=encoder, cache=cache), labels[to_embed])
+
+    # old rows carry over as tombstones unless a current CSV row maps onto them
+    cols = {c: (old.values(c) if c in old.columns else [None] * n_old) + [None] * (next_label - n_old)
+            for c in SCHEMA}
+    cols["live"] = [0] * next_label
+    for c in SCHEMA:
+        values = new_cols.get(c, [None] * len(texts))
+        for i, label in enumerate(labels):
+            cols[c][label] = values[i]
+
+    print("Saving index + metadata…")
+    # never rewrite in place: API workers may have the current file memory-mapped
+    faiss.write_index(index, FAISS_INDEX_PATH + ".tmp")
+    os.replace(FAISS_INDEX_PATH + ".tmp", FAISS_INDEX_PATH)
+    ann.save_params(FAISS_INDEX_PATH, params)
+    # tombstone rows keep their old text; the live mask keeps them out of results
+    LexicalIndex.from_texts(cols["text"]).save(LEXICAL_INDEX_PATH)
+    RestaurantIndex.from_index(index, cols["restaurant_name"], cols["live"]).save(RESTAURANT_INDEX_PATH)
+    w = MetaWriter(METADATA_PATH)
+    w.append_columns(cols)
+    w.close()
+    print(f"✅ Incremental: {len(texts) - len(to_embed)} unchanged, {len(changed)} changed, "
+          f"{len(to_embed) - len(changed)} new, {len(deleted)} deleted "
+          f"({next_label - index.ntotal} tombstone rows; a full build compacts them).")
+    return True
 
 def main():
+    ap = argparse.ArgumentParser()
+    ann.add_index_args(ap)
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only embed new/changed rows (by item_id + text hash) and patch the existing index")
+    ap.add_argument("--chunksize", type=int, default=CHUNK_ROWS,
+                    help="CSV rows per streaming step of a full build")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Encoder processes; >1 shards each chunk across a process pool")
+    ap.add_argument("--no-embed-cache", action="store_true",
+                    help="Encode every text instead of reusing vectors from the on-disk embedding cache")
+    args = ap.parse_args()
+    params = ann.params_from_args(args)
+
     if not os.path.exists(CSV_PATH):
         raise FileNotFoundError(f"Place your CSV at {CSV_PATH}")
 
-    print("Loading CSV…")
-    df = load_data(CSV_PATH)
-    print(f"Rows: {len(df)}")
-
-    print("Preparing texts + metadata…")
-    texts, metas = build_text_and_meta(df)
+    encoder = EncodePool(EMBED_MODEL, args.workers) if args.workers > 1 else None
+    cache = None if args.no_embed_cache else get_cache(EMBED_MODEL)
+    try:
+        build(args, params, encoder, cache)
+        if cache is not None:
+            print(f"Embedding cache: {cache.hits} reused, {cache.misses} encoded ({len(cache)} entries in {cache.dir})")
+    finally:
+        if encoder is not None:
+            print(f"Encoder throughput ({encoder.workers} workers):")
+            encoder.print_stats()
+            encoder.close()
 
-    print("Embedding texts…")
-    embs = embed_texts(texts)
+def build(args, params, encoder=None, cache: EmbeddingCache = None):
+    """Incremental update when asked for (and possible), else a full streaming build."""
+    if args.incremental:
+        print("Loading CSV…")
+        df = load_data(CSV_PATH)
+        print(f"Rows: {len(df)}")
+        if incremental_update(df, encoder, cache):
+            return
+        del df
 
-    print("Building FAISS index…")
-    index = build_faiss(embs)
+    # Full build streams the CSV: each chunk is embedded, handed to the index builder (which
+    # spills it to disk when the index trains) and appended to the metadata before the next
+    # is read, so memory holds one chunk plus the index.
+    print(f"Streaming {CSV_PATH} in chunks of {args.chunksize} rows ({params['type']} index)…")
+    # spill next to the index rather than in /tmp, which may be RAM-backed
+    builder = ann.StreamingIndexBuilder(EMBED_DIM, params, report_queries=args.report_queries,
+                                        spill_dir=os.path.dirname(os.path.abspath(FAISS_INDEX_PATH)))
+    writer = MetaWriter(METADATA_PATH)
+    lexical = LexicalIndexBuilder()
+    pooler = RestaurantPooler(EMBED_DIM)
+    seen = Counter()
+    rows, t0 = 0, time.perf_counter()
+    try:
+        for df in iter_chunks(CSV_PATH, args.chunksize):
+            texts, cols = build_text_and_meta(df, start_row=rows, seen=seen)
+            vecs = embed_texts(texts, encoder=encoder, cache=cache)
+            builder.add(vecs)
+            pooler.add(cols["restaurant_name"], vecs)
+            writer.append_columns(cols)
+            lexical.add(texts)
+            rows += len(df)
+            elapsed = time.perf_counter() - t0
+            print(f"  {rows} rows  ({rows / elapsed:.0f} rows/s)")
+        index, report = builder.finish()
+    except BaseException:
+        builder.abort()
+        writer.abort()
+        raise
+    ann.print_report(report)
 
     print("Saving index + metadata…")
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    with open(METADATA_PATH, "wb") as f:
-        pickle.dump(metas, f)
+    faiss.write_index(index, FAISS_INDEX_PATH + ".tmp")
+    ann.save_params(FAISS_INDEX_PATH, params, report)
+    lexical.finish().save(LEXICAL_INDEX_PATH)
+    pooler.finish().save(RESTAURANT_INDEX_PATH)
+    writer.close()
+    os.replace(FAISS_INDEX_PATH + ".tmp", FAISS_INDEX_PATH)
 
-    print("✅ Done. Files written:", FAISS_INDEX_PATH, METADATA_PATH)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ Done. {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s). "
+          f"Files written: {FAISS_INDEX_PATH} {METADATA_PATH} {LEXICAL_INDEX_PATH} {RESTAURANT_INDEX_PATH}")
 
 if __name__ == "__main__":
     main()
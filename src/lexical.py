@@ -0,0 +1,126 @@
+# src/lexical.py
+import os, re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+LEXICAL_INDEX_PATH = "faiss_lexical.npz"   # written by ingest_embeddings next to the FAISS index
+BM25_K1 = 1.2
+BM25_B = 0.75
+RARE_DF = 0.01         # a query term found in at most this share of rows is "rare"
+MAX_CANDIDATES = 2000  # best BM25 rows handed to the dense stage
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower()) if text else []
+
+
+class LexicalIndexBuilder:
+    """Accumulates (token, row, tf) postings batch by batch; rows are numbered in add() order."""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self._toks, self._rows, self._tfs = [], [], []
+        self._doc_len: List[int] = []
+
+    def add(self, texts: Iterable[str]):
+        toks, rows, tfs = [], [], []
+        for text in texts:
+            row = len(self._doc_len)
+            counts = Counter(tokenize(text))
+            for tok, tf in counts.items():
+                toks.append(self.vocab.setdefault(tok, len(self.vocab)))
+                rows.append(row)
+                tfs.append(tf)
+            self._doc_len.append(sum(counts.values()))
+        self._toks.append(np.asarray(toks, dtype=np.int32))
+        self._rows.append(np.asarray(rows, dtype=np.int32))
+        self._tfs.append(np.minimum(np.asarray(tfs, dtype=np.int64), 65535).astype(np.uint16))
+
+    def finish(self) -> "LexicalIndex":
+        toks = np.concatenate(self._toks) if self._toks else np.empty(0, dtype=np.int32)
+        order = np.argsort(toks, kind="stable")  # stable: rows stay ascending within a token
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(toks, minlength=len(self.vocab)), out=offsets[1:])
+        rows = np.concatenate(self._rows)[order] if self._rows else np.empty(0, dtype=np.int32)
+        tfs = np.concatenate(self._tfs)[order] if self._tfs else np.empty(0, dtype=np.uint16)
+        return LexicalIndex(list(self.vocab), offsets, rows, tfs, np.asarray(self._doc_len, dtype=np.int32))
+
+
+class LexicalIndex:
+    """
+    BM25 postings over the item texts (menu item, description, ingredients).
+    candidates() is only used when a query carries rare terms: those terms' posting lists
+    give a small candidate set, which is BM25-scored over all query terms.
+    """
+
+    def __init__(self, vocab: List[str], offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray, doc_len: np.ndarray):
+        self.vocab = {t: i for i, t in enumerate(vocab)}
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.n = len(doc_len)
+        self.avgdl = float(doc_len.mean()) if self.n else 0.0
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "LexicalIndex":
+        b = LexicalIndexBuilder()
+        b.add(texts)
+        return b.finish()
+
+    def save(self, path: str = LEXICAL_INDEX_PATH):
+        tmp = path + ".tmp.npz"
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        np.savez(tmp, vocab=np.asarray(vocab, dtype=str), offsets=self.offsets, rows=self.rows,
+                 tfs=self.tfs, doc_len=self.doc_len)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH) -> "LexicalIndex":
+        with np.load(path) as d:
+            return cls(d["vocab"].tolist(), d["offsets"], d["rows"], d["tfs"], d["doc_len"])
+
+    def _df(self, t: int) -> int:
+        return int(self.offsets[t + 1] - self.offsets[t])
+
+    def _idf(self, t: int) -> float:
+        df = self._df(t)
+        return float(np.log(1.0 + (self.n - df + 0.5) / (df + 0.5)))
+
+    def rare_terms(self, query: str) -> List[str]:
+        limit = max(1, int(RARE_DF * self.n))
+        return [tok for tok in dict.fromkeys(tokenize(query))
+                if tok in self.vocab and self._df(self.vocab[tok]) <= limit]
+
+    def candidates(self, query: str, eligible: Optional[np.ndarray] = None,
+                   limit: int = MAX_CANDIDATES) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (row ids, BM25 scores) of the best `limit` rows containing any rare query term, restricted
+        to `eligible` (bool mask); None when the query has no rare terms and dense search should run alone.
+        """
+        rare = self.rare_terms(query)
+        if not rare:
+            return None
+        cand = np.unique(np.concatenate([self.rows[self.offsets[self.vocab[t]]:self.offsets[self.vocab[t] + 1]]
+                                         for t in rare]))
+        if eligible is not None:
+            cand = cand[eligible[cand]]
+        scores = np.zeros(len(cand))
+        for tok in dict.fromkeys(tokenize(query)):
+            t = self.vocab.get(tok)
+            if t is None:
+                continue
+            rows = self.rows[self.offsets[t]:self.offsets[t + 1]]
+            pos = np.searchsorted(rows, cand)
+            hit = pos < len(rows)
+            hit[hit] = rows[pos[hit]] == cand[hit]
+            tf = self.tfs[self.offsets[t] + pos[hit]].astype(np.float64)
+            dl = self.doc_len[cand[hit]]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / (self.avgdl or 1.0))
+            scores[hit] += self._idf(t) * tf * (BM25_K1 + 1) / (tf + norm)
+        if len(cand) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            cand, scores = cand[top], scores[top]
+        return cand.astype(np.int64), scores
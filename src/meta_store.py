@@ -0,0 +1,277 @@
+# src/meta_store.py
+"""
+Columnar metadata for the internal index (replaces the list-of-dicts pickle).
+
+On disk a store is a directory:
+  schema.json            rows, column kinds, category vocabularies
+  <col>.codes.bin        int32 codes into the vocab (-1 = missing)   [category]
+  <col>.bin              float64 values (NaN = missing)              [number / int]
+  <col>.offsets.bin      int64 offsets (rows + 1) into <col>.blob   [string]
+  <col>.blob             utf-8 bytes                                 [string]
+Row i of the store is vector id i of the FAISS index; rows with live == 0 were deleted
+by an incremental ingest and are no longer in the index.
+Every file is a flat little-endian array, so a store can be opened with mmap=True: pages
+come from the OS page cache on first touch and are shared by every process reading it.
+"""
+import json, math, mmap, os, pickle, shutil
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+# Column kinds, in the order rows are materialised as dicts
+SCHEMA = {
+    "restaurant_name": "category",
+    "categories": "category",
+    "city": "category",
+    "state": "category",
+    "zip_code": "category",
+    "rating": "number",
+    "price": "category",
+    "review_count": "int",
+    "item_id": "string",
+    "confidence": "number",
+    "text": "string",
+    "source": "category",
+    "source_id": "string",
+    # bookkeeping for incremental ingest; never part of a materialised row
+    "row_key": "string",
+    "text_hash": "string",
+    "live": "int",
+}
+HIDDEN = ("row_key", "text_hash", "live")
+
+def _is_missing(v) -> bool:
+    if v is None:
+        return True
+    if isinstance(v, float) and math.isnan(v):
+        return True
+    return isinstance(v, str) and v.strip() == ""
+
+def to_str(v) -> Optional[str]:
+    """Stringify a cell; integral floats (pandas NaN-widened ints like 94110.0) lose the '.0'."""
+    if _is_missing(v):
+        return None
+    if isinstance(v, (float, np.floating)) and float(v).is_integer():
+        return str(int(v))
+    return str(v)
+
+def _to_float(v) -> float:
+    if _is_missing(v):
+        return float("nan")
+    try:
+        return float(v)
+    except Exception:
+        return float("nan")
+
+
+class MetaWriter:
+    """Append-only writer; batches go straight to the column files, so memory stays per-batch."""
+
+    def __init__(self, path: str, columns: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.tmp = path + ".tmp"
+        self.columns = dict(columns or SCHEMA)
+        self.rows = 0
+        self._vocab: Dict[str, Dict[str, int]] = {c: {} for c, kind in self.columns.items() if kind == "category"}
+        self._blob_size = {c: 0 for c, kind in self.columns.items() if kind == "string"}
+        if os.path.exists(self.tmp):
+            shutil.rmtree(self.tmp)
+        os.makedirs(self.tmp)
+        self._files = {}
+        for c, kind in self.columns.items():
+            if kind == "category":
+                self._files[c] = open(os.path.join(self.tmp, f"{c}.codes.bin"), "wb")
+            elif kind in ("number", "int"):
+                self._files[c] = open(os.path.join(self.tmp, f"{c}.bin"), "wb")
+            else:
+                self._files[c] = open(os.path.join(self.tmp, f"{c}.offsets.bin"), "wb")
+                self._files[c + ".blob"] = open(os.path.join(self.tmp, f"{c}.blob"), "wb")
+                np.zeros(1, dtype="<i8").tofile(self._files[c])
+
+    def append(self, records: Sequence[Dict[str, Any]]):
+        """Append row dicts (keys outside the schema are ignored, missing keys are stored as missing)."""
+        self.append_columns({c: [r.get(c) for r in records] for c in self.columns})
+
+    def append_columns(self, cols: Dict[str, Sequence[Any]]):
+        """Append one batch given as column -> values; every column must have the same length."""
+        n = len(next(iter(cols.values()))) if cols else 0
+        for c, kind in self.columns.items():
+            values = list(cols[c]) if c in cols else [None] * n
+            if len(values) != n:
+                raise ValueError(f"Column {c} has {len(values)} values, expected {n}")
+            if kind == "category":
+                vocab = self._vocab[c]
+                codes = np.empty(n, dtype="<i4")
+                for i, v in enumerate(values):
+                    s = to_str(v)
+                    codes[i] = -1 if s is None else vocab.setdefault(s, len(vocab))
+                codes.tofile(self._files[c])
+            elif kind in ("number", "int"):
+                np.asarray([_to_float(v) for v in values], dtype="<f8").tofile(self._files[c])
+            else:
+                encoded = [(to_str(v) or "").encode("utf-8") for v in values]
+                lengths = np.fromiter((len(b) for b in encoded), dtype="<i8", count=n)
+                (self._blob_size[c] + np.cumsum(lengths)).astype("<i8").tofile(self._files[c])
+                self._blob_size[c] += int(lengths.sum())
+                self._files[c + ".blob"].write(b"".join(encoded))
+        self.rows += n
+
+    def abort(self):
+        """Drop the partially written directory, leaving any existing store untouched."""
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def close(self):
+        """Write schema.json and swap the finished directory into place."""
+        for f in self._files.values():
+            f.close()
+        schema = {
+            "version": 1,
+            "rows": self.rows,
+            "columns": self.columns,
+            "vocab": {c: list(v) for c, v in self._vocab.items()},
+        }
+        with open(os.path.join(self.tmp, "schema.json"), "w") as f:
+            json.dump(schema, f)
+        old = self.path + ".old"
+        if os.path.exists(old):
+            shutil.rmtree(old)
+        if os.path.exists(self.path):
+            os.rename(self.path, old)
+        os.rename(self.tmp, self.path)
+        if os.path.exists(old):
+            shutil.rmtree(old)
+
+
+def write_meta(path: str, records: Iterable[Dict[str, Any]], columns: Optional[Dict[str, str]] = None):
+    """Write a whole store from row dicts in one go."""
+    w = MetaWriter(path, columns)
+    w.append(list(records))
+    w.close()
+
+
+class MetaStore:
+    """Read side: column arrays stay packed; dicts are only built for rows you ask for."""
+
+    def __init__(self, columns: Dict[str, str], rows: int, vocab: Dict[str, List[str]], arrays: Dict[str, Any]):
+        self.columns = columns
+        self.rows = rows
+        self.vocab = vocab
+        self._arrays = arrays
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = False) -> "MetaStore":
+        """Read a store; with mmap=True the column files are mapped read-only instead of copied in."""
+        with open(os.path.join(path, "schema.json")) as f:
+            schema = json.load(f)
+        array = _map_array if mmap else np.fromfile
+        blob = _map_bytes if mmap else _read_bytes
+        arrays = {}
+        for c, kind in schema["columns"].items():
+            if kind == "category":
+                arrays[c] = array(os.path.join(path, f"{c}.codes.bin"), dtype="<i4")
+            elif kind in ("number", "int"):
+                arrays[c] = array(os.path.join(path, f"{c}.bin"), dtype="<f8")
+            else:
+                arrays[c] = array(os.path.join(path, f"{c}.offsets.bin"), dtype="<i8")
+                arrays[c + ".blob"] = blob(os.path.join(path, f"{c}.blob"))
+        return cls(schema["columns"], schema["rows"], schema["vocab"], arrays)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "MetaStore":
+        """Columnarise an in-memory list of dicts (e.g. a legacy faiss_metadata.pkl)."""
+        present = {k for r in records for k in r}
+        columns = {c: kind for c, kind in SCHEMA.items() if c in present}
+        vocab, arrays = {}, {}
+        for c, kind in columns.items():
+            values = [r.get(c) for r in records]
+            if kind == "category":
+                v: Dict[str, int] = {}
+                arrays[c] = np.asarray([-1 if s is None else v.setdefault(s, len(v))
+                                        for s in map(to_str, values)], dtype="<i4")
+                vocab[c] = list(v)
+            elif kind in ("number", "int"):
+                arrays[c] = np.asarray([_to_float(x) for x in values], dtype="<f8")
+            else:
+                encoded = [(to_str(x) or "").encode("utf-8") for x in values]
+                arrays[c] = np.concatenate([[0], np.cumsum([len(b) for b in encoded], dtype="<i8")]).astype("<i8")
+                arrays[c + ".blob"] = b"".join(encoded)
+        return cls(columns, len(records), vocab, arrays)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, i) -> Dict[str, Any]:
+        i = int(i)
+        if i < 0:
+            i += self.rows
+        if not 0 <= i < self.rows:
+            raise IndexError(i)
+        return {c: self.value(c, i) for c in self.columns if c not in HIDDEN}
+
+    def __iter__(self):
+        for i in range(self.rows):
+            yield self[i]
+
+    def value(self, name: str, i: int):
+        """Single cell as a plain Python value (None when missing)."""
+        kind = self.columns[name]
+        arr = self._arrays[name]
+        if kind == "category":
+            code = int(arr[i])
+            return None if code < 0 else self.vocab[name][code]
+        if kind in ("number", "int"):
+            x = float(arr[i])
+            if math.isnan(x):
+                return None
+            return int(x) if kind == "int" else x
+        s = bytes(self._arrays[name + ".blob"][int(arr[i]):int(arr[i + 1])]).decode("utf-8")
+        return s or None
+
+    def values(self, name: str) -> List[Any]:
+        """Whole column decoded to Python values (offline tools only)."""
+        return [self.value(name, i) for i in range(self.rows)]
+
+    def rows_at(self, ids: Iterable[int], fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        if fields:
+            cols = [c for c in fields if c in self.columns]
+        else:
+            cols = [c for c in self.columns if c not in HIDDEN]
+        return [{c: self.value(c, int(i)) for c in cols} for i in ids]
+
+    def codes(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+    def numbers(self, name: str) -> np.ndarray:
+        return self._arrays[name]
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _map_array(path: str, dtype: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)  # mmap can't map an empty file
+    return np.memmap(path, dtype=dtype, mode="r")
+
+def _map_bytes(path: str):
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        # the mapping outlives the file object (and the file itself, if a rebuild replaces it)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_meta(path: str, legacy_pkl: Optional[str] = None, mmap: bool = False) -> MetaStore:
+    """Open a columnar store (mapped read-only with mmap=True), falling back to columnarising a legacy pickle in memory."""
+    if not os.path.isdir(path) and os.path.isdir(path + ".old"):
+        # MetaWriter.close was interrupted between moving the old store aside and renaming
+        # the new one in; the old store still matches the index file, which is replaced last
+        path = path + ".old"
+    if os.path.isdir(path):
+        return MetaStore.open(path, mmap=mmap)
+    if legacy_pkl and os.path.exists(legacy_pkl):
+        with open(legacy_pkl, "rb") as f:
+            return MetaStore.from_records(pickle.load(f))
+    raise FileNotFoundError(f"Missing {path} (build your index first)")
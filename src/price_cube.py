@@ -0,0 +1,167 @@
+# src/price_cube.py
+import argparse, os, threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from .analytics import CSV_PATH, parse_prices
+
+PRICE_CUBE_PATH = "data/price_cube.npz"
+CHUNK_ROWS = 200_000
+
+
+def _median(values: np.ndarray, hist: np.ndarray) -> float:
+    """Median of the multiset where values[i] occurs hist[i] times (pandas semantics for even counts)."""
+    n = int(hist.sum())
+    if n == 0:
+        return float("nan")
+    cum = np.cumsum(hist)
+    lo = values[np.searchsorted(cum, (n - 1) // 2 + 1)]
+    hi = values[np.searchsorted(cum, n // 2 + 1)]
+    return float((lo + hi) / 2)
+
+
+class PriceCube:
+    """
+    Item counts per parsed price, for each (city, categories string) group in the CSV.
+    Groups use the row's whole categories string rather than one group per category token,
+    so a row matching several requested terms is still counted once.
+      cities / categories      distinct strings
+      group_city / group_cat   (G,) codes into them
+      values                   (P,) distinct parsed prices, ascending
+      entry_group / entry_price / entry_count
+                               sparse histogram: one (group, price code, item count) triple
+                               per price that actually occurs in a group
+    """
+
+    def __init__(self, cities, categories, group_city, group_cat, values, entry_group, entry_price, entry_count):
+        self.cities = list(cities)
+        self.categories = list(categories)
+        self.group_city = np.asarray(group_city, dtype=np.int32)
+        self.group_cat = np.asarray(group_cat, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.entry_group = np.asarray(entry_group, dtype=np.int32)
+        self.entry_price = np.asarray(entry_price, dtype=np.int32)
+        self.entry_count = np.asarray(entry_count, dtype=np.int64)
+        self._cities_lower = np.char.lower(np.asarray(self.cities, dtype=str))
+        self._categories_lower = np.char.lower(np.asarray(self.categories, dtype=str))
+
+    @classmethod
+    def build(cls, csv_path: str = CSV_PATH, chunksize: int = CHUNK_ROWS) -> "PriceCube":
+        """One streaming pass over the CSV: parse prices, count items per (city, categories, price)."""
+        counts = Counter()
+        want = {"city", "categories", "price"}
+        for df in pd.read_csv(csv_path, usecols=lambda c: c in want, chunksize=chunksize):
+            for col in want:
+                if col not in df.columns:
+                    df[col] = ""
+            price = parse_prices(df["price"])
+            ok = price.notna()
+            sub = pd.DataFrame({"city": df["city"].fillna("").astype(str)[ok],
+                                "categories": df["categories"].fillna("").astype(str)[ok],
+                                "price": price[ok]})
+            counts.update(sub.groupby(["city", "categories", "price"]).size().to_dict())
+        cities = sorted({c for c, _, _ in counts})
+        categories = sorted({g for _, g, _ in counts})
+        values = np.asarray(sorted({p for _, _, p in counts}), dtype=np.float64)
+        city_code = {c: i for i, c in enumerate(cities)}
+        cat_code = {g: i for i, g in enumerate(categories)}
+        groups: Dict[tuple, int] = {}
+        value_pos = {v: i for i, v in enumerate(values)}
+        entries = np.zeros((len(counts), 3), dtype=np.int64)
+        for e, ((c, g, p), n) in enumerate(counts.items()):
+            entries[e] = (groups.setdefault((city_code[c], cat_code[g]), len(groups)), value_pos[p], n)
+        keys = np.asarray(list(groups), dtype=np.int32).reshape(-1, 2)
+        return cls(cities, categories, keys[:, 0], keys[:, 1], values, entries[:, 0], entries[:, 1], entries[:, 2])
+
+    def save(self, path: str = PRICE_CUBE_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, cities=np.asarray(self.cities, dtype=str),
+                            categories=np.asarray(self.categories, dtype=str),
+                            group_city=self.group_city, group_cat=self.group_cat, values=self.values,
+                            entry_group=self.entry_group, entry_price=self.entry_price,
+                            entry_count=self.entry_count)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = PRICE_CUBE_PATH) -> "PriceCube":
+        with np.load(path) as d:
+            return cls(d["cities"].tolist(), d["categories"].tolist(), d["group_city"], d["group_cat"],
+                       d["values"], d["entry_group"], d["entry_price"], d["entry_count"])
+
+    def histogram(self, city: str, terms: List[str]) -> np.ndarray:
+        """(P,) item counts for rows whose city contains `city` and categories contain any term (case-insensitive)."""
+        city_ok = np.char.find(self._cities_lower, city.lower()) >= 0
+        cat_ok = np.zeros(len(self.categories), dtype=bool)
+        for t in terms:
+            cat_ok |= np.char.find(self._categories_lower, t.lower()) >= 0
+        sel = city_ok[self.group_city] & cat_ok[self.group_cat]
+        hit = sel[self.entry_group]
+        return np.bincount(self.entry_price[hit], weights=self.entry_count[hit],
+                           minlength=len(self.values)).astype(np.int64)
+
+    def stats(self, city: str, terms: List[str]) -> Dict[str, Any]:
+        """Mean, median and distribution of item prices for one city / term group."""
+        h = self.histogram(city, terms)
+        n = int(h.sum())
+        nz = np.flatnonzero(h)
+        return {
+            "count": n,
+            "avg_price": float((h * self.values).sum() / n) if n else None,
+            "median_price": _median(self.values, h) if n else None,
+            "distribution": {_label(self.values[i]): int(h[i]) for i in nz},
+        }
+
+
+def _label(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else str(v)
+
+
+_lock = threading.Lock()
+_resident: Optional[PriceCube] = None
+_version = None
+
+def _file_version():
+    out = []
+    for path in (PRICE_CUBE_PATH, CSV_PATH):
+        try:
+            out.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            out.append(None)
+    return tuple(out)
+
+def get_price_cube() -> PriceCube:
+    """
+    Process-wide cube: loaded from PRICE_CUBE_PATH, or built from the CSV in memory when the
+    file is missing or older than the CSV. Re-checked against both mtimes on every call.
+    """
+    global _resident, _version
+    version = _file_version()
+    if _resident is not None and version == _version:
+        return _resident
+    with _lock:
+        if _resident is None or version != _version:
+            cube_mtime, csv_mtime = version
+            if cube_mtime is not None and (csv_mtime is None or cube_mtime >= csv_mtime):
+                _resident = PriceCube.load(PRICE_CUBE_PATH)
+            else:
+                if csv_mtime is None:
+                    raise FileNotFoundError(f"Missing {CSV_PATH}")
+                print(f"{PRICE_CUBE_PATH} missing or older than {CSV_PATH}; building it in memory "
+                      f"(run `python -m src.price_cube` to persist it).")
+                _resident = PriceCube.build(CSV_PATH)
+            _version = version
+    return _resident
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--out", default=PRICE_CUBE_PATH)
+    args = ap.parse_args()
+    cube = PriceCube.build(args.csv)
+    cube.save(args.out)
+    print(f"✅ Wrote {args.out}: {len(cube.group_city)} (city, categories) groups, "
+          f"{len(cube.values)} price levels, {int(cube.entry_count.sum())} priced items.")
+
+if __name__ == "__main__":
+    main()
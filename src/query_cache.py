@@ -0,0 +1,133 @@
+# src/query_cache.py
+import atexit, os, re, threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import numpy as np
+
+# Bounded LRU of query vectors; QUERY_CACHE_PATH (optional .npz) persists it across restarts
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+NEAR_ME_RE = re.compile(r"\bnear me\b", flags=re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+
+def strip_near_me(query: str) -> str:
+    """Remove 'near me' from the text (case-insensitive) but keep the rest of the query."""
+    return NEAR_ME_RE.sub("", query).strip()
+
+def normalize_query(query: str) -> str:
+    """Cache key text: 'near me' stripped, case folded, whitespace collapsed."""
+    return _WS_RE.sub(" ", strip_near_me(query or "")).strip().casefold()
+
+
+class QueryCache:
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, path: str = QUERY_CACHE_PATH):
+        self.maxsize = max(0, maxsize)
+        self.path = path or None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+
+    def get(self, model: str, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._data.get((model, key))
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((model, key))
+            self.hits += 1
+            return vec
+
+    def put(self, model: str, key: str, vec: np.ndarray):
+        if self.maxsize == 0:
+            return
+        vec = np.array(vec, dtype="float32").reshape(-1)
+        vec.flags.writeable = False
+        with self._lock:
+            self._data[(model, key)] = vec
+            self._data.move_to_end((model, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "path": self.path,
+            }
+
+    def save(self):
+        """Write entries (oldest first, so LRU order survives) to self.path."""
+        if not self.path:
+            return
+        with self._lock:
+            items = list(self._data.items())
+        if not items:
+            return
+        # every API worker saves at exit; a per-process temp name keeps their writes apart
+        tmp = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            models=np.asarray([m for (m, _), _ in items]),
+            keys=np.asarray([k for (_, k), _ in items]),
+            vecs=np.stack([v for _, v in items]),
+        )
+        os.replace(tmp, self.path)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                for m, k, v in zip(z["models"].tolist(), z["keys"].tolist(), z["vecs"]):
+                    self.put(m, k, v)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable query cache {self.path}: {e}")
+
+
+_cache: Optional[QueryCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> QueryCache:
+    """Process-wide cache, loaded from disk (and saved at exit) when QUERY_CACHE_PATH is set."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = QueryCache()
+                if cache.path:
+                    cache.load()
+                    atexit.register(cache.save)
+                _cache = cache
+    return _cache
+
+def cached_embedding(model: str, query: str, encode: Callable[[str], np.ndarray]) -> np.ndarray:
+    """
+    Return a (1, dim) float32 query vector, running `encode` on the normalized text only
+    on a cache miss.
+    """
+    key = normalize_query(query)
+    cache = get_cache()
+    vec = cache.get(model, key)
+    if vec is None:
+        vec = np.asarray(encode(key), dtype="float32").reshape(-1)
+        cache.put(model, key, vec)
+    return vec.reshape(1, -1).copy()
+
+def cached_embeddings(model: str, queries: List[str], encode_many: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """Batch form of cached_embedding: (n, dim) vectors, all misses encoded in one `encode_many` call."""
+    keys = [normalize_query(q) for q in queries]
+    cache = get_cache()
+    found = {key: cache.get(model, key) for key in dict.fromkeys(keys)}
+    missing = [key for key, vec in found.items() if vec is None]
+    if missing:
+        for key, vec in zip(missing, np.asarray(encode_many(missing), dtype="float32")):
+            cache.put(model, key, vec)
+            found[key] = vec
+    return np.stack([found[key] for key in keys]).astype("float32")
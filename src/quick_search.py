@@ -1,17 +1,18 @@
 # src/quick_search.py
 
-import pickle
 import faiss
-from sentence_transformers import SentenceTransformer
+from .encoders import get_encoder
+from .meta_store import load_meta
 import numpy as np
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
 FAISS_INDEX_PATH = "faiss_index.bin"
-METADATA_PATH = "faiss_metadata.pkl"
+METADATA_PATH = "faiss_metadata"
+LEGACY_METADATA_PATH = "faiss_metadata.pkl"
 
 def embed_query(q: str):
     """Why: embed the user query with the same model & normalization as docs."""
-    model = SentenceTransformer(EMBED_MODEL)
+    model = get_encoder(EMBED_MODEL)
     vec = model.encode([q]).astype("float32")
     # faiss.normalize_L2(vec)
     norm = np.linalg.norm(vec, axis=1, keepdims=True)
@@ -22,8 +23,7 @@ def embed_query(q: str):
 def main():
     # Load index + metadata
     index = faiss.read_index(FAISS_INDEX_PATH)
-    with open(METADATA_PATH, "rb") as f:
-        metas = pickle.load(f)
+    metas = load_meta(METADATA_PATH, LEGACY_METADATA_PATH)
 
     # Ask for a test query
     q = input("Query (e.g., 'Impossible Meat tacos in Los Angeles'): ")
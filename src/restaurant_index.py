@@ -0,0 +1,99 @@
+# src/restaurant_index.py
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from .meta_store import to_str
+
+RESTAURANT_INDEX_PATH = "faiss_restaurants.npz"   # written by ingest_embeddings next to the FAISS index
+
+def restaurant_key(name) -> str:
+    """Same normalization the retriever dedupes on (stripped, lower-cased restaurant_name)."""
+    name = to_str(name)
+    return "" if name is None else name.strip().lower()
+
+
+class RestaurantPooler:
+    """Sums live item vectors per restaurant as batches stream past; rows are numbered in add() order."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.ids: Dict[str, int] = {}
+        self._sums = np.zeros((0, dim), dtype=np.float64)
+        self._item_restaurant: List[np.ndarray] = []
+
+    def add(self, names: Sequence, vecs: np.ndarray, live: Optional[Sequence] = None):
+        codes = np.asarray([self.ids.setdefault(restaurant_key(n), len(self.ids)) for n in names], dtype=np.int32)
+        if live is not None:
+            codes[np.asarray(live, dtype=float) == 0] = -1  # tombstones belong to no restaurant
+        if len(self.ids) > len(self._sums):
+            grow = np.zeros((max(len(self.ids), 2 * len(self._sums)) - len(self._sums), self.dim))
+            self._sums = np.vstack([self._sums, grow])
+        ok = codes >= 0
+        np.add.at(self._sums, codes[ok], np.asarray(vecs, dtype=np.float64)[ok])
+        self._item_restaurant.append(codes)
+
+    def finish(self) -> "RestaurantIndex":
+        names = list(self.ids)
+        vecs = self._sums[:len(names)]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        item_restaurant = (np.concatenate(self._item_restaurant) if self._item_restaurant
+                           else np.empty(0, dtype=np.int32))
+        return RestaurantIndex(names, (vecs / norms).astype(np.float32), item_restaurant)
+
+
+class RestaurantIndex:
+    """
+    One pooled (mean, re-normalized) vector per restaurant plus the item -> restaurant map,
+    for two-stage search: pick restaurants first, then rank only their items.
+    """
+
+    def __init__(self, names: List[str], vecs: np.ndarray, item_restaurant: np.ndarray):
+        self.names = names
+        self.vecs = vecs
+        self.item_restaurant = np.asarray(item_restaurant, dtype=np.int32)
+        self.n = len(self.item_restaurant)
+        # items grouped by restaurant: items_by[offsets[r]:offsets[r+1]] are restaurant r's rows
+        live = self.item_restaurant >= 0
+        order = np.argsort(self.item_restaurant, kind="stable")
+        self._items_by = order[live[order]].astype(np.int64)
+        self._offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.item_restaurant[live], minlength=len(names)), out=self._offsets[1:])
+
+    @classmethod
+    def from_index(cls, index, names: Sequence, live: Optional[Sequence] = None,
+                   batch: int = 65536) -> "RestaurantIndex":
+        """Pool vectors read back from a FAISS index (row i = vector id i); tombstones are skipped."""
+        pooler = RestaurantPooler(index.d)
+        live = np.ones(len(names)) if live is None else np.asarray(live, dtype=float)
+        for start in range(0, len(names), batch):
+            ids = np.arange(start, min(start + batch, len(names)), dtype=np.int64)
+            vecs = np.zeros((len(ids), index.d), dtype=np.float32)
+            ok = live[ids] != 0
+            if ok.any():
+                vecs[ok] = index.reconstruct_batch(ids[ok])
+            pooler.add(names[start:start + len(ids)], vecs, live[ids])
+        return pooler.finish()
+
+    def save(self, path: str = RESTAURANT_INDEX_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, names=np.asarray(self.names, dtype=str), vecs=self.vecs, item_restaurant=self.item_restaurant)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = RESTAURANT_INDEX_PATH) -> "RestaurantIndex":
+        with np.load(path) as d:
+            return cls(d["names"].tolist(), d["vecs"], d["item_restaurant"])
+
+    def nonempty(self) -> np.ndarray:
+        """Restaurants with at least one live item."""
+        return np.flatnonzero(np.diff(self._offsets))
+
+    def restaurants_of(self, item_ids: np.ndarray) -> np.ndarray:
+        """Distinct restaurants owning any of `item_ids`."""
+        r = np.unique(self.item_restaurant[item_ids])
+        return r[r >= 0]
+
+    def items_of(self, restaurants: Iterable[int]) -> np.ndarray:
+        parts = [self._items_by[self._offsets[r]:self._offsets[r + 1]] for r in restaurants]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
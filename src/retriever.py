@@ -1,55 +1,70 @@
 # src/retriever.py
-from typing import Dict, Any, Optional, List
+import json
+from collections import deque
+import threading
+from typing import Dict, Any, Optional, List, Sequence, Union
+import numpy as np
 from . import vector_store as vs
 # Default location used when user doesn't specify a city (your dataset is SF-heavy)
 DEFAULT_CITY = "San Francisco"
+LEXICAL_WEIGHT = 0.3   # weight of max-normalized BM25 added to the cosine score for rare-term queries
+RESTAURANT_FANOUT = 2  # restaurants shortlisted per result wanted in two-stage search
+ADAPTIVE_GROWTH = 4         # item-level search: fetch size multiplier per round while short of k
+ADAPTIVE_MAX_FETCH = 8192   # ... and its ceiling
 
 
-def _eq_ci(a, b):
-    return (str(a).strip().lower() == str(b).strip().lower()) if (a is not None and b is not None) else False
+def _as_float(v) -> Optional[float]:
+    try:
+        return float(v)
+    except Exception:
+        return None
 
-def _passes_filters(meta: Dict[str, Any], f: Optional[Dict[str, Any]]) -> bool:
+def compile_filters(f: Optional[Dict[str, Any]], stats: Optional[Dict[str, float]] = None) -> Optional[np.ndarray]:
+    """
+    Compile a filter dict into one boolean mask over all rows (None = no filtering).
+    City/state match exactly (case-insensitive), categories_any by substring; rows with a
+    missing rating / price / confidence pass the numeric thresholds.
+    If `stats` is given, it receives the share of rows each filter rejects on its own.
+    """
     if not f:
-        return True
-    # City / State exact (case-insensitive)
-    if "city" in f and not _eq_ci(meta.get("city"), f["city"]):
-        return False
-    if "state" in f and not _eq_ci(meta.get("state"), f["state"]):
-        return False
-    # Categories contains any of these substrings
+        return None
+    cols = vs.filter_columns()
+    mask = np.ones(cols["rows"], dtype=bool) if cols["live"] is None else cols["live"].copy()
+
+    def apply(name, keep):
+        nonlocal mask
+        if stats is not None:
+            stats[name] = round(1.0 - float(np.count_nonzero(keep)) / max(cols["rows"], 1), 4)
+        mask &= keep
+
+    # City / State exact (case-insensitive), on pre-normalized codes
+    for field in ("city", "state"):
+        if field in f:
+            codes, lookup = cols[field]
+            want = lookup.get(str(f[field]).strip().lower()) if f[field] is not None else None
+            if want is None:
+                if stats is not None:
+                    stats[field] = 1.0
+                return np.zeros(cols["rows"], dtype=bool)
+            apply(field, codes == want)
+    # Categories contains any of these substrings: test each distinct string once, then gather
     if "categories_any" in f:
-        cats = (meta.get("categories") or "").lower()
-        wanted = [c.lower() for c in f["categories_any"]]
-        if not any(w in cats for w in wanted):
-            return False
-    # Min rating
-    if "min_rating" in f:
-        try:
-            if meta.get("rating") is not None and float(meta["rating"]) < float(f["min_rating"]):
-                return False
-        except Exception:
-            pass
-    # Max price (supports "$", "$$", "$$$" by length or numeric)
-    if "max_price" in f:
-        price = meta.get("price")
-        maxp = f["max_price"]
-        if isinstance(price, str) and isinstance(maxp, int):
-            if len(price.strip()) > maxp:
-                return False
-        elif isinstance(price, (int, float)) and float(price) > float(maxp):
-            return False
-    # Ingredient confidence threshold (optional)
-    if "confidence_min" in f:
-        try:
-            conf = meta.get("confidence")
-            if conf is not None and float(conf) < float(f["confidence_min"]):
-                return False
-        except Exception:
-            pass
-    return True
-
-import re
-from typing import Dict, Any, Optional, List
+        codes, vocab = cols["categories"]
+        wanted = [str(c).lower() for c in f["categories_any"]]
+        table = np.asarray([any(w in cats for w in wanted) for cats in vocab] + [False], dtype=bool)
+        apply("categories_any", table[codes])
+    # Min rating / confidence threshold / max price ("$".."$$$$" parsed to 1-4, or numeric)
+    for field, col, cmp in (("min_rating", "rating", np.less),
+                            ("confidence_min", "confidence", np.less),
+                            ("max_price", "price", np.greater)):
+        if field in f:
+            limit = _as_float(f[field])
+            if limit is not None:
+                # NaN compares False, so rows without a value pass
+                apply(field, ~cmp(cols[col], limit))
+    return mask
+
+from .query_cache import NEAR_ME_RE as _NEAR_ME_RE, strip_near_me as _strip_near_me
 
 def _norm(s):
     return "" if s is None else str(s).strip()
@@ -61,11 +76,15 @@ def _merge_filters_with_default_city(filters: Optional[Dict[str, Any]], default_
         f["city"] = default_city
     return f
 
-_NEAR_ME_RE = re.compile(r"\bnear me\b", flags=re.IGNORECASE)
+def _prepare_query(query: str, filters: Optional[Dict[str, Any]], default_city: str, auto_city: bool):
+    """Strip 'near me' from the text and inject the default city where needed."""
+    q_clean = _strip_near_me(query)
+    f = dict(filters) if filters else {}
 
-def _strip_near_me(query: str) -> str:
-    """Remove 'near me' from the text (case-insensitive) but keep the rest of the query."""
-    return _NEAR_ME_RE.sub("", query).strip()
+    needs_default = bool(_NEAR_ME_RE.search(query)) or not _norm(f.get("city"))
+    if auto_city and needs_default:
+        f = _merge_filters_with_default_city(f, default_city)
+    return q_clean, f
 
 def find_restaurants(
     query: str,
@@ -80,16 +99,261 @@ def find_restaurants(
       - detects 'near me' and injects the default city,
       - or injects default city whenever no city is provided (if auto_city=True).
     """
-    q_clean = _strip_near_me(query)
-    f = dict(filters) if filters else {}
+    q_clean, f = _prepare_query(query, filters, default_city, auto_city)
+    return semantic_search(q_clean, k=k, filters=f, limit_per_restaurant=limit_per_restaurant)
 
-    needs_default = bool(_NEAR_ME_RE.search(query)) or not _norm(f.get("city"))
-    if auto_city and needs_default:
-        f = _merge_filters_with_default_city(f, default_city)
+def find_restaurants_many(
+    queries: List[str],
+    k: Union[int, Sequence[int]] = 20,
+    filters: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    limit_per_restaurant: int = 1,
+    default_city: str = DEFAULT_CITY,
+    auto_city: bool = True,
+) -> List[List[Dict[str, Any]]]:
+    """find_restaurants for a batch of queries (per-query filters), via semantic_search_many."""
+    filters = filters or [None] * len(queries)
+    prepared = [_prepare_query(q, f, default_city, auto_city) for q, f in zip(queries, filters)]
+    return semantic_search_many(
+        [q for q, _ in prepared],
+        k=k,
+        filters=[f for _, f in prepared],
+        limit_per_restaurant=limit_per_restaurant,
+    )
 
-    # Call the original semantic search you already have
-    return semantic_search(q_clean, k=k, filters=f, limit_per_restaurant=limit_per_restaurant)
+def _filters_key(f: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(f or {}, sort_keys=True, default=str)
+
+class _Collector:
+    """
+    Gathers one query's hits from every source (BM25 candidates, dense search) under a single
+    fused score: cosine + `bonus` (LEXICAL_WEIGHT * normalized BM25, only lexical candidates have
+    one). finish() ranks them, de-duplicates restaurants and keeps the best k.
+    """
+
+    def __init__(self, k: int, limit_per_restaurant: int):
+        self.k = k
+        self.limit = limit_per_restaurant
+        self.bonus: Dict[int, float] = {}
+        self.out: List[Dict[str, Any]] = []
+        self._scores: Dict[int, float] = {}
+        self._restaurants = set()
+        self._metas = None
+        # telemetry
+        self.paths: List[str] = []
+        self.rounds = 0
+        self.scanned = 0
+        self.deduped = 0
+
+    def full(self) -> bool:
+        """Enough distinct items (restaurants, when limited) gathered to fill k."""
+        return len(self._restaurants if self.limit else self._scores) >= self.k
+
+    def feed(self, D, I, metas, path: str = "items"):
+        restaurant = vs.filter_columns()["restaurant"]
+        self.rounds += 1
+        if path not in self.paths:
+            self.paths.append(path)
+        self._metas = metas
+        for score, idx in zip(D, I):
+            idx = int(idx)
+            if idx == -1 or idx in self._scores:
+                continue  # a hit another source / an earlier round already scored
+            self.scanned += 1
+            self._scores[idx] = float(score) + self.bonus.get(idx, 0.0)
+            self._restaurants.add(int(restaurant[idx]))
 
+    def finish(self) -> List[Dict[str, Any]]:
+        if not self._scores:
+            return self.out
+        restaurant = vs.filter_columns()["restaurant"]
+        ids = np.fromiter(self._scores, dtype="int64", count=len(self._scores))
+        scores = np.fromiter(self._scores.values(), dtype="float64", count=len(ids))
+        seen = set()
+        for o in np.argsort(-scores, kind="stable"):
+            if len(self.out) >= self.k:
+                break
+            idx = int(ids[o])
+            if self.limit:
+                key = int(restaurant[idx])
+                if key in seen:
+                    self.deduped += 1
+                    continue
+                seen.add(key)
+            self.out.append({"score": float(scores[o]), **self._metas[idx]})
+        return self.out
+
+class SearchMetrics:
+    """Per-query retrieval telemetry (rounds, candidates scanned, rejections): running totals + recent queries."""
+
+    def __init__(self, recent: int = 100):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self.queries = 0
+        self.short = 0
+        self.rounds = 0
+        self.scanned = 0
+        self.deduped = 0
+        self._filter_sum: Dict[str, float] = {}
+        self._filter_n: Dict[str, int] = {}
+
+    def record(self, c: "_Collector", filter_rejection: Dict[str, float]):
+        rec = {"k": c.k, "returned": len(c.out), "paths": list(c.paths), "rounds": c.rounds,
+               "scanned": c.scanned, "deduped": c.deduped, "filter_rejection": dict(filter_rejection)}
+        with self._lock:
+            self._recent.append(rec)
+            self.queries += 1
+            self.short += len(c.out) < c.k
+            self.rounds += c.rounds
+            self.scanned += c.scanned
+            self.deduped += c.deduped
+            for name, rate in filter_rejection.items():
+                self._filter_sum[name] = self._filter_sum.get(name, 0.0) + rate
+                self._filter_n[name] = self._filter_n.get(name, 0) + 1
+
+    def stats(self, recent: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            n = max(self.queries, 1)
+            return {
+                "queries": self.queries,
+                "short_results": self.short,
+                "avg_rounds": round(self.rounds / n, 3),
+                "avg_scanned": round(self.scanned / n, 1),
+                "dedupe_rejection_rate": round(self.deduped / self.scanned, 4) if self.scanned else None,
+                "filter_rejection": {name: round(self._filter_sum[name] / self._filter_n[name], 4)
+                                     for name in self._filter_sum},
+                "recent": list(self._recent)[-recent:],
+            }
+
+SEARCH_METRICS = SearchMetrics()
+
+def search_stats() -> Dict[str, Any]:
+    return SEARCH_METRICS.stats()
+
+def _lexical_hits(lex, query: str, qv, eligible):
+    """
+    (D, I, metas, bonus): dense scores over the BM25 candidates of a query with rare terms, and
+    each candidate's fusion bonus (LEXICAL_WEIGHT * max-normalized BM25); None when the query
+    has no rare terms.
+    """
+    cand = lex.candidates(query, eligible)
+    if cand is None or not len(cand[0]):
+        return None
+    ids, bm25 = cand
+    D, I, metas = vs.search_vectors(qv[None, :], k=len(ids), ids=ids)
+    bonus = dict(zip(ids.tolist(), (LEXICAL_WEIGHT * bm25 / (bm25.max() or 1.0)).tolist()))
+    return D[0], I[0], metas, bonus
+
+def _two_stage_hits(qv, k: int, mask, seed_items):
+    """
+    Restaurant-first search for one query: shortlist the restaurants of the best pooled
+    restaurant vectors (RESTAURANT_FANOUT per result wanted) plus those owning `seed_items`
+    (its top item hits), then rank only the shortlisted restaurants' eligible items.
+    Bounded work, and k distinct restaurants whenever k restaurants have an eligible item.
+    """
+    ridx = vs.restaurant_index()
+    if mask is None:
+        mask = vs.filter_columns()["live"]
+    cand = ridx.nonempty() if mask is None else ridx.restaurants_of(np.flatnonzero(mask))
+    if not len(cand):
+        return None
+    scores = ridx.vecs[cand] @ qv
+    keep = min(len(cand), max(k * RESTAURANT_FANOUT, k + 10))
+    top = cand[np.argpartition(-scores, keep - 1)[:keep]] if keep < len(cand) else cand
+    seeds = ridx.restaurants_of(seed_items[seed_items >= 0])
+    items = ridx.items_of(np.union1d(top, seeds))
+    if mask is not None:
+        items = items[mask[items]]
+    # the shortlist bounds the set; score all of it exactly, even past EXACT_SCAN_MAX
+    D, I, metas = vs.search_vectors(qv[None, :], k=len(items), ids=items, exact=True)
+    return D[0], I[0], metas
+
+def semantic_search_many(
+    queries: List[str],
+    k: Union[int, Sequence[int]] = 20,
+    filters: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    limit_per_restaurant: int = 1,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Batch semantic search: one encode for all queries, and one multi-row FAISS search per
+    distinct filter set (a single call when the batch shares its filters).
+    Queries with rare terms (see lexical.py) also score their BM25 candidates densely; those and
+    the dense hits are ranked together on cosine + LEXICAL_WEIGHT * normalized BM25 (0 for
+    items that aren't candidates), so scores never increase down the results.
+    With limit_per_restaurant=1 the dense stage is two-stage (restaurants, then their items);
+    otherwise it is an adaptive item-level search (see _adaptive_items).
+    Every query is recorded in SEARCH_METRICS.
+    `k` is shared or given per query; results come back in query order.
+    """
+    if not queries:
+        return []
+    ks = [k] * len(queries) if isinstance(k, int) else list(k)
+    filters = list(filters) if filters else [None] * len(queries)
+    qv = vs.embed_queries(queries)
+    lex = vs.lexical_index()
+
+    groups: Dict[str, List[int]] = {}
+    for i, f in enumerate(filters):
+        groups.setdefault(_filters_key(f), []).append(i)
+
+    collectors = [_Collector(ks[i], limit_per_restaurant) for i in range(len(queries))]
+    group_stats: Dict[int, Dict[str, float]] = {}
+    live = vs.filter_columns()["live"]
+    n_live = int(live.sum()) if live is not None else vs.filter_columns()["rows"]
+    for rows in groups.values():
+        # Filters compile to one row mask; the eligible ids are pushed into the search
+        fstats: Dict[str, float] = {}
+        mask = compile_filters(filters[rows[0]], fstats)
+        ids = None if mask is None else np.flatnonzero(mask)
+        for i in rows:
+            group_stats[i] = fstats
+        if ids is not None and len(ids) == 0:
+            continue
+        eligible_n = len(ids) if ids is not None else n_live
+        for i in rows:
+            hits = None
+            if lex is not None:
+                eligible = mask if mask is not None else live
+                hits = _lexical_hits(lex, queries[i], qv[i], eligible)
+            if hits is not None:
+                D, I, metas, collectors[i].bonus = hits
+                collectors[i].feed(D, I, metas, path="lexical")
+        # dense search runs for every query: a strong dense hit must be able to outrank a weak lexical one
+        if limit_per_restaurant == 1:
+            # one item per restaurant: choose restaurants first, then items within them
+            D, I, _ = vs.search_vectors(qv[rows], k=max(ks[i] for i in rows), ids=ids)
+            for j, i in enumerate(rows):
+                hits = _two_stage_hits(qv[i], ks[i], mask, I[j])
+                if hits is not None:
+                    collectors[i].feed(*hits, path="two_stage")
+            continue
+        _adaptive_items(qv, rows, collectors, ids, eligible_n)
+    for i, c in enumerate(collectors):
+        c.finish()
+        SEARCH_METRICS.record(c, group_stats.get(i, {}))
+    return [c.out for c in collectors]
+
+def _adaptive_items(qv, rows: List[int], collectors: List["_Collector"], ids, eligible_n: int):
+    """
+    Item-level search that grows the fetch size (x ADAPTIVE_GROWTH per round, up to
+    ADAPTIVE_MAX_FETCH or the number of eligible rows) only for queries still short of k
+    after filtering and dedupe. Each round feeds its whole hit list: an approximate index
+    (HNSW widens its search with k) needn't return the previous round's hits as a prefix,
+    and the collector skips the ones it already has.
+    """
+    cap = max(1, min(ADAPTIVE_MAX_FETCH, eligible_n))
+    fetch = min(max(max(collectors[i].k for i in rows), 1), cap)
+    pending = list(rows)
+    while pending:
+        D, I, metas = vs.search_vectors(qv[pending], k=fetch, ids=ids)
+        still_short = []
+        for j, i in enumerate(pending):
+            c = collectors[i]
+            c.feed(D[j], I[j], metas)
+            exhausted = I.shape[1] < fetch or (I[j] == -1).any()
+            if not c.full() and not exhausted and fetch < cap:
+                still_short.append(i)
+        pending = still_short
+        fetch = min(fetch * ADAPTIVE_GROWTH, cap)
 
 def semantic_search(
     query: str,
@@ -98,22 +362,4 @@ def semantic_search(
     limit_per_restaurant: int = 1,
 ) -> List[Dict[str, Any]]:
     """Semantic search with optional structured filters and de-dup by restaurant."""
-    # Over-retrieve, then filter & dedupe
-    D, I, metas = vs.search(query, k=max(k * 3, k))
-    out: List[Dict[str, Any]] = []
-    seen = set()
-    for score, idx in zip(D, I):
-        if idx == -1:
-            continue
-        m = metas[idx]
-        if not _passes_filters(m, filters):
-            continue
-        key = (m.get("restaurant_name") or "").strip().lower()
-        if limit_per_restaurant and key in seen:
-            continue
-        if limit_per_restaurant:
-            seen.add(key)
-        out.append({"score": float(score), **m})
-        if len(out) >= k:
-            break
-    return out
+    return semantic_search_many([query], k=k, filters=[filters], limit_per_restaurant=limit_per_restaurant)[0]
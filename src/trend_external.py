@@ -1,16 +1,19 @@
 # src/trend_external.py
-import argparse, pickle
-from collections import Counter, defaultdict
+import argparse, os, pickle, re, threading
+from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
 from dateutil import parser as dateparser
 from dateutil.tz import tzutc
 
 
 EXT_META_PATH = "faiss_ext_metadata.pkl"
+TREND_INDEX_PATH = "faiss_ext_trend.pkl"   # written by ext_ingest next to the metadata
+_TOKEN_RE = re.compile(r"\w+")
+EXPAND_CACHE_SIZE = 4096   # query tokens whose substring expansion is memoized per index
 
 def _norm(s): return "" if s is None else str(s).strip()
-def _contains_ci(text: str, needle: str) -> bool:
-    return needle.lower() in _norm(text).lower()
 
 def _parse_dt(dt_str):
     if not dt_str:
@@ -28,43 +31,193 @@ def _parse_dt(dt_str):
     except Exception:
         return None
 
+def published_epoch(published) -> Optional[float]:
+    """UTC epoch seconds for a `published` string (naive times are taken as UTC); None if unparseable."""
+    d = _parse_dt(published)
+    return d.timestamp() if d else None
+
+def _haystack(m) -> str:
+    return (_norm(m.get("text")) + " " + _norm(m.get("title"))).lower()
+
+
+class TrendIndex:
+    """
+    Everything monthly_trend needs, precomputed at ingest time:
+      ts     UTC epoch seconds per item (NaN when undated)
+      month  YYYYMM bucket per item
+      vocab / offsets / ids
+             inverted index of lowercased \\w+ tokens of text + title (postings sorted by item)
+    Queries keep substring semantics: a term expands to every vocab token containing it,
+    and terms spanning non-word characters are verified against the candidates' text.
+    The expansion goes through a trigram index over the vocab (built on first use) and is
+    memoized per query token.
+    """
+
+    def __init__(self, meta, ts, month, vocab, offsets, ids):
+        self.meta = meta
+        self.ts = ts
+        self.month = month
+        self.vocab = vocab
+        self.offsets = offsets
+        self.ids = ids
+        self._trigrams = None
+        self._expanded = {}
+
+    @classmethod
+    def from_meta(cls, meta) -> "TrendIndex":
+        n = len(meta)
+        ts = np.full(n, np.nan)
+        month = np.zeros(n, dtype=np.int32)
+        postings = defaultdict(list)
+        for i, m in enumerate(meta):
+            pub = _parse_dt(m.get("published"))
+            if pub:
+                ts[i] = pub.timestamp()
+                month[i] = pub.year * 100 + pub.month
+            for tok in set(_TOKEN_RE.findall(_haystack(m))):
+                postings[tok].append(i)
+        vocab = sorted(postings)
+        lengths = np.fromiter((len(postings[t]) for t in vocab), dtype=np.int64, count=len(vocab))
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        ids = np.fromiter((i for t in vocab for i in postings[t]), dtype=np.int32, count=int(offsets[-1]))
+        return cls(meta, ts, month, vocab, offsets, ids)
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": 1, "rows": len(self.ts), "ts": self.ts, "month": self.month,
+                         "vocab": self.vocab, "offsets": self.offsets, "ids": self.ids}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, meta) -> "TrendIndex":
+        """The saved index for `meta`, or one built from `meta` if the file is missing or for other rows."""
+        try:
+            with open(path, "rb") as f:
+                d = pickle.load(f)
+            if d.get("version") == 1 and d["rows"] == len(meta):
+                return cls(meta, d["ts"], d["month"], d["vocab"], d["offsets"], d["ids"])
+        except FileNotFoundError:
+            pass
+        return cls.from_meta(meta)
+
+    def _postings(self, tok_ids) -> np.ndarray:
+        parts = [self.ids[self.offsets[t]:self.offsets[t + 1]] for t in tok_ids]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    def _trigram_index(self):
+        """trigram -> sorted ids of vocab tokens containing it."""
+        if self._trigrams is None:
+            grams = defaultdict(list)
+            for j, v in enumerate(self.vocab):
+                for g in {v[i:i + 3] for i in range(len(v) - 2)}:
+                    grams[g].append(j)
+            self._trigrams = {g: np.asarray(js, dtype=np.int32) for g, js in grams.items()}
+        return self._trigrams
+
+    def _containing(self, tok: str) -> np.ndarray:
+        """Ids of vocab tokens that contain `tok`."""
+        if len(tok) < 3:
+            # too short for trigrams; a C-level scan, and memoized by the caller
+            return np.flatnonzero(np.char.find(np.asarray(self.vocab, dtype=str), tok) >= 0)
+        grams = self._trigram_index()
+        cand = None
+        for g in {tok[i:i + 3] for i in range(len(tok) - 2)}:
+            js = grams.get(g)
+            if js is None:
+                return np.empty(0, dtype=np.int64)
+            cand = js if cand is None else np.intersect1d(cand, js, assume_unique=True)
+        return np.asarray([j for j in cand if tok in self.vocab[j]], dtype=np.int64)
+
+    def _expand(self, tok: str) -> np.ndarray:
+        """Sorted ids of items with a token containing `tok`."""
+        hits = self._expanded.get(tok)
+        if hits is None:
+            hits = self._postings(self._containing(tok))
+            if len(self._expanded) >= EXPAND_CACHE_SIZE:
+                self._expanded.clear()
+            self._expanded[tok] = hits
+        return hits
+
+    def matching(self, term: str) -> np.ndarray:
+        """Sorted ids of items whose text or title contains `term` (case-insensitive)."""
+        needle = term.lower()
+        toks = _TOKEN_RE.findall(needle)
+        if not toks:
+            # only punctuation/spaces: nothing to look up, scan
+            return np.asarray([i for i, m in enumerate(self.meta) if needle in _haystack(m)], dtype=np.int32)
+        cand = None
+        for tok in toks:
+            hits = self._expand(tok)
+            cand = hits if cand is None else np.intersect1d(cand, hits, assume_unique=True)
+        if toks == [needle]:
+            return cand  # a bare word can't straddle tokens, so the expansion is exact
+        return np.asarray([i for i in cand if needle in _haystack(self.meta[i])], dtype=np.int32)
+
+    def trend(self, terms, must_include=None, months=12, mode="all"):
+        now = datetime.now(tzutc())
+        start = (now - timedelta(days=months * 31)).timestamp()
+        ok = np.zeros(len(self.ts), dtype=bool)
+        sets = [self.matching(t) for t in terms]
+        if mode == "all":
+            ids = sets[0] if sets else np.arange(len(self.ts))
+            for other in sets[1:]:
+                ids = np.intersect1d(ids, other, assume_unique=True)
+        else:
+            ids = np.unique(np.concatenate(sets)) if sets else np.empty(0, dtype=np.int32)
+        if must_include:
+            ids = np.intersect1d(ids, self.matching(must_include), assume_unique=True)
+        ok[ids] = True
+        with np.errstate(invalid="ignore"):
+            ok &= (self.ts >= start) & (self.ts <= now.timestamp())
+
+        hit = np.flatnonzero(ok)
+        out = []
+        for ym in np.unique(self.month[hit]):
+            rows = hit[self.month[hit] == ym]
+            samples = [{"title": self.meta[i].get("title"), "url": self.meta[i].get("url")} for i in rows[:3]]
+            out.append((f"{ym // 100:04d}-{ym % 100:02d}", int(len(rows)), samples))
+        return out
+
+
 def monthly_trend(meta, terms, must_include=None, months=12, mode="all"):
     """
     Count items per month where text OR title matches terms.
     mode='all' => all terms must appear (AND)
     mode='any' => any one term is enough (OR)
+    `meta` is a TrendIndex, or the metadata list (indexed on the fly).
     """
-    now = datetime.now(tzutc())
-    start = now - timedelta(days=months * 31)
-    buckets = Counter()
-    samples = defaultdict(list)
-
-    for m in meta:
-        pub = _parse_dt(m.get("published"))
-        if not pub or pub < start or pub > now:
-            continue
-
-        text = _norm(m.get("text")) + " " + _norm(m.get("title"))
+    index = meta if isinstance(meta, TrendIndex) else TrendIndex.from_meta(meta)
+    return index.trend(terms, must_include=must_include, months=months, mode=mode)
 
-        if must_include and not _contains_ci(text, must_include):
-            continue
 
-        if mode == "all":
-            ok = all(_contains_ci(text, t) for t in terms)
-        else:
-            ok = any(_contains_ci(text, t) for t in terms)
-        if not ok:
-            continue
-
-        ym = pub.strftime("%Y-%m")
-        buckets[ym] += 1
-        if len(samples[ym]) < 3:
-            samples[ym].append({"title": m.get("title"), "url": m.get("url")})
+_lock = threading.Lock()
+_resident: Optional[TrendIndex] = None
+_version = None
 
+def _file_version():
     out = []
-    for ym in sorted(buckets.keys()):
-        out.append((ym, buckets[ym], samples[ym]))
-    return out
+    for path in (EXT_META_PATH, TREND_INDEX_PATH):
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            out.append(None)
+    return tuple(out)
+
+def get_trend_index() -> TrendIndex:
+    """Process-wide TrendIndex for EXT_META_PATH; reloaded only when ext_ingest rewrites the files."""
+    global _resident, _version
+    version = _file_version()
+    if _resident is not None and version == _version:
+        return _resident
+    with _lock:
+        if _resident is None or version != _version:
+            with open(EXT_META_PATH, "rb") as f:
+                meta = pickle.load(f)
+            _resident = TrendIndex.load(TREND_INDEX_PATH, meta)
+            _version = version if _file_version() == version else None
+    return _resident
 
 def main():
     ap = argparse.ArgumentParser()
@@ -74,11 +227,8 @@ def main():
     ap.add_argument("--mode", choices=["all", "any"], default="all", help="Require all terms or any term")
     args = ap.parse_args()
 
-    with open(EXT_META_PATH, "rb") as f:
-        meta = pickle.load(f)
-
     must_include = args.must_include.strip() or None
-    trend = monthly_trend(meta, args.terms, must_include=must_include, months=args.months, mode=args.mode)
+    trend = monthly_trend(get_trend_index(), args.terms, must_include=must_include, months=args.months, mode=args.mode)
 
     if not trend:
         print("No matches with the current feeds/filters. Try broader feeds, --mode any, or remove --must_include.")
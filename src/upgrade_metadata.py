@@ -1,14 +1,16 @@
 # src/upgrade_metadata.py
-import pickle, pandas as pd, os
+import pandas as pd, os
+from .meta_store import SCHEMA, MetaWriter, load_meta
 
 CSV_PATH = "data/restaurants.csv"
-METADATA_PATH = "faiss_metadata.pkl"
+METADATA_PATH = "faiss_metadata"             # columnar store (see meta_store.py)
+LEGACY_METADATA_PATH = "faiss_metadata.pkl"  # converted on the way through if that's all we have
 OUT_PATH = METADATA_PATH  # in-place update
 
 def main():
     if not os.path.exists(CSV_PATH):
         raise FileNotFoundError(f"Missing {CSV_PATH}")
-    if not os.path.exists(METADATA_PATH):
+    if not os.path.exists(METADATA_PATH) and not os.path.exists(LEGACY_METADATA_PATH):
         raise FileNotFoundError(f"Missing {METADATA_PATH} (build your index first)")
 
     df = pd.read_csv(CSV_PATH)
@@ -18,24 +20,31 @@ def main():
             df[col] = ""
         df[col] = df[col].fillna("")
     # load current metas
-    with open(METADATA_PATH, "rb") as f:
-        metas = pickle.load(f)
+    metas = load_meta(METADATA_PATH, LEGACY_METADATA_PATH)
+    if "text_hash" in metas.columns:
+        # ingest_embeddings now writes text/source/source_id itself, keyed by item_id; rows
+        # no longer line up with the CSV by position, so there is nothing to patch here
+        print(f"✅ {METADATA_PATH} already carries 'text', 'source', 'source_id'; nothing to do.")
+        return
 
     n = min(len(df), len(metas))
     if len(df) != len(metas):
         print(f"⚠️ Row count mismatch: CSV={len(df)} vs metas={len(metas)}. Updating first {n} rows safely.")
 
-    # attach text snippet + a stable id
-    for i in range(n):
-        r = df.iloc[i]
-        text = f"{r['menu_item']}: {r['menu_description']}. Ingredients: {r['ingredient_name']}."
-        metas[i]["text"] = text
-        metas[i]["source"] = "internal"
-        # prefer existing item_id if present, else fallback to row index
-        metas[i]["source_id"] = metas[i].get("item_id", i)
-
-    with open(OUT_PATH, "wb") as f:
-        pickle.dump(metas, f)
+    # copy existing columns through, then attach text snippet + a stable id
+    cols = {c: metas.values(c) for c in metas.columns}
+    texts = (df["menu_item"].astype(str) + ": " + df["menu_description"].astype(str)
+             + ". Ingredients: " + df["ingredient_name"].astype(str) + ".").tolist()
+    cols["text"] = texts[:n] + cols.get("text", [None] * len(metas))[n:]
+    cols["source"] = ["internal"] * n + cols.get("source", [None] * len(metas))[n:]
+    # prefer existing item_id if present, else fallback to row index
+    item_ids = cols.get("item_id", [None] * len(metas))
+    cols["source_id"] = [item_ids[i] if item_ids[i] is not None else i for i in range(n)] \
+        + cols.get("source_id", [None] * len(metas))[n:]
+
+    w = MetaWriter(OUT_PATH, {c: kind for c, kind in SCHEMA.items() if c in cols})
+    w.append_columns(cols)
+    w.close()
 
     print(f"✅ Updated {OUT_PATH} with 'text', 'source', 'source_id' for {n} items.")
 
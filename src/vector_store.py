@@ -1,28 +1,176 @@
 # src/vector_store.py
-import pickle
+import os, re, threading
+from typing import Dict, Any, List, Optional
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+from .encoders import get_encoder
+from . import ann
+from .meta_store import load_meta
+from .lexical import LexicalIndex, LEXICAL_INDEX_PATH
+from .restaurant_index import RestaurantIndex, RESTAURANT_INDEX_PATH
+from .query_cache import cached_embedding, cached_embeddings
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
 FAISS_INDEX_PATH = "faiss_index.bin"
-METADATA_PATH = "faiss_metadata.pkl"
+METADATA_PATH = "faiss_metadata"              # columnar store (see meta_store.py)
+LEGACY_METADATA_PATH = "faiss_metadata.pkl"   # read if the columnar store hasn't been built yet
 
-_model = None
+EXACT_SCAN_MAX = 4096   # filters leaving at most this many rows are scored exactly, no ANN
+# Map the index and metadata files read-only rather than reading them in, so every API worker
+# on the host shares one page-cache copy. INDEX_MMAP=0 reads them into private memory instead.
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") != "0"
+
+_lock = threading.Lock()
 _index = None
 _metas = None
+_columns = None
+_lexical = None   # False once we know there's nothing to build it from
+_restaurants = None
+
+def _key(v) -> str:
+    return "" if v is None else str(v).strip().lower()
+
+def _normalized_codes(metas, field):
+    """Re-code a category column onto its stripped/lower-cased vocab: (row codes, value -> code)."""
+    if field not in metas.columns:
+        return np.full(len(metas), -1, dtype="int32"), {}
+    lookup: Dict[str, int] = {}
+    remap = np.asarray([lookup.setdefault(_key(v), len(lookup)) for v in metas.vocab[field]] + [-1], dtype="int32")
+    # code -1 (missing) indexes the trailing -1
+    return remap[metas.codes(field)], lookup
+
+def _build_filter_columns(metas):
+    """Precompute the normalized columns filters are evaluated against (once per load)."""
+    from .analytics import _price_to_num
+    nan = np.full(len(metas), np.nan)
+    cols = {"rows": len(metas)}
+    # rows deleted by an incremental ingest are tombstones, never eligible
+    cols["live"] = metas.numbers("live") != 0 if "live" in metas.columns else None
+    for field in ("city", "state"):
+        cols[field] = _normalized_codes(metas, field)
+    # restaurant dedupe key: one code per stripped/lower-cased name
+    cols["restaurant"] = _normalized_codes(metas, "restaurant_name")[0]
+    if "categories" in metas.columns:
+        cols["categories"] = (metas.codes("categories"), [v.lower() for v in metas.vocab["categories"]])
+    else:
+        cols["categories"] = (np.full(len(metas), -1, dtype="int32"), [])
+    for field in ("rating", "confidence"):
+        cols[field] = metas.numbers(field) if field in metas.columns else nan
+    if "price" in metas.columns:
+        # parse each distinct price once ("$$" -> 2, "12.5" -> 12.5), then gather per row
+        levels = [_price_to_num(v) for v in metas.vocab["price"]]
+        table = np.asarray([np.nan if v is None else v for v in levels] + [np.nan], dtype="float64")
+        cols["price"] = table[metas.codes("price")]
+    else:
+        cols["price"] = nan
+    return cols
 
 def _load_all():
-    """Lazy-load index, metadata, and model once."""
-    global _model, _index, _metas
-    if _index is None:
-        _index = faiss.read_index(FAISS_INDEX_PATH)
-    if _metas is None:
-        with open(METADATA_PATH, "rb") as f:
-            _metas = pickle.load(f)
-    if _model is None:
-        _model = SentenceTransformer(EMBED_MODEL)
-    return _index, _metas, _model
+    """Lazy-load index, metadata and filter columns once; the model comes from the shared registry."""
+    global _index, _metas, _columns
+    if _columns is None:
+        with _lock:
+            if _index is None:
+                index = ann.read_index(FAISS_INDEX_PATH, mmap=INDEX_MMAP)
+                # nprobe / efSearch chosen at build time (see ann.py)
+                ann.apply_search_params(index, ann.load_params(FAISS_INDEX_PATH))
+                _index = index
+            if _metas is None:
+                _metas = load_meta(METADATA_PATH, LEGACY_METADATA_PATH, mmap=INDEX_MMAP)
+            if _columns is None:
+                _columns = _build_filter_columns(_metas)
+    return _index, _metas, get_encoder(EMBED_MODEL)
+
+_MAPPING_RE = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+def _smaps(path: str, mapped=()) -> Dict[str, Dict[str, int]]:
+    """
+    kB counters from a /proc smaps file: "total" over every mapping, plus one entry per prefix in
+    `mapped` summing the mappings of files under it (a replaced file shows up as "<path> (deleted)").
+    """
+    out = {"total": {}}
+    current = None
+    with open(path) as f:
+        for line in f:
+            if _MAPPING_RE.match(line):
+                # "start-end perms offset dev inode [pathname]"
+                parts = line.split(None, 5)
+                name = parts[5].strip() if len(parts) > 5 else ""
+                current = next((m for m in mapped if name.startswith(m)), None)
+                continue
+            key, _, rest = line.partition(":")
+            fields = rest.split()
+            if len(fields) != 2 or fields[1] != "kB":
+                continue
+            kb = int(fields[0])
+            out["total"][key] = out["total"].get(key, 0) + kb
+            if current is not None:
+                bucket = out.setdefault(current, {})
+                bucket[key] = bucket.get(key, 0) + kb
+    return out
+
+def _memory_summary(kb: Dict[str, int]) -> Dict[str, float]:
+    mb = lambda *keys: round(sum(kb.get(k, 0) for k in keys) / 1024, 1)
+    return {"rss_mb": mb("Rss"), "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+            "private_mb": mb("Private_Clean", "Private_Dirty"), "pss_mb": mb("Pss")}
+
+def memory_stats() -> Dict[str, Any]:
+    """
+    Resident vs shared memory of this process (Linux /proc), with the part that is the mapped
+    index and metadata files. Shared pages are page cache other workers map too; PSS splits
+    them evenly between those processes. Empty where /proc isn't available.
+    """
+    index_file = os.path.abspath(FAISS_INDEX_PATH)
+    meta_dir = os.path.abspath(METADATA_PATH) + os.sep
+    try:
+        per_map = _smaps("/proc/self/smaps", (index_file, meta_dir))
+        # the kernel's own rollup is cheaper and exact; older kernels only have smaps
+        totals = _smaps("/proc/self/smaps_rollup")["total"] if os.path.exists("/proc/self/smaps_rollup") else per_map["total"]
+    except OSError:
+        return {}
+    return {
+        "mmap": INDEX_MMAP,
+        "loaded": _index is not None,
+        "process": _memory_summary(totals),
+        "index_file": _memory_summary(per_map.get(index_file, {})),
+        "metadata_files": _memory_summary(per_map.get(meta_dir, {})),
+    }
+
+def filter_columns() -> Dict[str, Any]:
+    """Normalized city/state/restaurant codes, lower-cased categories, numeric rating/price level/confidence."""
+    _load_all()
+    return _columns
+
+def lexical_index() -> Optional[LexicalIndex]:
+    """BM25 postings over item texts (see lexical.py); built from the metadata if ingest didn't write them."""
+    global _lexical
+    if _lexical is None:
+        _, metas, _ = _load_all()
+        with _lock:
+            if _lexical is None:
+                lex = LexicalIndex.load(LEXICAL_INDEX_PATH) if os.path.exists(LEXICAL_INDEX_PATH) else None
+                if lex is not None and lex.n != len(metas):
+                    lex = None  # from a different build
+                if lex is None and "text" in metas.columns:
+                    print(f"{LEXICAL_INDEX_PATH} missing or stale; building it from {METADATA_PATH} text.")
+                    lex = LexicalIndex.from_texts(metas.values("text"))
+                _lexical = lex if lex is not None else False
+    return _lexical or None
+
+def restaurant_index() -> RestaurantIndex:
+    """Pooled per-restaurant vectors + item -> restaurant map; pooled from the index if ingest didn't write them."""
+    global _restaurants
+    if _restaurants is None:
+        index, metas, _ = _load_all()
+        with _lock:
+            if _restaurants is None:
+                ridx = RestaurantIndex.load(RESTAURANT_INDEX_PATH) if os.path.exists(RESTAURANT_INDEX_PATH) else None
+                if ridx is None or ridx.n != len(metas):
+                    print(f"{RESTAURANT_INDEX_PATH} missing or stale; pooling it from {FAISS_INDEX_PATH}.")
+                    live = metas.numbers("live") if "live" in metas.columns else None
+                    ridx = RestaurantIndex.from_index(index, metas.values("restaurant_name"), live)
+                _restaurants = ridx
+    return _restaurants
 
 def embed(texts):
     """Encode a list of texts and L2-normalize (cosine-ready)."""
@@ -32,9 +180,40 @@ def embed(texts):
     norms[norms == 0] = 1.0
     return vecs / norms
 
-def search(query: str, k: int = 10):
-    """Semantic search over FAISS; returns (scores, indices, metas)."""
+def embed_query(query: str):
+    """One (1, dim) query vector, served from the shared LRU cache when this query was seen before."""
+    return cached_embedding(EMBED_MODEL, query, lambda text: embed([text])[0])
+
+def embed_queries(queries: List[str]):
+    """(n, dim) query vectors; cache misses are encoded together in one model call."""
+    return cached_embeddings(EMBED_MODEL, queries, embed)
+
+def _exact_scan(index, qv, ids, k):
+    """Score only `ids` from their stored vectors (see ann.score_ids); exact and cheap when the set is small."""
+    scores = ann.score_ids(index, qv, ids)
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(scores, top, axis=1), ids[top]
+
+def search_vectors(qv: np.ndarray, k: int = 10, ids: Optional[np.ndarray] = None, exact: bool = False):
+    """
+    Multi-row search for (n, dim) query vectors in one call; returns (D, I, metas) with one row per query.
+    If `ids` is given, only those rows are scanned: exactly when there are few of them (or
+    `exact` is set, for callers that already bounded the set), otherwise through a FAISS ID
+    selector, which on IVF / HNSW only reaches the ids in the lists / graph region it visits.
+    """
     index, metas, _ = _load_all()
-    qv = embed([query])
-    D, I = index.search(qv, k)
+    if ids is None:
+        D, I = index.search(qv, k)
+    elif len(ids) == 0:
+        D, I = np.empty((len(qv), 0), dtype="float32"), np.empty((len(qv), 0), dtype="int64")
+    elif exact or len(ids) <= EXACT_SCAN_MAX:
+        D, I = _exact_scan(index, qv, np.asarray(ids, dtype="int64"), k)
+    else:
+        params = ann.search_parameters(index, sel=faiss.IDSelectorBatch(ids))
+        D, I = index.search(qv, min(k, len(ids)), params=params)
+    return D, I, metas
+
+def search(query: str, k: int = 10, ids: Optional[np.ndarray] = None):
+    """Semantic search over FAISS; returns (scores, indices, metas). See search_vectors for `ids`."""
+    D, I, metas = search_vectors(embed_query(query), k, ids)
     return D[0], I[0], metas
@@ -0,0 +1,119 @@
+# src/warmup.py
+import os, threading, time
+from typing import Any, Callable, Dict, List, Tuple
+
+# Startup preloading for the API. Each component is loaded once, in order, on a background
+# thread started from the FastAPI lifespan hook; /ready reports their state. Required
+# components gate readiness; optional ones (external index, analytics data) may be "skipped"
+# when their files aren't there, since the endpoints using them report that themselves.
+# API_WARMUP=off leaves everything lazy (and /ready then reports ready straight away).
+WARMUP_MODE = os.getenv("API_WARMUP", "on").lower()
+WARMUP_TEXTS = ["spicy chicken noodles", "vegan dessert near downtown"]
+
+
+def _encoder():
+    from .encoders import get_encoder
+    from .vector_store import EMBED_MODEL
+    model = get_encoder(EMBED_MODEL)
+    # first calls pay for lazy kernel / allocator setup: run one single and one batched encode
+    model.encode(WARMUP_TEXTS[:1])
+    model.encode(WARMUP_TEXTS * 8)
+
+def _internal_index():
+    from .vector_store import _load_all
+    index, metas, _ = _load_all()
+    return f"{index.ntotal} vectors, {len(metas)} metadata rows"
+
+def _side_indexes():
+    from .vector_store import lexical_index, restaurant_index
+    lexical_index()
+    restaurant_index()
+
+def _warm_search():
+    from .vector_store import embed, search_vectors
+    search_vectors(embed(WARMUP_TEXTS), k=10)
+
+def _external_index():
+    from .ext_search import _load_external
+    index, metas = _load_external()
+    return f"{index.ntotal} vectors, {len(metas)} chunks"
+
+def _trend_index():
+    from .trend_external import get_trend_index
+    get_trend_index()
+
+def _price_cube():
+    from .price_cube import get_price_cube
+    get_price_cube()
+
+def _analytics_frame():
+    from .analytics import load_frame
+    return f"{len(load_frame())} rows"
+
+# (name, loader, required); loaders may return a short detail string
+COMPONENTS: List[Tuple[str, Callable[[], Any], bool]] = [
+    ("encoder", _encoder, True),
+    ("internal_index", _internal_index, True),
+    ("side_indexes", _side_indexes, True),
+    ("warm_search", _warm_search, False),
+    ("external_index", _external_index, False),
+    ("trend_index", _trend_index, False),
+    ("price_cube", _price_cube, False),
+    ("analytics_frame", _analytics_frame, False),
+]
+
+_lock = threading.Lock()
+_state: Dict[str, Dict[str, Any]] = {
+    name: {"state": "pending", "required": required, "seconds": None, "detail": None, "error": None}
+    for name, _, required in COMPONENTS
+}
+_thread = None
+_started = None
+_finished = None
+
+
+def _set(name: str, **fields):
+    with _lock:
+        _state[name].update(fields)
+
+def run():
+    """Load every component in order, recording state and duration; errors never propagate."""
+    global _started, _finished
+    _started = time.time()
+    for name, load, required in COMPONENTS:
+        _set(name, state="loading")
+        t0 = time.perf_counter()
+        try:
+            detail = load()
+            _set(name, state="ready", detail=detail)
+        except FileNotFoundError as e:
+            _set(name, state="failed" if required else "skipped", error=str(e))
+        except Exception as e:
+            _set(name, state="failed", error=f"{type(e).__name__}: {e}")
+        _set(name, seconds=round(time.perf_counter() - t0, 3))
+        print(f"warm-up: {name} {_state[name]['state']} in {_state[name]['seconds']:.2f}s")
+    _finished = time.time()
+
+def start():
+    """Start the warm-up thread (once per process) unless API_WARMUP=off."""
+    global _thread
+    if WARMUP_MODE == "off" or _thread is not None:
+        return
+    _thread = threading.Thread(target=run, name="warmup", daemon=True)
+    _thread.start()
+
+def readiness() -> Dict[str, Any]:
+    """Overall readiness (every required component loaded) plus per-component state and timings."""
+    with _lock:
+        components = {name: dict(s) for name, s in _state.items()}
+    if WARMUP_MODE == "off":
+        ready = True
+    else:
+        ready = all(s["state"] == "ready" for s in components.values() if s["required"])
+    return {
+        "ready": ready,
+        "warmup": WARMUP_MODE,
+        "seconds": round((_finished or time.time()) - _started, 3) if _started else None,
+        "finished": _finished is not None,
+        "components": components,
+    }
@@ -0,0 +1,85 @@
+# src/workpool.py
+import asyncio, os, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any
+
+# Per endpoint class: worker threads, and how many more calls may wait for one.
+# Override with API_<CLASS>_WORKERS / API_<CLASS>_QUEUE, e.g. API_RAG_WORKERS=4.
+POOL_DEFAULTS = {
+    "search": (4, 16),
+    "rag": (2, 8),
+    "analytics": (2, 8),
+}
+RETRY_AFTER_SECONDS = int(os.getenv("API_RETRY_AFTER", "1"))
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a pool already has workers + queue calls in flight."""
+
+    def __init__(self, pool: str, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(f"{pool} pool is at capacity, retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class WorkPool:
+    """Bounded thread pool for blocking work called from async endpoints."""
+
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue = max(0, queue)
+        self.rejected = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-pool")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def _done(self, _fut):
+        # released when the work really finishes, even if the awaiting request was cancelled
+        with self._count_lock:
+            self._in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    async def run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._count_lock:
+                self.rejected += 1
+            raise Overloaded(self.name)
+        with self._count_lock:
+            self._in_flight += 1
+        fut = self._executor.submit(partial(fn, *args, **kwargs))
+        fut.add_done_callback(self._done)
+        return await asyncio.wrap_future(fut)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._count_lock:
+            return {
+                "workers": self.workers,
+                "queue": self.queue,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+_pools: Dict[str, WorkPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name: str) -> WorkPool:
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                workers, queue = POOL_DEFAULTS.get(name, (2, 8))
+                workers = int(os.getenv(f"API_{name.upper()}_WORKERS", workers))
+                queue = int(os.getenv(f"API_{name.upper()}_QUEUE", queue))
+                pool = _pools[name] = WorkPool(name, workers, queue)
+    return pool
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _pools.items()}
@@ -0,0 +1,50 @@
+# tests/conftest.py
+import hashlib, os, sys
+import pytest
+
+# run from anywhere: make `src` importable as a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeHTTP:
+    """
+    Stands in for requests.get in src.ext_fetch: `pages` maps URL -> body (bytes). Every
+    response carries an ETag derived from the body and a matching If-None-Match gets a 304.
+    """
+
+    class Response:
+        def __init__(self, status_code, content=b"", headers=None):
+            self.status_code = status_code
+            self.content = content
+            self.headers = headers or {}
+
+        def raise_for_status(self):
+            if self.status_code >= 400:
+                raise RuntimeError(f"HTTP {self.status_code}")
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, dict(headers)))
+        if url not in self.pages:
+            return self.Response(404)
+        body = self.pages[url]
+        etag = f'"{hashlib.sha1(body).hexdigest()[:12]}"'
+        if headers.get("If-None-Match") == etag:
+            return self.Response(304)
+        return self.Response(200, body, {"ETag": etag})
+
+    def conditional(self):
+        """(url, sent If-None-Match) for every request so far."""
+        return [(url, "If-None-Match" in h) for url, h in self.requests]
+
+
+@pytest.fixture
+def fake_http(monkeypatch):
+    from src import ext_fetch
+    http = FakeHTTP()
+    monkeypatch.setattr(ext_fetch.requests, "get", http.get)
+    return http
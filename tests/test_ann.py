@@ -0,0 +1,103 @@
+# tests/test_ann.py
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import faiss
+from src import ann
+
+
+def _vecs(n=2000, d=64, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def _pca_hnsw(ef_search=200):
+    params = {"type": "hnsw", "hnsw_m": 16, "ef_search": ef_search, "pca": 32}
+    return ann.build_index(_vecs(), params), params
+
+def test_pca_hnsw_keeps_ef_search():
+    index, _ = _pca_hnsw(ef_search=200)
+    assert isinstance(faiss.downcast_index(index), faiss.IndexPreTransform)
+    assert ann._hnsw(index).hnsw.efSearch == 200
+    # also through the id map an incremental ingest would add
+    mapped = faiss.IndexIDMap2(faiss.index_factory(64, "PCA32,L2norm,HNSW16", faiss.METRIC_INNER_PRODUCT))
+    ann.apply_search_params(mapped, {"ef_search": 300})
+    assert ann._hnsw(mapped).hnsw.efSearch == 300
+
+def test_pca_hnsw_search_parameters():
+    index, _ = _pca_hnsw(ef_search=128)
+    sp = ann.search_parameters(index, sel=faiss.IDSelectorRange(0, 100))
+    assert isinstance(sp, faiss.SearchParametersHNSW)
+    assert sp.efSearch == 128
+    _, I = index.search(_vecs()[:3], 5, params=sp)
+    assert ((I >= 0) & (I < 100)).all()
+
+def test_pca_hnsw_not_removable():
+    index, _ = _pca_hnsw()
+    assert not ann.supports_removal(index)
+    flat = ann.build_index(_vecs(), {"type": "flat", "pca": 32})
+    assert ann.supports_removal(flat)
+
+def test_incremental_falls_back_to_full_build_for_pca_hnsw(tmp_path, monkeypatch):
+    from src import ingest_embeddings as ie
+    from src.meta_store import write_meta
+    monkeypatch.chdir(tmp_path)
+    index, params = _pca_hnsw()
+    faiss.write_index(index, ie.FAISS_INDEX_PATH)
+    ann.save_params(ie.FAISS_INDEX_PATH, params)
+    write_meta(ie.METADATA_PATH, [{"row_key": str(i), "text_hash": "x", "live": 1} for i in range(index.ntotal)])
+    df = ie._prepare(pd.DataFrame({"menu_item": ["a"], "item_id": ["0"]}))
+    assert ie.incremental_update(df) is False
+
+
+@pytest.mark.parametrize("params", [
+    {"type": "flat", "pca": 32},
+    {"type": "ivf", "nlist": 4, "nprobe": 4, "pca": 32, "storage": "sq8"},
+])
+def test_exact_scan_matches_search_under_pca(params):
+    from src import vector_store as vs
+    vecs = _vecs()
+    index = ann.build_index(vecs, dict(params))
+    ids = np.arange(0, len(vecs), 3, dtype="int64")
+    # every list probed: the selector search is exact over the stored codes
+    for idx in (index, ann.with_ids(index)):
+        D, I = idx.search(vecs[:5], 10, params=ann.search_parameters(idx, sel=faiss.IDSelectorBatch(ids)))
+        eD, eI = vs._exact_scan(idx, vecs[:5], ids, 10)
+        np.testing.assert_array_equal(eI, I)
+        np.testing.assert_allclose(eD, D, atol=1e-5)
+
+def _stream(vecs, params, spill_dir, chunk=500, **kw):
+    builder = ann.StreamingIndexBuilder(vecs.shape[1], params, spill_dir=str(spill_dir), **kw)
+    for start in range(0, len(vecs), chunk):
+        builder.add(vecs[start:start + chunk])
+    return builder.finish()
+
+def test_streaming_flat_is_exact(tmp_path):
+    vecs = _vecs()
+    index, report = _stream(vecs, {"type": "flat"}, tmp_path, report_queries=50)
+    exact = faiss.IndexFlatIP(vecs.shape[1])
+    exact.add(vecs)
+    assert report == {}
+    assert np.array_equal(index.search(vecs[:5], 5)[1], exact.search(vecs[:5], 5)[1])
+
+def test_streaming_trains_on_every_chunk(tmp_path):
+    # rows grouped like a CSV sorted by city: the first half is one cluster, the second another
+    d = 16
+    a, b = np.zeros(d, dtype="float32"), np.zeros(d, dtype="float32")
+    a[0], b[1] = 1, 1
+    noise = np.random.default_rng(1).standard_normal((4000, d)).astype("float32") * 0.05
+    vecs = np.vstack([a + noise[:2000], b + noise[2000:]])
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    # nlist=2 wants 78 training rows: the first 78 would all come from cluster a
+    index, report = _stream(vecs, {"type": "ivf", "nlist": 2, "nprobe": 1}, tmp_path, report_queries=100)
+    centroids = faiss.downcast_index(ann._ivf(index).quantizer).reconstruct_n(0, 2)
+    assert (centroids @ b).max() > 0.9
+    assert report["queries"] == 100 and report["recall_at_k"] > 0.9
+    assert index.ntotal == len(vecs)
+    assert os.listdir(tmp_path) == []  # spill file removed
+
+def test_streaming_abort_removes_spill(tmp_path):
+    builder = ann.StreamingIndexBuilder(64, {"type": "ivf"}, spill_dir=str(tmp_path))
+    builder.add(_vecs(100))
+    builder.abort()
+    assert os.listdir(tmp_path) == []
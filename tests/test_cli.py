@@ -0,0 +1,69 @@
+# tests/test_cli.py
+import os, signal, stat, subprocess, sys, time
+import numpy as np
+import pandas as pd
+import pytest
+from src import cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the daemon under test skips warm-up, which would load the embedding model
+SERVE = "import sys; from src import cli, warmup; warmup.run = lambda: None; cli.main(sys.argv[1:])"
+COMPARE = ["compare", "--city", "San Francisco", "--a", "thai", "--b", "pizza"]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    (tmp_path / "data").mkdir()
+    pd.DataFrame({
+        "city": rng.choice(["San Francisco", "Oakland"], 200),
+        "categories": rng.choice(["Thai", "Pizza", "Thai, Vegan"], 200),
+        "price": rng.choice(["$", "$$", "12.5"], 200),
+    }).to_csv(tmp_path / "data" / "restaurants.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def daemon(workdir):
+    sock = str(workdir / "bot.sock")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.Popen([sys.executable, "-c", SERVE, "serve-local", "--socket", sock],
+                            cwd=str(workdir), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    deadline = time.time() + 30
+    while not cli._daemon_alive(sock):
+        assert proc.poll() is None, proc.stdout.read().decode()
+        assert time.time() < deadline, "serve-local didn't start"
+        time.sleep(0.05)
+    yield sock
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(10)
+    assert not os.path.exists(sock)  # removed on shutdown
+
+
+def test_local_flag_on_either_side_of_the_subcommand():
+    parse = cli.build_parser().parse_args
+    assert not getattr(parse(["search", "--q", "x"]), "local", False)
+    assert parse(["--local", "search", "--q", "x"]).local
+    assert parse(["search", "--q", "x", "--local"]).local
+
+def test_socket_is_owner_only(daemon):
+    assert stat.S_IMODE(os.stat(daemon).st_mode) == 0o600
+
+def test_forwarded_command_matches_direct_call(daemon, capsys):
+    cli.main(["--local", *COMPARE])
+    direct = capsys.readouterr().out
+    assert "City: San Francisco" in direct
+    assert cli._forward(COMPARE, daemon) == 0
+    assert capsys.readouterr().out == direct
+
+def test_forward_errors_and_other_directories(daemon, capsys, tmp_path, monkeypatch):
+    assert cli._forward(["compare", "--city", "x"], daemon) == 2  # argparse: --a / --b missing
+    assert "required" in capsys.readouterr().err
+    # relative data paths would resolve elsewhere: the daemon declines and the caller runs it itself
+    other = tmp_path / "elsewhere"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    assert cli._forward(COMPARE, daemon) is None
+
+def test_forward_without_daemon(workdir):
+    assert cli._forward(COMPARE, str(workdir / "none.sock")) is None
@@ -0,0 +1,56 @@
+# tests/test_embed_cache.py
+import multiprocessing as mp
+import os
+import numpy as np
+from src import embed_cache
+from src.embed_cache import EmbeddingCache, text_key
+
+
+def _encode(texts):
+    return np.asarray([[len(t), i, 1.0, 2.0] for i, t in enumerate(texts)], dtype="float32")
+
+def test_reuses_cached_vectors(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    first = cache.encode(["a b", "cc"], _encode)
+    again = EmbeddingCache("m", str(tmp_path)).encode(["cc", "a  b"], lambda ts: 1 / 0)
+    assert np.array_equal(again, first[::-1])
+
+def test_survives_torn_shard_and_keys(tmp_path):
+    cache = EmbeddingCache("m", str(tmp_path))
+    cache.encode(["one", "two"], _encode)
+    shard = cache._shard_path(0)
+    # a writer killed mid-append: half a vector and half a key record
+    with open(shard, "ab") as f:
+        f.write(b"\0" * 6)
+    with open(cache._keys_path, "ab") as f:
+        f.write(b"\1" * 5)
+    reopened = EmbeddingCache("m", str(tmp_path))
+    assert len(reopened) == 2
+    vecs = reopened.encode(["one", "three", "two"], _encode)
+    assert reopened.misses == 1
+    assert os.path.getsize(shard) == 3 * 4 * 4
+    third = EmbeddingCache("m", str(tmp_path))
+    assert np.array_equal(third.encode(["three"], lambda ts: 1 / 0), vecs[1:2])
+
+def _writer(root, tag, batches):
+    cache = EmbeddingCache("m", root)
+    for b in range(batches):
+        texts = [f"{tag}-{b}-{j}" for j in range(5)]
+        cache.put_many([text_key(t) for t in texts], _tagged(texts))
+
+def _tagged(texts):
+    return np.asarray([[sum(t.encode()), len(t), 0, 1] for t in texts], dtype="float32")
+
+def test_concurrent_writers_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "SHARD_ROWS", 64)  # several shard rollovers per writer
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), tag, 60)) for tag in "abc"]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    cache = EmbeddingCache("m", str(tmp_path))
+    texts = [f"{tag}-{b}-{j}" for tag in "abc" for b in range(60) for j in range(5)]
+    assert len(cache) == len(texts)
+    assert np.array_equal(cache.encode(texts, lambda ts: 1 / 0), _tagged(texts))
@@ -0,0 +1,86 @@
+# tests/test_ext_fetch.py
+import json
+import pytest
+from src import ext_fetch
+from src.ext_fetch import Fetcher, fetch_all, fetch_wikipedia, fixture_name, with_params
+
+FEED = "https://sf.eater.com/rss/index.xml"
+QUERY = {"action": "query", "prop": "extracts|info", "explaintext": 1, "inprop": "url", "redirects": 1,
+         "format": "json", "formatversion": 2}
+
+
+def _page(title, extract, missing=False):
+    page = {"title": title, "missing": True} if missing else {
+        "title": title, "fullurl": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}", "extract": extract}
+    return {"query": {"pages": [page]}}
+
+def _wiki_url(params):
+    return with_params(ext_fetch.WIKI_API, params)
+
+@pytest.fixture
+def fixtures(tmp_path):
+    d = tmp_path / "fixtures"
+    d.mkdir()
+
+    def add(url, body):
+        (d / fixture_name(url)).write_bytes(body if isinstance(body, bytes) else json.dumps(body).encode())
+    add.dir = str(d)
+    return add
+
+
+def test_fixture_name():
+    assert fixture_name(FEED) == "sf.eater.com_rss_index.xml"
+    long = fixture_name("https://example.com/" + "x" * 300)
+    assert len(long) == 117 and long != fixture_name("https://example.com/" + "x" * 301)
+
+def test_fixture_mode_never_touches_the_network(fixtures, fake_http):
+    fixtures(FEED, b"<rss/>")
+    fetcher = Fetcher(fixtures=fixtures.dir)
+    res = fetch_all(fetcher, [FEED, "https://missing.example/feed"])
+    assert [r["status"] for r in res] == ["fixture", "error"]
+    assert res[0]["body"] == b"<rss/>" and "no fixture" in res[1]["error"]
+    assert fake_http.requests == []
+
+def test_fetch_then_revalidate(tmp_path, fake_http):
+    fake_http.pages[FEED] = b"<rss>v1</rss>"
+    cache = str(tmp_path / "http_cache")
+    first = Fetcher(cache).get(FEED)
+    assert first["status"] == "fetched" and first["body"] == b"<rss>v1</rss>"
+    # a new process: the stored ETag turns an unchanged feed into a 304 served from the cache
+    again = Fetcher(cache).get(FEED)
+    assert again["status"] == "not_modified" and again["body"] == b"<rss>v1</rss>"
+    assert fake_http.conditional() == [(FEED, False), (FEED, True)]
+    fake_http.pages[FEED] = b"<rss>v2</rss>"
+    changed = Fetcher(cache).get(FEED)
+    assert changed["status"] == "fetched" and changed["body"] == b"<rss>v2</rss>"
+    assert Fetcher(cache).get(FEED)["status"] == "not_modified"
+
+def test_errors_and_no_cache(tmp_path, fake_http):
+    res = Fetcher(str(tmp_path / "c")).get("https://example.com/gone")
+    assert res["status"] == "error" and "404" in res["error"] and res["body"] is None
+    fake_http.pages[FEED] = b"x"
+    fetcher = Fetcher(None)
+    assert [fetcher.get(FEED)["status"] for _ in range(2)] == ["fetched", "fetched"]
+    assert fake_http.conditional()[-2:] == [(FEED, False), (FEED, False)]
+
+def test_fetch_all_keeps_input_order(tmp_path, fake_http):
+    urls = [f"https://example.com/{i}" for i in range(20)]
+    for i, url in enumerate(urls):
+        fake_http.pages[url] = str(i).encode()
+    res = fetch_all(Fetcher(str(tmp_path / "c")), urls, workers=4)
+    assert [r["body"] for r in res] == [str(i).encode() for i in range(20)]
+
+def test_wikipedia_pages(fixtures):
+    fixtures(_wiki_url(dict(QUERY, titles="Dim sum")), _page("Dim sum", "Small plates."))
+    # unknown title: the top search hit is fetched instead
+    fixtures(_wiki_url(dict(QUERY, titles="Dimsum brunch")), _page("Dimsum brunch", "", missing=True))
+    fixtures(_wiki_url({"action": "query", "list": "search", "srsearch": "Dimsum brunch", "srlimit": 1,
+                        "format": "json", "formatversion": 2}),
+             {"query": {"search": [{"title": "Dim sum"}]}})
+    # no page and no search hit
+    fixtures(_wiki_url(dict(QUERY, titles="Nothing")), _page("Nothing", "", missing=True))
+    fixtures(_wiki_url({"action": "query", "list": "search", "srsearch": "Nothing", "srlimit": 1,
+                        "format": "json", "formatversion": 2}), {"query": {"search": []}})
+    pages = fetch_wikipedia(Fetcher(fixtures=fixtures.dir), ["Dim sum", "Dimsum brunch", "Nothing", "No fixture"])
+    url = "https://en.wikipedia.org/wiki/Dim_sum"
+    assert pages == [("Dim sum", url, "Small plates."), ("Dim sum", url, "Small plates.")]
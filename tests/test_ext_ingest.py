@@ -0,0 +1,55 @@
+# tests/test_ext_ingest.py
+import pickle, sys
+import numpy as np
+import pytest
+from src import ext_ingest
+
+FEED = "https://example.com/rss.xml"
+RSS = b"""<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>
+<item><title>Saffron bar opens</title><link>https://example.com/a</link>
+<description>A new saffron cocktail bar opens downtown.</description><pubDate>Mon, 06 May 2024 10:00:00 GMT</pubDate></item>
+<item><title>Noodle week</title><link>https://example.com/b</link>
+<description>Hand-pulled noodles all week long.</description><pubDate>Tue, 07 May 2024 10:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch, fake_http):
+    monkeypatch.chdir(tmp_path)
+    fake_http.pages[FEED] = RSS
+
+    def encode(texts, workers=1):
+        rng = np.random.default_rng(len(texts))
+        return rng.standard_normal((len(texts), ext_ingest.EMBED_DIM)).astype("float32")
+
+    monkeypatch.setattr(ext_ingest, "_encode", encode)
+
+    def run(*argv):
+        monkeypatch.setattr(sys, "argv", ["ext_ingest", "--rss", FEED, "--no-embed-cache", *argv])
+        ext_ingest.main()
+    return run
+
+def _indexed_urls():
+    with open(ext_ingest.EXT_META_PATH, "rb") as f:
+        return sorted({d["url"] for d in pickle.load(f)})
+
+def test_feed_is_indexed_after_a_failed_run(ingest, monkeypatch, fake_http):
+    real_save = ext_ingest.save_index_and_meta
+
+    def fail(*a, **kw):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ext_ingest, "save_index_and_meta", fail)
+    with pytest.raises(OSError):
+        ingest("--incremental")
+    monkeypatch.setattr(ext_ingest, "save_index_and_meta", real_save)
+    # the feed hasn't changed: the rerun revalidates (304) and must still index its items
+    ingest("--incremental")
+    assert fake_http.conditional()[-1] == (FEED, True)
+    assert _indexed_urls() == ["https://example.com/a", "https://example.com/b"]
+
+def test_unchanged_feed_adds_nothing(ingest, capsys):
+    ingest("--incremental")
+    ingest("--incremental")
+    assert "Up to date: no new chunks" in capsys.readouterr().out
+    assert _indexed_urls() == ["https://example.com/a", "https://example.com/b"]
@@ -0,0 +1,55 @@
+# tests/test_filters.py
+import numpy as np
+import pytest
+from src import retriever, vector_store as vs
+from src.meta_store import MetaStore
+
+ROWS = [
+    {"restaurant_name": "A", "city": "San Francisco", "state": "CA", "categories": "Thai, Noodles", "rating": 4.5, "price": "$$", "confidence": 0.9, "live": 1},
+    {"restaurant_name": "B", "city": " san francisco", "state": "ca", "categories": "Mexican", "rating": 3.0, "price": "$", "confidence": 0.4, "live": 1},
+    {"restaurant_name": "C", "city": "Oakland", "state": "CA", "categories": "Thai", "rating": None, "price": None, "confidence": None, "live": 1},
+    {"restaurant_name": "D", "city": "San Francisco", "state": "CA", "categories": "Thai", "rating": 5.0, "price": "$$$$", "confidence": 1.0, "live": 0},
+    {"restaurant_name": "E", "city": "San Francisco", "state": "CA", "categories": None, "rating": 4.0, "price": "12.5", "confidence": 0.8, "live": 1},
+]
+
+
+@pytest.fixture(autouse=True)
+def columns(monkeypatch):
+    cols = vs._build_filter_columns(MetaStore.from_records(ROWS))
+    monkeypatch.setattr(vs, "filter_columns", lambda: cols)
+    return cols
+
+def rows(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_no_filters_is_none():
+    assert retriever.compile_filters(None) is None
+    assert retriever.compile_filters({}) is None
+
+def test_city_and_state_are_case_and_space_insensitive():
+    assert rows(retriever.compile_filters({"city": "SAN FRANCISCO "})) == [0, 1, 4]
+    assert rows(retriever.compile_filters({"state": "Ca", "city": "oakland"})) == [2]
+
+def test_unknown_city_matches_nothing_and_reports_full_rejection():
+    stats = {}
+    mask = retriever.compile_filters({"city": "Nowhere", "state": "CA"}, stats)
+    assert not mask.any() and len(mask) == len(ROWS)
+    assert stats["city"] == 1.0
+
+def test_categories_any_is_substring_and_case_insensitive():
+    assert rows(retriever.compile_filters({"categories_any": ["NOODLE", "mex"]})) == [0, 1]
+    assert rows(retriever.compile_filters({"categories_any": ["thai"]})) == [0, 2]  # D is a tombstone
+
+def test_numeric_thresholds_let_missing_values_pass():
+    assert rows(retriever.compile_filters({"min_rating": 4})) == [0, 2, 4]
+    assert rows(retriever.compile_filters({"confidence_min": "0.5"})) == [0, 2, 4]
+    assert rows(retriever.compile_filters({"max_price": 2})) == [0, 1, 2]
+    # an unparseable threshold is ignored
+    assert rows(retriever.compile_filters({"min_rating": "high"})) == [0, 1, 2, 4]
+
+def test_filters_combine_and_record_rejection_rates():
+    stats = {}
+    mask = retriever.compile_filters({"city": "San Francisco", "categories_any": ["thai"], "max_price": 3}, stats)
+    assert rows(mask) == [0]
+    assert stats == {"city": 0.2, "categories_any": 0.4, "max_price": 0.4}
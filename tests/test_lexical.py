@@ -0,0 +1,70 @@
+# tests/test_lexical.py
+import math
+from collections import Counter
+import numpy as np
+import pytest
+from src import lexical
+from src.lexical import LexicalIndex, LexicalIndexBuilder, tokenize
+
+# 300 rows: "yuzu" (rows 5, 17, 42) and "sansho" (row 42) are rare, chicken / rice are everywhere
+TEXTS = ["Chicken: rice bowl. Ingredients: chicken, rice." for _ in range(300)]
+TEXTS[5] = "Yuzu chicken: rice. Ingredients: yuzu, yuzu, chicken."
+TEXTS[17] = "Yuzu soda: sparkling water with yuzu juice, sugar, ice and a long garnish list."
+TEXTS[42] = "Sansho yuzu wings: chicken. Ingredients: sansho, yuzu."
+
+
+@pytest.fixture(scope="module")
+def lex():
+    return LexicalIndex.from_texts(TEXTS)
+
+def _bm25(query):
+    """Textbook BM25 over TEXTS for every row."""
+    docs = [Counter(tokenize(t)) for t in TEXTS]
+    avgdl = sum(sum(d.values()) for d in docs) / len(docs)
+    out = np.zeros(len(docs))
+    for tok in dict.fromkeys(tokenize(query)):
+        df = sum(tok in d for d in docs)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf, dl = d[tok], sum(d.values())
+            if tf:
+                out[i] += idf * tf * (lexical.BM25_K1 + 1) / (
+                    tf + lexical.BM25_K1 * (1 - lexical.BM25_B + lexical.BM25_B * dl / avgdl))
+    return out
+
+
+def test_rare_terms(lex):
+    assert lex.rare_terms("Yuzu chicken, sansho") == ["yuzu", "sansho"]
+    assert lex.rare_terms("chicken rice unknownword") == []
+
+def test_no_rare_terms_returns_none(lex):
+    assert lex.candidates("chicken rice bowl") is None
+
+def test_candidates_are_rare_term_rows_scored_by_bm25(lex):
+    ids, scores = lex.candidates("yuzu chicken")
+    assert sorted(ids.tolist()) == [5, 17, 42]
+    np.testing.assert_allclose(scores, _bm25("yuzu chicken")[ids])
+    # repeated term + common term outranks the long single-mention row
+    assert ids[np.argmax(scores)] == 5 and ids[np.argmin(scores)] == 17
+
+def test_eligible_mask_and_limit(lex):
+    eligible = np.ones(len(TEXTS), dtype=bool)
+    eligible[5] = False
+    ids, _ = lex.candidates("yuzu", eligible)
+    assert sorted(ids.tolist()) == [17, 42]
+    ids, scores = lex.candidates("yuzu sansho", limit=1)
+    assert ids.tolist() == [42] and len(scores) == 1
+
+def test_chunked_build_and_roundtrip_match(lex, tmp_path):
+    b = LexicalIndexBuilder()
+    for i in range(0, len(TEXTS), 70):
+        b.add(TEXTS[i:i + 70])
+    path = str(tmp_path / "lex.npz")
+    b.finish().save(path)
+    loaded = LexicalIndex.load(path)
+    for query in ("yuzu chicken", "sansho"):
+        (a_ids, a_s), (b_ids, b_s) = lex.candidates(query), loaded.candidates(query)
+        np.testing.assert_array_equal(np.sort(a_ids), np.sort(b_ids))
+        np.testing.assert_allclose(a_s[np.argsort(a_ids)], b_s[np.argsort(b_ids)])
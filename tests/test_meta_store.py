@@ -0,0 +1,107 @@
+# tests/test_meta_store.py
+import os
+import numpy as np
+import pytest
+from src.meta_store import HIDDEN, MetaStore, MetaWriter, load_meta, write_meta
+
+ROWS = [
+    {"restaurant_name": "Thai Place", "city": "San Francisco", "zip_code": 94110.0, "rating": 4.5,
+     "price": "$$", "review_count": 12, "item_id": "a1", "text": "Pad thai: noodles.",
+     "row_key": "a1", "text_hash": "h1", "live": 1},
+    {"restaurant_name": "Taqueria", "city": "Oakland", "zip_code": None, "rating": float("nan"),
+     "price": "", "review_count": None, "item_id": "b2", "text": "Burrito: beans. ñ",
+     "row_key": "b2", "text_hash": "h2", "live": 0},
+    {"restaurant_name": "Thai Place", "city": "San Francisco", "rating": 3.0, "item_id": None,
+     "text": "", "row_key": "row:2", "text_hash": "h3", "live": 1},
+]
+
+
+def _write(path, rows=ROWS, batch=2):
+    w = MetaWriter(path)
+    for start in range(0, len(rows), batch):
+        w.append(rows[start:start + batch])
+    w.close()
+
+def test_roundtrip_values(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    store = MetaStore.open(path)
+    assert len(store) == 3
+    assert store[0] == {"restaurant_name": "Thai Place", "categories": None, "city": "San Francisco",
+                        "state": None, "zip_code": "94110", "rating": 4.5, "price": "$$", "review_count": 12,
+                        "item_id": "a1", "confidence": None, "text": "Pad thai: noodles.",
+                        "source": None, "source_id": None}
+    assert store[1]["text"] == "Burrito: beans. ñ"
+    # missing / NaN / blank cells all read back as None
+    assert store[1]["zip_code"] is None and store[1]["rating"] is None and store[1]["price"] is None
+    assert store[-1]["item_id"] is None and store[-1]["text"] is None
+    # a category shares one vocab entry across batches
+    assert store.vocab["restaurant_name"] == ["Thai Place", "Taqueria"]
+    assert store.codes("restaurant_name").tolist() == [0, 1, 0]
+    assert store.rows_at([2, 0], fields=["city", "rating"]) == [
+        {"city": "San Francisco", "rating": 3.0}, {"city": "San Francisco", "rating": 4.5}]
+
+def test_hidden_columns_and_tombstones(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    store = MetaStore.open(path)
+    assert not set(HIDDEN) & set(store[1])
+    assert store.values("row_key") == ["a1", "b2", "row:2"]
+    assert store.values("text_hash") == ["h1", "h2", "h3"]
+    # the tombstone keeps its row (vector id) and data; only `live` marks it deleted
+    assert store.numbers("live").tolist() == [1, 0, 1]
+    assert store.rows_at([1], fields=["item_id", "live"]) == [{"item_id": "b2", "live": 0}]
+
+def test_rewrite_replaces_store_and_cleans_up(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    write_meta(path, ROWS[:1])
+    assert len(MetaStore.open(path)) == 1
+    assert sorted(os.listdir(tmp_path)) == ["meta"]
+
+def test_abort_keeps_existing_store(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    w = MetaWriter(path)
+    w.append(ROWS[:1])
+    w.abort()
+    assert len(MetaStore.open(path)) == 3
+    assert sorted(os.listdir(tmp_path)) == ["meta"]
+
+def test_interrupted_swap(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    # a writer died after moving the current store aside, before renaming its own into place
+    w = MetaWriter(path)
+    w.append(ROWS[:1])
+    for f in w._files.values():
+        f.close()
+    os.rename(path, path + ".old")
+    assert len(load_meta(path)) == 3  # readers fall back to the previous store
+    # the next writer finishes normally and clears the leftovers
+    write_meta(path, ROWS[:2])
+    assert len(load_meta(path)) == 2
+    assert sorted(os.listdir(tmp_path)) == ["meta"]
+
+def test_missing_store(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_meta(str(tmp_path / "meta"))
+
+def test_mmap_open_matches_and_outlives_a_rebuild(tmp_path):
+    path = str(tmp_path / "meta")
+    _write(path)
+    mapped = load_meta(path, mmap=True)
+    assert isinstance(mapped.numbers("rating"), np.memmap)
+    assert list(mapped) == list(MetaStore.open(path))
+    assert mapped.values("row_key") == ["a1", "b2", "row:2"]
+    # a rebuild swaps a new directory in; the open mapping keeps reading the old files
+    write_meta(path, ROWS[1:2])
+    assert len(MetaStore.open(path)) == 1
+    assert len(mapped) == 3 and mapped[2]["restaurant_name"] == "Thai Place"
+    assert mapped[1]["text"] == "Burrito: beans. ñ"
+
+def test_mmap_open_empty_store(tmp_path):
+    path = str(tmp_path / "meta")
+    write_meta(path, [])
+    store = load_meta(path, mmap=True)
+    assert len(store) == 0 and list(store) == []
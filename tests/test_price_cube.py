@@ -0,0 +1,65 @@
+# tests/test_price_cube.py
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from src.analytics import avg_price_for_category, parse_prices
+from src.price_cube import PriceCube
+
+CITIES = ["San Francisco", "South San Francisco", "Oakland", "Los Angeles", ""]
+CATS = ["Thai", "Pizza, Italian", "Thai, Vegan", "Sushi, Japanese", "Italian", "", "Mexican, Tacos"]
+PRICES = ["$", "$$", "$$$", "$$$$", "12.5", "9", "", "n/a", "7.25"]
+
+
+@pytest.fixture
+def csv(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({
+        "city": rng.choice(CITIES, n),
+        "categories": rng.choice(CATS, n),
+        "price": rng.choice(PRICES, n),
+        "menu_item": "x",
+    })
+    path = tmp_path / "restaurants.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+def _reference(csv, city, terms):
+    """Plain pandas over the raw rows: substring city match, any-term category match."""
+    df = pd.read_csv(csv)
+    price = parse_prices(df["price"])
+    city_ok = df["city"].fillna("").str.lower().str.contains(city.lower(), regex=False)
+    cat_ok = np.zeros(len(df), dtype=bool)
+    for t in terms:
+        cat_ok |= df["categories"].fillna("").str.lower().str.contains(t.lower(), regex=False)
+    return price[city_ok & cat_ok & price.notna()]
+
+@pytest.mark.parametrize("city,terms", [
+    ("San Francisco", ["thai"]),
+    ("san francisco", ["Pizza", "sushi"]),
+    ("Oakland", ["italian"]),
+    ("", ["tacos"]),
+    ("Los Angeles", ["nothing-like-this"]),
+])
+def test_stats_match_pandas(csv, city, terms):
+    cube = PriceCube.build(csv, chunksize=700)  # several chunks
+    st = cube.stats(city, terms)
+    want = _reference(csv, city, terms)
+    assert st["count"] == len(want)
+    if len(want):
+        assert st["avg_price"] == pytest.approx(want.mean())
+        assert st["median_price"] == pytest.approx(want.median())
+        assert st["avg_price"] == pytest.approx(avg_price_for_category(pd.read_csv(csv), city, terms))
+        assert sum(st["distribution"].values()) == len(want)
+    else:
+        assert st["avg_price"] is None and st["median_price"] is None
+        assert math.isnan(avg_price_for_category(pd.read_csv(csv), city, terms))
+
+def test_save_load_roundtrip(csv, tmp_path):
+    cube = PriceCube.build(csv)
+    path = str(tmp_path / "cube.npz")
+    cube.save(path)
+    loaded = PriceCube.load(path)
+    for city, terms in [("San Francisco", ["thai"]), ("", ["italian", "vegan"])]:
+        assert loaded.stats(city, terms) == cube.stats(city, terms)
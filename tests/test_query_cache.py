@@ -0,0 +1,58 @@
+# tests/test_query_cache.py
+import os
+import numpy as np
+import pytest
+from src import query_cache
+from src.query_cache import QueryCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Spicy   RAMEN near me ") == "spicy ramen"
+    assert normalize_query("Tacos NEAR ME in Oakland") == "tacos in oakland"
+    assert normalize_query("nearme") == "nearme"
+    assert normalize_query(None) == ""
+
+def test_lru_eviction_order():
+    cache = QueryCache(maxsize=2, path="")
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    assert cache.get("m", "a") is not None  # a is now most recent
+    cache.put("m", "c", [3.0])
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a")[0] == 1.0 and cache.get("m", "c")[0] == 3.0
+    assert cache.stats()["size"] == 2
+
+def test_keys_are_per_model():
+    cache = QueryCache(maxsize=4, path="")
+    cache.put("m1", "q", [1.0])
+    assert cache.get("m2", "q") is None
+
+def test_zero_size_caches_nothing():
+    cache = QueryCache(maxsize=0, path="")
+    cache.put("m", "a", [1.0])
+    assert cache.get("m", "a") is None
+
+def test_cached_embeddings_share_normalized_keys(monkeypatch):
+    monkeypatch.setattr(query_cache, "_cache", QueryCache(maxsize=8, path=""))
+    calls = []
+    def encode_many(texts):
+        calls.append(list(texts))
+        return np.asarray([[float(len(t))] for t in texts])
+    out = query_cache.cached_embeddings("m", ["Pho near me", "pho", "  PHO "], encode_many)
+    assert calls == [["pho"]]
+    assert out.shape == (3, 1)
+    one = query_cache.cached_embedding("m", "pho", lambda t: pytest.fail("should be cached"))
+    assert one.shape == (1, 1)
+
+def test_save_and_load_keep_lru_order(tmp_path):
+    path = str(tmp_path / "qc.npz")
+    cache = QueryCache(maxsize=3, path=path)
+    for k in "abc":
+        cache.put("m", k, [ord(k)])
+    cache.get("m", "a")
+    cache.save()
+    assert os.listdir(tmp_path) == ["qc.npz"]  # the per-process temp file was renamed away
+    loaded = QueryCache(maxsize=2, path=path)
+    loaded.load()
+    # b was least recently used, so it's the one that doesn't fit
+    assert loaded.get("m", "b") is None and loaded.get("m", "a") is not None
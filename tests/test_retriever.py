@@ -0,0 +1,117 @@
+# tests/test_retriever.py
+import numpy as np
+import pytest
+from src import ann, retriever, vector_store as vs
+from src.lexical import LexicalIndex
+from src.meta_store import MetaStore
+from src.restaurant_index import RestaurantIndex
+
+N, DIM = 200, 16
+STRONG = [0.9, 0.85, 0.8, 0.75, 0.7]   # cosine of rows 0-4 with the query
+SAFFRON = 50                           # the only row with the rare term "saffron"
+
+
+def _unit(cos, rng):
+    """A unit vector with cosine `cos` to e0."""
+    other = rng.standard_normal(DIM - 1)
+    other *= np.sqrt(1 - cos ** 2) / np.linalg.norm(other)
+    return np.concatenate([[cos], other]).astype("float32")
+
+def install(monkeypatch, saffron_cos, index_params=None, restaurants=None, top=STRONG):
+    """Serve a small corpus from vector_store's globals; the query vector is e0 whatever the text."""
+    rng = np.random.default_rng(0)
+    cos = rng.uniform(-0.05, 0.05, N)
+    cos[:len(top)] = top
+    cos[SAFFRON] = saffron_cos
+    vecs = np.stack([_unit(c, rng) for c in cos])
+    texts = ["plain dish number"] * N
+    texts[SAFFRON] = "saffron rice"
+    names = restaurants or [f"R{i}" for i in range(N)]
+    metas = MetaStore.from_records([{"restaurant_name": names[i], "city": "San Francisco", "item_id": str(i),
+                                     "text": texts[i], "live": 1} for i in range(N)])
+    index = ann.build_index(vecs, dict(index_params or {"type": "flat"}))
+    monkeypatch.setattr(vs, "_index", index)
+    monkeypatch.setattr(vs, "_metas", metas)
+    monkeypatch.setattr(vs, "_columns", vs._build_filter_columns(metas))
+    monkeypatch.setattr(vs, "_lexical", LexicalIndex.from_texts(texts))
+    monkeypatch.setattr(vs, "_restaurants", RestaurantIndex.from_index(index, names))
+    monkeypatch.setattr(vs, "get_encoder", lambda name: None)
+    q = np.zeros(DIM, dtype="float32")
+    q[0] = 1
+    monkeypatch.setattr(vs, "embed_queries", lambda queries: np.tile(q, (len(queries), 1)))
+    return index
+
+def search(k, limit=1, filters=None, query="saffron curry"):
+    res = retriever.semantic_search(query, k=k, filters=filters, limit_per_restaurant=limit)
+    return [int(r["item_id"]) for r in res], [r["score"] for r in res]
+
+CASES = [(limit, filters) for limit in (1, 0) for filters in (None, {"city": "san francisco"})]
+
+
+@pytest.mark.parametrize("limit,filters", CASES)
+def test_fused_scores_never_increase(monkeypatch, limit, filters):
+    install(monkeypatch, saffron_cos=0.2)
+    ids, scores = search(8, limit, filters)
+    assert scores == sorted(scores, reverse=True)
+    # the lexical hit carries its BM25 bonus (the only candidate: normalized BM25 = 1)
+    assert ids[:6] == [0, 1, 2, 3, 4, SAFFRON]
+    assert scores[5] == pytest.approx(0.2 + retriever.LEXICAL_WEIGHT, abs=1e-5)
+
+@pytest.mark.parametrize("limit,filters", CASES)
+def test_strong_dense_hit_outranks_weak_lexical_hit(monkeypatch, limit, filters):
+    install(monkeypatch, saffron_cos=0.2)
+    ids, scores = search(3, limit, filters)
+    assert ids == [0, 1, 2]
+    assert scores == pytest.approx(STRONG[:3], abs=1e-5)
+
+@pytest.mark.parametrize("limit,filters", CASES)
+def test_strong_lexical_hit_ranks_first(monkeypatch, limit, filters):
+    install(monkeypatch, saffron_cos=0.7)
+    ids, scores = search(3, limit, filters)
+    assert ids == [SAFFRON, 0, 1]
+    assert scores[0] == pytest.approx(0.7 + retriever.LEXICAL_WEIGHT, abs=1e-5)
+
+def test_without_rare_terms_results_are_dense_only(monkeypatch):
+    install(monkeypatch, saffron_cos=0.2)
+    ids, scores = search(5, query="plain dish")
+    assert ids == [0, 1, 2, 3, 4]
+    assert scores == pytest.approx(STRONG, abs=1e-5)
+
+def test_one_item_per_restaurant(monkeypatch):
+    # rows 0 and 1 share a restaurant; the better item represents it
+    names = [f"R{i}" for i in range(N)]
+    names[1] = "R0"
+    install(monkeypatch, saffron_cos=0.2, restaurants=names)
+    ids, _ = search(3, limit=1)
+    assert ids == [0, 2, 3]
+    ids, _ = search(3, limit=0)
+    assert ids == [0, 1, 2]
+
+def test_adaptive_rounds_keep_hits_that_move_up(monkeypatch):
+    # rows 0-5 share a restaurant, so k=2 needs a second round; that round's list is reversed,
+    # the way an approximate index may reorder when k grows, which puts rows 6/7 first
+    names = ["R0"] * 6 + [f"R{i}" for i in range(6, N)]
+    install(monkeypatch, saffron_cos=0.0, restaurants=names,
+            top=[0.9, 0.85, 0.8, 0.75, 0.7, 0.65, 0.6, 0.55])
+    monkeypatch.setattr(retriever, "ADAPTIVE_MAX_FETCH", 8)
+    real = vs.search_vectors
+    calls = []
+
+    def reordering(qv, k=10, ids=None):
+        D, I, metas = real(qv, k, ids)
+        calls.append(k)
+        return (D[:, ::-1], I[:, ::-1], metas) if len(calls) > 1 else (D, I, metas)
+
+    monkeypatch.setattr(vs, "search_vectors", reordering)
+    ids, scores = search(2, limit=2, query="plain dish")
+    assert calls == [2, 8]
+    assert ids == [0, 6] and scores == pytest.approx([0.9, 0.6], abs=1e-5)
+
+def test_two_stage_scores_its_shortlist_exactly(monkeypatch):
+    # one probed list of four: a selector search over the shortlist would lose most of it
+    index = install(monkeypatch, saffron_cos=0.0, index_params={"type": "ivf", "nlist": 4, "nprobe": 1})
+    monkeypatch.setattr(vs, "EXACT_SCAN_MAX", 4)
+    ids, scores = search(20, limit=1, query="plain dish")
+    cos = index.reconstruct_n(0, N)[:, 0]
+    assert ids == np.argsort(-cos, kind="stable")[:20].tolist()
+    np.testing.assert_allclose(scores, cos[ids], atol=1e-5)
@@ -0,0 +1,63 @@
+# tests/test_trend_index.py
+import random
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from src.trend_external import TrendIndex, _haystack, monthly_trend
+
+WORDS = ["saffron", "ramen", "tonkotsu", "Mission", "vegan", "dessert", "pop-up", "bánh", "mì",
+         "taco", "tacos", "birria", "sf", "o'clock", "burrata", "matcha", "ice", "cream"]
+
+
+def _meta(n=300, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    out = []
+    for i in range(n):
+        when = now - timedelta(days=rng.randint(0, 500))
+        out.append({
+            "title": " ".join(rng.choices(WORDS, k=3)).title(),
+            "text": " ".join(rng.choices(WORDS, k=rng.randint(0, 12))) + rng.choice(["", ".", "!", ", sf"]),
+            "published": None if i % 17 == 0 else when.strftime("%a, %d %b %Y %H:%M:%S %z"),
+            "url": f"https://example.com/{i}",
+        })
+    return out
+
+def _scan(meta, term):
+    """The pre-index implementation: substring match on lowercased text + title."""
+    needle = term.lower()
+    return [i for i, m in enumerate(meta) if needle in _haystack(m)]
+
+def test_matching_equals_linear_scan():
+    meta = _meta()
+    index = TrendIndex.from_meta(meta)
+    terms = WORDS + ["SAFF", "men", "ta", "a", "os bir", "ice cream", "pop-up", "-up", "o'c", "!", " ",
+                     "zzz", "acos", "tonkotsu ramen", "cream.", "sf."]
+    for term in terms:
+        assert index.matching(term).tolist() == _scan(meta, term), term
+        # memoized second lookup gives the same answer
+        assert index.matching(term).tolist() == _scan(meta, term), term
+
+def test_trend_counts_match_scan():
+    meta = _meta(seed=1)
+    index = TrendIndex.from_meta(meta)
+    for terms, mode in [(["ramen"], "all"), (["saffron", "vegan"], "all"), (["birria", "matcha"], "any")]:
+        got = {ym: n for ym, n, _ in monthly_trend(index, terms, months=6, mode=mode)}
+        start = (datetime.now(timezone.utc) - timedelta(days=6 * 31)).timestamp()
+        sets = [set(_scan(meta, t)) for t in terms]
+        ids = set.intersection(*sets) if mode == "all" else set.union(*sets)
+        counts = {}
+        for i in ids:
+            if np.isfinite(index.ts[i]) and index.ts[i] >= start:
+                ym = int(index.month[i])
+                key = f"{ym // 100:04d}-{ym % 100:02d}"
+                counts[key] = counts.get(key, 0) + 1
+        assert got == counts
+
+def test_save_load_roundtrip(tmp_path):
+    meta = _meta(50)
+    path = str(tmp_path / "trend.pkl")
+    TrendIndex.from_meta(meta).save(path)
+    loaded = TrendIndex.load(path, meta)
+    assert loaded.matching("ramen").tolist() == _scan(meta, "ramen")
+    # metadata with a different row count is re-indexed instead of trusted
+    assert TrendIndex.load(path, meta[:10]).matching("ramen").tolist() == _scan(meta[:10], "ramen")
@@ -0,0 +1,69 @@
+# tests/test_warmup.py
+import threading, time
+import pytest
+
+pytest.importorskip("httpx")  # fastapi's TestClient
+from fastapi.testclient import TestClient
+from src import api, warmup
+
+
+@pytest.fixture
+def components(monkeypatch):
+    """Replace the real loaders: a gated required one, an optional one whose file is missing."""
+    gate = threading.Event()
+
+    def encoder():
+        gate.wait(5)
+
+    def missing():
+        raise FileNotFoundError("no trend index")
+
+    comps = [("encoder", encoder, True), ("trend_index", missing, False)]
+    monkeypatch.setattr(warmup, "COMPONENTS", comps)
+    monkeypatch.setattr(warmup, "_state", {
+        name: {"state": "pending", "required": required, "seconds": None, "detail": None, "error": None}
+        for name, _, required in comps})
+    for name in ("_thread", "_started", "_finished"):
+        monkeypatch.setattr(warmup, name, None)
+    return gate
+
+def _wait_finished():
+    deadline = time.time() + 5
+    while not warmup.readiness()["finished"] and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_ready_only_after_required_components(monkeypatch, components):
+    monkeypatch.setattr(warmup, "WARMUP_MODE", "on")
+    with TestClient(api.app) as client:
+        resp = client.get("/ready")
+        assert resp.status_code == 503
+        assert resp.json()["components"]["encoder"]["state"] in ("pending", "loading")
+        assert client.get("/health").status_code == 200
+        components.set()
+        _wait_finished()
+        resp = client.get("/ready")
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["ready"] and body["finished"]
+        assert body["components"]["encoder"]["state"] == "ready"
+        # an optional component without its file doesn't block readiness
+        assert body["components"]["trend_index"]["state"] == "skipped"
+
+def test_failed_required_component_stays_unready(monkeypatch, components):
+    monkeypatch.setattr(warmup, "WARMUP_MODE", "on")
+    monkeypatch.setattr(warmup, "COMPONENTS", [("encoder", lambda: 1 / 0, True)])
+    with TestClient(api.app) as client:
+        _wait_finished()
+        resp = client.get("/ready")
+        assert resp.status_code == 503
+        assert resp.json()["components"]["encoder"]["error"].startswith("ZeroDivisionError")
+
+def test_warmup_off_is_ready_immediately(monkeypatch, components):
+    monkeypatch.setattr(warmup, "WARMUP_MODE", "off")
+    with TestClient(api.app) as client:
+        resp = client.get("/ready")
+        assert resp.status_code == 200
+        assert resp.json()["warmup"] == "off"
+        assert warmup._thread is None
+        assert all(c["state"] == "pending" for c in resp.json()["components"].values())
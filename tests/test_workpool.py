@@ -0,0 +1,70 @@
+# tests/test_workpool.py
+import asyncio, threading
+import pytest
+from src import workpool
+from src.workpool import Overloaded, WorkPool
+
+
+def _blocking_pool(workers=1, queue=1):
+    pool = WorkPool("test", workers, queue)
+    gate = threading.Event()
+    return pool, gate
+
+def test_rejects_beyond_workers_plus_queue():
+    pool, gate = _blocking_pool(workers=1, queue=1)
+
+    async def scenario():
+        held = [asyncio.ensure_future(pool.run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as exc:
+            await pool.run(gate.wait)
+        assert exc.value.pool == "test" and exc.value.retry_after == workpool.RETRY_AFTER_SECONDS
+        gate.set()
+        await asyncio.gather(*held)
+
+    asyncio.run(scenario())
+    assert pool.stats() == {"workers": 1, "queue": 1, "in_flight": 0, "completed": 2, "rejected": 1}
+
+def test_slots_released_after_success_and_error():
+    pool = WorkPool("test", 1, 0)
+
+    def boom():
+        raise ValueError("boom")
+
+    async def scenario():
+        assert await pool.run(lambda x: x + 1, 1) == 2
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+        # both calls gave their only slot back
+        assert await pool.run(lambda: "again") == "again"
+
+    asyncio.run(scenario())
+    assert pool.stats()["in_flight"] == 0 and pool.stats()["completed"] == 3
+
+def test_get_pool_reads_env_overrides(monkeypatch):
+    monkeypatch.setattr(workpool, "_pools", {})
+    monkeypatch.setenv("API_RAG_WORKERS", "3")
+    monkeypatch.setenv("API_RAG_QUEUE", "0")
+    pool = workpool.get_pool("rag")
+    assert (pool.workers, pool.queue) == (3, 0)
+    assert workpool.get_pool("rag") is pool
+    assert workpool.get_pool("other").stats()["workers"] == 2
+
+def test_offload_answers_503_with_retry_after(monkeypatch):
+    pytest.importorskip("fastapi")
+    from src import api
+    pool, gate = _blocking_pool(workers=1, queue=0)
+    monkeypatch.setattr(workpool, "_pools", {"search": pool})
+
+    async def scenario():
+        held = asyncio.ensure_future(api._offload("search", gate.wait))
+        await asyncio.sleep(0)
+        resp = await api._offload("search", gate.wait)
+        gate.set()
+        await held
+        return resp
+
+    resp = asyncio.run(scenario())
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(workpool.RETRY_AFTER_SECONDS)
+    assert b"at capacity" in resp.body